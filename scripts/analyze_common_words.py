@@ -4,8 +4,15 @@ from dotenv import load_dotenv
 import psycopg2
 from psycopg2 import sql
 import argparse
-import re
-from collections import Counter
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+
+# Repo root on the path for the Django-free shared helpers in transcripts/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from transcripts.text_stats import count_words, ngrams, tokenize, word_counts_sql  # noqa: E402
 
 load_dotenv()
 
@@ -15,19 +22,8 @@ DB_NAME=os.getenv("DB_NAME","youtube_transcripts")
 DB_USER=os.getenv("DB_USER","postgres")
 DB_PASSWORD=os.getenv("DB_PASSWORD","postgres")
 
-STOP_WORDS = set([
-    'the', 'a', 'an', 'is', 'it', 'he', 'she', 'we', 'they', 'you', 'i', 
-    'to', 'of', 'and', 'in', 'on', 'at', 'for', 'with', 'about', 'as', 
-    'by', 'or', 'so', 'if', 'but', 'not', 'what', 'where', 'when', 'why', 
-    'how', 'this', 'that', 'these', 'those', 'just', 'like', 'get', 'up',
-    'down', 'out', 'be', 'been', 'have', 'had', 'do', 'does', 'did', 'will', 
-    'would', 'can', 'could', 'one', 'two', 'three', 'four', 'five', 'time',
-    'know', 'all', 'from', 'really', 'very', 'gonna', 'wanna', 'yeah', 'okay', 
-    'it\'s', 'i\'m', 'you\'re', 'that\'s', 'we\'re', 'they\'re', 'don\'t', 'we', 'um', 
-    'yeah', 'right', 'so', 'going', 'me', 'some', 'lot', 'a lot', 'way',
-    'little', 'back', 'make', 'want', 'think', 'see', 'good', 'now', 'here', 'then', 'our',
-    'because', 'which', 'well', 'its', 'are'
-])
+# Rows per server-side cursor fetch and per worker task
+BATCH_SIZE = 5000
 
 def get_db_connection():
     try:
@@ -75,29 +71,135 @@ def analyze_common_words(text_list, max_num):
     :param text_list: List of transcript texts
     :param max_num: Max number of most common words user would like to see
     """
-    word_counter = Counter()
+    word_counter = count_words(text_list)
+
+    return top_terms(word_counter, max_num)
+
+def top_terms(counter, max_num):
+    """The max_num most common terms, ties by term: the same order as the SQL engine."""
+    return sorted(counter.items(), key=lambda item: (-item[1], item[0]))[:max_num]
+
+def stream_transcript_batches(batch_size=BATCH_SIZE):
+    """
+    Yields lists of (video_id, text) rows in playback order, batch_size rows at a time,
+    through a named (server-side) cursor so the client never holds the whole table.
+
+    :param batch_size: Rows fetched per round trip
+    """
+    connection = get_db_connection()
+    # A named cursor keeps the result set on the server; fetchmany pulls one batch per round trip
+    cursor = connection.cursor(name="analyze_common_words")
+    cursor.itersize = batch_size
+
+    try:
+        cursor.execute("SELECT video_id, text FROM transcripts ORDER BY video_id, start_time, id;")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+        connection.close()
+
+def count_batch(rows, ngram=1):
+    """
+    Map step, run in a worker process: counts the n-grams of one batch.
+    N-grams run across the snippets of a video but never across videos.
 
-    for text in text_list:
-        cleaned_text = re.sub(r"[^a-z\s]", "", text.lower())
-        words = cleaned_text.split()
+    :param rows: List of (video_id, text) rows in playback order
+    :param ngram: Words per counted term
+    :return: (Counter, edges) where edges = (first video_id, its first ngram-1 tokens,
+             last video_id, its last ngram-1 tokens), used to count the n-grams that
+             cross into the next batch
+    """
+    counter = Counter()
+    edge = ngram - 1
+    head = tail = []
+
+    for index, (video_id, group) in enumerate(groupby(rows, key=itemgetter(0))):
+        tokens = [token for _, text in group for token in tokenize(text)]
+        counter.update(ngrams(tokens, ngram))
+        if index == 0:
+            head = tokens[:edge]
+        tail = tokens[-edge:] if edge else []
+
+    return counter, (rows[0][0], head, rows[-1][0], tail)
+
+def _boundary_ngrams(tail, head, ngram):
+    """N-grams that start in the previous batch's tail and end in the next batch's head."""
+    tokens = tail + head
+    return [' '.join(tokens[i:i + ngram]) for i in range(len(tail)) if i + ngram <= len(tokens)]
+
+def analyze_common_words_streaming(max_num, ngram=1, workers=None, batch_size=BATCH_SIZE):
+    """
+    Counts the most common words (or n-grams) in all transcript text with bounded memory:
+    batches stream from a server-side cursor to a process pool, and each batch's Counter
+    is merged into the total as it finishes.
+
+    :param max_num: Max number of most common terms user would like to see
+    :param ngram: Words per counted term (1 = single words)
+    :param workers: Worker processes (default: CPU count)
+    :param batch_size: Rows per batch
+    """
+    workers = workers or os.cpu_count() or 1
+    total = Counter()
+    rows_seen = 0
+    previous_edges = None
 
-        filtered_words = [
-            word
-            for word in words
-            if len(word) > 2 and word not in STOP_WORDS
-        ]
+    def merge(result):
+        nonlocal previous_edges
+        counter, edges = result
+        total.update(counter)
+        if ngram > 1 and previous_edges is not None and previous_edges[2] == edges[0]:
+            # The same video continues into this batch
+            total.update(_boundary_ngrams(previous_edges[3], edges[1], ngram))
+            if edges[0] == edges[2] and len(edges[1]) < ngram - 1:
+                # Fewer tokens in this batch than one edge: carry the previous tail forward
+                edges = (edges[0], edges[1], edges[2], (previous_edges[3] + edges[3])[-(ngram - 1):])
+        previous_edges = edges
 
-        word_counter.update(filtered_words)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # At most two batches per worker in flight, so memory stays bounded however large the table is
+        pending = deque()
+        for rows in stream_transcript_batches(batch_size):
+            rows_seen += len(rows)
+            pending.append(executor.submit(count_batch, rows, ngram))
+            if len(pending) >= workers * 2:
+                merge(pending.popleft().result())
+        while pending:
+            merge(pending.popleft().result())
 
-    most_common = word_counter.most_common(max_num)
+    print(f"Analyzed {rows_seen} transcript snippets with {workers} worker processes.")
+    return top_terms(total, max_num)
 
-    return most_common
+def analyze_common_words_sql(max_num, ngram=1):
+    """
+    Counts the most common words (or n-grams) inside PostgreSQL with the same
+    tokenization rules (transcripts.text_stats.word_counts_sql); only the
+    top max_num rows are sent back.
+
+    :param max_num: Max number of most common terms user would like to see
+    :param ngram: Words per counted term (1 = single words)
+    """
+    connection = get_db_connection()
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute(*word_counts_sql(max_num, ngram))
+        return cursor.fetchall()
+    except Exception as e:
+        print(f"Error counting words in the database: {e}")
+        return []
+    finally:
+        cursor.close()
+        connection.close()
 
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(
         description="Analyzes all YouTube transcript text in the database to find the most common words.",
-        epilog="Use -n to specify the max number of words to display."
+        epilog="Use -n to specify the max number of words to display, -g for multi-word terms."
     )
 
     parser.add_argument(
@@ -107,21 +209,73 @@ if __name__ == "__main__":
         help="The number of top common words to display (default: 10)."
     )
     
+    parser.add_argument(
+        '-g', '--ngram',
+        type=int,
+        default=1,
+        help="Count runs of this many consecutive words (default: 1, single words)."
+    )
+
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=None,
+        help="Worker processes for tokenizing and counting (default: CPU count)."
+    )
+
+    parser.add_argument(
+        '-b', '--batch-size',
+        type=int,
+        default=BATCH_SIZE,
+        help=f"Rows read per server-side cursor fetch (default: {BATCH_SIZE})."
+    )
+
+    parser.add_argument(
+        '-e', '--engine',
+        choices=['python', 'sql'],
+        default='python',
+        help="Count in a local process pool (python, default) or inside PostgreSQL (sql)."
+    )
+
+    parser.add_argument(
+        '--in-memory',
+        action='store_true',
+        help="Load all text at once and count on one core (single words only; small databases)."
+    )
+    
     args = parser.parse_args()
     max_num_count = args.number
-    
-    all_transcript_text = fetch_all_transcript_text()
-    
-    if all_transcript_text:
-        print("\nAnalyzing word frequencies...")
-        
+
+    if args.ngram < 1:
+        parser.error("--ngram must be at least 1")
+    if args.in_memory and args.ngram > 1:
+        parser.error("--ngram is only supported in streaming mode")
+    if args.in_memory and args.engine == 'sql':
+        parser.error("--in-memory only applies to the python engine")
+
+    print("\nAnalyzing word frequencies...")
+
+    if args.engine == 'sql':
+        common_words = analyze_common_words_sql(max_num_count, ngram=args.ngram)
+    elif args.in_memory:
+        all_transcript_text = fetch_all_transcript_text()
+        if not all_transcript_text:
+            print("\nAnalysis failed: Could not retrieve any transcript text.")
+            sys.exit(1)
         common_words = analyze_common_words(all_transcript_text, max_num_count)
+    else:
+        common_words = analyze_common_words_streaming(
+            max_num_count, ngram=args.ngram, workers=args.workers, batch_size=args.batch_size
+        )
+
+    if common_words:
+        label = "Words" if args.ngram == 1 else f"{args.ngram}-grams"
+        print(f"\n------- Top {len(common_words)} Most Common {label} -------")
         
-        print(f"\n------- Top {len(common_words)} Most Common Words -------")
-        
+        width = max(12, max(len(word) for word, _ in common_words))
         for i, (word, count) in enumerate(common_words):
-            print(f"| {i+1:>3}. | {word:<{12}} | {count} occurrences |")
+            print(f"| {i+1:>3}. | {word:<{width}} | {count} occurrences |")
         
-        print("-" * 39)
+        print("-" * (width + 27))
     else:
         print("\nAnalysis failed: Could not retrieve any transcript text.")
\ No newline at end of file
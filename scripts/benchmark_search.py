@@ -0,0 +1,362 @@
+"""Retrieval quality and latency benchmark for the semantic_search backends.
+
+Fills text_chunks with a deterministic synthetic corpus (clustered embeddings,
+topic vocabulary for the lexical side), derives a labelled query set from it,
+and reports recall@k against exact search plus p50/p95/p99 latency and QPS
+for every backend/configuration at each corpus size.
+
+Queries run in three scopes: 'global', 'video' (small videos, which take the
+exact per-video scan) and 'large_video' (videos above
+VIDEO_EXACT_SEARCH_MAX_CHUNKS, which take the filtered HNSW path with
+iterative scans). Every LARGE_VIDEO_EVERY-th row belongs to a large video of
+up to LARGE_VIDEO_CHUNKS chunks.
+
+Run it against a scratch database only: it refuses to start if text_chunks
+contains anything besides its own 'bench_' rows.
+
+    python scripts/benchmark_search.py --scales 10000 100000 --output bench.json
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'transcripts_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from transcripts.semantic_search import _search_pgvector, _search_hybrid  # noqa: E402
+from transcripts.vector_index import NumpyVectorIndex  # noqa: E402
+
+DIMENSIONS = 768
+SEED = 1234
+N_TOPICS = 64
+WORDS_PER_TOPIC = 40
+CHUNKS_PER_VIDEO = 40
+LARGE_VIDEO_EVERY = 10
+LARGE_VIDEO_CHUNKS = 10000
+BLOCK_SIZE = 10000
+CHUNK_NOISE = 0.35
+QUERY_NOISE = 0.15
+WARMUP_QUERIES = 10
+BENCH_PREFIX = 'bench_'
+
+
+# ==================== SYNTHETIC CORPUS ====================
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+TOPIC_CENTERS = _normalize(np.random.default_rng(SEED).normal(size=(N_TOPICS, DIMENSIONS))).astype(np.float32)
+
+
+def chunk_id(row: int) -> str:
+    return f"{BENCH_PREFIX}chunk_{row}"
+
+
+def is_large_video_row(row: int) -> bool:
+    return row % LARGE_VIDEO_EVERY == 0
+
+
+def video_id(row: int) -> str:
+    if is_large_video_row(row):
+        return f"{BENCH_PREFIX}large_{row // LARGE_VIDEO_EVERY // LARGE_VIDEO_CHUNKS:04d}"
+    return f"{BENCH_PREFIX}{row // CHUNKS_PER_VIDEO:07d}"
+
+
+def start_time(row: int) -> float:
+    if is_large_video_row(row):
+        return (row // LARGE_VIDEO_EVERY % LARGE_VIDEO_CHUNKS) * 180.0
+    return (row % CHUNKS_PER_VIDEO) * 180.0
+
+
+def large_video_chunks(n_rows: int) -> int:
+    """Chunks in the first (largest) large video of a corpus of n_rows."""
+    return min(LARGE_VIDEO_CHUNKS, (n_rows + LARGE_VIDEO_EVERY - 1) // LARGE_VIDEO_EVERY)
+
+
+def generate_block(block: int):
+    """Deterministic (topics, embeddings) for rows [block * BLOCK_SIZE, (block + 1) * BLOCK_SIZE)."""
+    rng = np.random.default_rng([SEED, block])
+    topics = rng.integers(N_TOPICS, size=BLOCK_SIZE)
+    noise = rng.normal(scale=CHUNK_NOISE / np.sqrt(DIMENSIONS), size=(BLOCK_SIZE, DIMENSIONS))
+    return topics, _normalize(TOPIC_CENTERS[topics] + noise).astype(np.float32)
+
+
+def chunk_text(row: int, topic: int) -> str:
+    rng = np.random.default_rng([SEED, 7, row])
+    words = rng.integers(WORDS_PER_TOPIC, size=30)
+    return ' '.join(f"topic{topic}term{w}" for w in words)
+
+
+def existing_rows() -> int:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM text_chunks WHERE id NOT LIKE %s", [BENCH_PREFIX + '%'])
+        if cursor.fetchone()[0]:
+            print("✗ text_chunks contains non-benchmark rows; point DB_NAME/DATABASE_URL at a scratch database.")
+            sys.exit(1)
+        cursor.execute("SELECT COUNT(*) FROM text_chunks")
+        return cursor.fetchone()[0]
+
+
+def grow_corpus(target_rows: int) -> None:
+    """Append synthetic rows until text_chunks holds target_rows (smaller scales are prefixes)."""
+    current = existing_rows()
+    if current > target_rows:
+        print(f"✗ Corpus already has {current} rows (> {target_rows}); run scales in ascending order or --reset.")
+        sys.exit(1)
+
+    created_at = datetime.now(timezone.utc).isoformat()
+    while current < target_rows:
+        block = current // BLOCK_SIZE
+        topics, vectors = generate_block(block)
+        first = block * BLOCK_SIZE
+        last = min(first + BLOCK_SIZE, target_rows)
+
+        videos = io.StringIO()
+        for vid in sorted({video_id(row) for row in range(current, last)}):
+            videos.write(f"{vid}\t{created_at}\n")
+
+        chunks = io.StringIO()
+        for row in range(current, last):
+            offset = row - first
+            embedding = '[' + ','.join(f"{x:.6f}" for x in vectors[offset]) + ']'
+            chunks.write(
+                f"{chunk_id(row)}\t{video_id(row)}\t{chunk_text(row, topics[offset])}\t"
+                f"{start_time(row)}\t180.0\t{embedding}\tembedded\t{created_at}\n"
+            )
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("CREATE TEMP TABLE bench_videos (video_id VARCHAR(255), created_at TIMESTAMPTZ) ON COMMIT DROP")
+            videos.seek(0)
+            cursor.copy_expert("COPY bench_videos FROM STDIN", videos)
+            cursor.execute("""
+                INSERT INTO videos (video_id, created_at)
+                SELECT video_id, created_at FROM bench_videos
+                ON CONFLICT (video_id) DO NOTHING
+            """)
+            chunks.seek(0)
+            cursor.copy_expert("""
+                COPY text_chunks (id, video_id, text, start_time_seconds, duration, embedding, status, created_at)
+                FROM STDIN
+            """, chunks)
+            cursor.execute("""
+                INSERT INTO corpus_state (id, generation, updated_at) VALUES (1, 1, NOW())
+                ON CONFLICT (id) DO UPDATE SET generation = corpus_state.generation + 1, updated_at = NOW()
+            """)
+
+        current = last
+        print(f"  loaded {current}/{target_rows} rows")
+
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE text_chunks")
+
+
+def reset_corpus() -> None:
+    existing_rows()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("DELETE FROM text_chunks WHERE id LIKE %s", [BENCH_PREFIX + '%'])
+        cursor.execute("DELETE FROM videos WHERE video_id LIKE %s", [BENCH_PREFIX + '%'])
+
+
+# ==================== LABELLED QUERIES ====================
+
+SCOPES = ('global', 'video', 'large_video')
+
+
+def build_queries(n_rows: int, n_queries: int, top_k: int, scope: str) -> list:
+    """Queries are perturbed copies of known chunks; ground truth is an exact scan of the corpus."""
+    rng = np.random.default_rng([SEED, 99, n_rows])
+    if scope == 'large_video':
+        pool = np.arange(0, n_rows, LARGE_VIDEO_EVERY)
+    elif scope == 'video':
+        pool = np.asarray([row for row in range(n_rows) if not is_large_video_row(row)])
+    else:
+        pool = np.arange(n_rows)
+    sources = np.sort(rng.choice(pool, size=min(n_queries, len(pool)), replace=False))
+
+    queries = []
+    for source in sources:
+        topics, vectors = generate_block(source // BLOCK_SIZE)
+        offset = source % BLOCK_SIZE
+        noise = rng.normal(scale=QUERY_NOISE / np.sqrt(DIMENSIONS), size=DIMENSIONS)
+        queries.append({
+            'label': chunk_id(source),
+            'video_id': video_id(source) if scope != 'global' else None,
+            'embedding': _normalize(vectors[offset] + noise).astype(np.float32),
+            'text': ' '.join(chunk_text(source, topics[offset]).split()[:4]),
+        })
+
+    # Exact top-k per query, streamed block by block so memory stays O(block)
+    best = [[] for _ in queries]
+    matrix = np.stack([q['embedding'] for q in queries])
+    for block in range((n_rows + BLOCK_SIZE - 1) // BLOCK_SIZE):
+        _, vectors = generate_block(block)
+        rows = min(BLOCK_SIZE, n_rows - block * BLOCK_SIZE)
+        if scope != 'global':
+            block_videos = np.asarray([video_id(row) for row in range(block * BLOCK_SIZE, block * BLOCK_SIZE + rows)])
+        distances = (
+            (vectors[:rows] ** 2).sum(axis=1)[:, None]
+            - 2.0 * vectors[:rows] @ matrix.T
+            + (matrix ** 2).sum(axis=1)[None, :]
+        )
+        for qi, query in enumerate(queries):
+            column = distances[:, qi]
+            if query['video_id']:
+                column = np.where(block_videos == query['video_id'], column, np.inf)
+            k = min(top_k, rows)
+            nearest = np.argpartition(column, k - 1)[:k]
+            best[qi].extend((float(column[i]), chunk_id(block * BLOCK_SIZE + int(i)))
+                            for i in nearest if np.isfinite(column[i]))
+            best[qi] = sorted(best[qi])[:top_k]
+
+    for query, exact in zip(queries, best):
+        query['exact_ids'] = [cid for _, cid in exact]
+    return queries
+
+
+# ==================== CONFIGURATIONS ====================
+
+def pgvector_runner(ef_search: int = None, exact: bool = False, iterative: bool = True):
+    def run(query, top_k):
+        with override_settings(HNSW_EF_SEARCH=ef_search or 100, PGVECTOR_ITERATIVE_SCAN=iterative), \
+                transaction.atomic(), connection.cursor() as cursor:
+            if exact:
+                cursor.execute("SET LOCAL enable_indexscan = off")
+            if ef_search:
+                cursor.execute(f"SET LOCAL hnsw.ef_search = {int(ef_search)}")
+            return _search_pgvector(query['embedding'], query['video_id'], top_k)
+    return run
+
+
+def hybrid_runner():
+    def run(query, top_k):
+        return _search_hybrid(query['text'], query['embedding'], query['video_id'], top_k)
+    return run
+
+
+def numpy_runner(dtype: str, index_dir: str):
+    index = NumpyVectorIndex(os.path.join(index_dir, dtype), dtype=dtype)
+    index.refresh()
+
+    def run(query, top_k):
+        return index.search(query['embedding'], top_k=top_k, video_id=query['video_id'])
+    return run
+
+
+def configurations(index_dir: str, skip: set) -> dict:
+    configs = {
+        'pgvector_exact': lambda: pgvector_runner(exact=True),
+        'pgvector_hnsw_ef40': lambda: pgvector_runner(ef_search=40),
+        'pgvector_hnsw_ef100': lambda: pgvector_runner(ef_search=100),
+        'pgvector_hnsw_ef200': lambda: pgvector_runner(ef_search=200),
+        # Filtered scans without hnsw.iterative_scan: short results fall back to the exact scan
+        'pgvector_hnsw_no_iter': lambda: pgvector_runner(ef_search=100, iterative=False),
+        'hybrid_rrf': hybrid_runner,
+        'numpy_float16': lambda: numpy_runner('float16', index_dir),
+        'numpy_float32': lambda: numpy_runner('float32', index_dir),
+    }
+    return {name: factory for name, factory in configs.items() if name not in skip}
+
+
+# ==================== MEASUREMENT ====================
+
+def measure(run, queries: list, top_k: int) -> dict:
+    for query in queries[:WARMUP_QUERIES]:
+        run(query, top_k)
+
+    latencies = []
+    recalls = []
+    label_hits = 0
+    started = time.perf_counter()
+    for query in queries:
+        t0 = time.perf_counter()
+        results = run(query, top_k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+        returned = [r['id'] for r in results]
+        if query['exact_ids']:
+            recalls.append(len(set(returned) & set(query['exact_ids'])) / len(query['exact_ids']))
+        label_hits += query['label'] in returned
+    elapsed = time.perf_counter() - started
+
+    latencies = np.asarray(latencies)
+    return {
+        'queries': len(queries),
+        f'recall@{top_k}': float(np.mean(recalls)) if recalls else None,
+        f'label_hit@{top_k}': label_hits / len(queries),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'mean_ms': float(latencies.mean()),
+        'qps': len(queries) / elapsed,
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Benchmarks recall@k and latency of every semantic_search backend on a synthetic corpus.",
+        epilog="Requires a scratch database (DB_NAME / DATABASE_URL) with migrations applied."
+    )
+    parser.add_argument('--scales', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help="Corpus sizes (rows in text_chunks) to benchmark, ascending (default: 10k 100k 1M).")
+    parser.add_argument('--queries', type=int, default=200, help="Labelled queries per run (default: 200).")
+    parser.add_argument('-k', '--top-k', type=int, default=5, help="Results per query (default: 5).")
+    parser.add_argument('--skip', nargs='*', default=[], help="Configuration names to skip.")
+    parser.add_argument('--reset', action='store_true', help="Delete previous benchmark rows first.")
+    parser.add_argument('--output', default='benchmark_results.json', help="Where to write JSON results.")
+
+    args = parser.parse_args()
+
+    if args.reset:
+        reset_corpus()
+
+    report = {
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'top_k': args.top_k,
+        'dimensions': DIMENSIONS,
+        'seed': SEED,
+        'runs': [],
+    }
+
+    for scale in sorted(args.scales):
+        print(f"\n=== Corpus: {scale} chunks ===")
+        grow_corpus(scale)
+
+        with tempfile.TemporaryDirectory(prefix='bench_index_') as index_dir:
+            for scope in SCOPES:
+                if scope == 'large_video':
+                    chunks = large_video_chunks(scale)
+                    exact_max = getattr(settings, 'VIDEO_EXACT_SEARCH_MAX_CHUNKS', 5000)
+                    path = 'exact scan' if chunks <= exact_max else 'filtered HNSW'
+                    print(f"  large videos: {chunks} chunks (exact limit {exact_max}) -> {path}")
+                queries = build_queries(scale, args.queries, args.top_k, scope)
+                for name, factory in configurations(index_dir, set(args.skip)).items():
+                    metrics = measure(factory(), queries, args.top_k)
+                    report['runs'].append({'rows': scale, 'scope': scope, 'config': name, **metrics})
+                    print(
+                        f"| {scope:<11} | {name:<21} | recall@{args.top_k} {metrics[f'recall@{args.top_k}'] or 0:.3f} "
+                        f"| p50 {metrics['p50_ms']:7.2f} ms | p95 {metrics['p95_ms']:7.2f} ms "
+                        f"| p99 {metrics['p99_ms']:7.2f} ms | {metrics['qps']:8.1f} qps |"
+                    )
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
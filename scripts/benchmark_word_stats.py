@@ -0,0 +1,118 @@
+"""Compares the two engines of scripts/analyze_common_words.py on the current database.
+
+'python' streams every transcript row to a local process pool; 'sql' counts
+inside PostgreSQL and returns only the top N rows. For each engine the
+benchmark reports the median wall time over --repeat runs and the rows sent
+back to the client, then checks both engines produced the same ranking.
+
+Read-only, so it can run against a copy of the real corpus:
+
+    python scripts/benchmark_word_stats.py -n 50 --ngram 1 2 --repeat 3
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.analyze_common_words import (  # noqa: E402
+    BATCH_SIZE,
+    analyze_common_words_sql,
+    analyze_common_words_streaming,
+    get_db_connection,
+)
+
+ENGINES = ('python', 'sql')
+
+
+def count_transcript_rows() -> int:
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM transcripts")
+            return cursor.fetchone()[0]
+    finally:
+        connection.close()
+
+
+def run_engine(engine: str, max_num: int, ngram: int, workers: int, batch_size: int) -> list:
+    if engine == 'sql':
+        return analyze_common_words_sql(max_num, ngram=ngram)
+    return analyze_common_words_streaming(max_num, ngram=ngram, workers=workers, batch_size=batch_size)
+
+
+def benchmark(max_num: int, ngram: int, repeat: int, workers: int, batch_size: int, corpus_rows: int) -> dict:
+    report = {'ngram': ngram, 'n': max_num, 'engines': {}}
+    results = {}
+    for engine in ENGINES:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = run_engine(engine, max_num, ngram, workers, batch_size)
+            results[engine] = [(term, int(count)) for term, count in rows]
+            timings.append(time.perf_counter() - started)
+        report['engines'][engine] = {
+            'median_seconds': statistics.median(timings),
+            'min_seconds': min(timings),
+            # The python engine pulls every snippet; the sql engine only the ranking
+            'rows_transferred': corpus_rows if engine == 'python' else len(results[engine]),
+        }
+
+    report['results_match'] = results['python'] == results['sql']
+    if not report['results_match']:
+        report['mismatches'] = [
+            {'python': list(python_row) if python_row else None, 'sql': list(sql_row) if sql_row else None}
+            for python_row, sql_row in zip(results['python'], results['sql'])
+            if python_row != sql_row
+        ][:10]
+    python_seconds = report['engines']['python']['median_seconds']
+    sql_seconds = report['engines']['sql']['median_seconds']
+    report['speedup'] = python_seconds / sql_seconds if sql_seconds else None
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(f"\nngram={report['ngram']}  n={report['n']}  results match: {report['results_match']}")
+    print(f"{'engine':<8} {'median s':>10} {'min s':>10} {'rows':>12}")
+    for engine, stats in report['engines'].items():
+        print(f"{engine:<8} {stats['median_seconds']:>10.3f} {stats['min_seconds']:>10.3f} "
+              f"{stats['rows_transferred']:>12}")
+    if report['speedup']:
+        print(f"sql speedup: {report['speedup']:.1f}x")
+    for mismatch in report.get('mismatches', []):
+        print(f"  python {mismatch['python']}  sql {mismatch['sql']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the python and sql word-frequency engines.")
+    parser.add_argument('-n', '--number', type=int, default=50, help="Top terms to rank (default: 50).")
+    parser.add_argument('-g', '--ngram', type=int, nargs='+', default=[1],
+                        help="Term lengths to benchmark (default: 1).")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="Runs per engine (default: 3).")
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help="Worker processes for the python engine (default: CPU count).")
+    parser.add_argument('-b', '--batch-size', type=int, default=BATCH_SIZE,
+                        help=f"Rows per fetch for the python engine (default: {BATCH_SIZE}).")
+    parser.add_argument('--output', help="Also write the reports to this JSON file.")
+    args = parser.parse_args()
+
+    if args.repeat < 1 or min(args.ngram) < 1:
+        parser.error("--repeat and --ngram must be at least 1")
+
+    corpus_rows = count_transcript_rows()
+    print(f"Corpus: {corpus_rows} transcript snippets")
+
+    reports = []
+    for ngram in args.ngram:
+        report = benchmark(args.number, ngram, args.repeat, args.workers, args.batch_size, corpus_rows)
+        print_report(report)
+        reports.append(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'corpus_rows': corpus_rows, 'reports': reports}, f, indent=2)
+        print(f"\nWrote {args.output}")
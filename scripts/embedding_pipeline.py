@@ -1,14 +1,15 @@
 import os
 import re
+import sys
 import json
 import threading
 import queue
 import time
 from datetime import datetime
+from pathlib import Path
 from typing import Dict, List, Optional
 import psycopg2
 from psycopg2.extras import execute_values
-from openai import OpenAI
 from tenacity import (
     retry,
     wait_random_exponential,
@@ -17,6 +18,11 @@ from tenacity import (
 )
 from dotenv import load_dotenv
 
+# Repo root on the path for the Django-free shared helpers in transcripts/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from transcripts.model_clients import get_client, model_latency  # noqa: E402
+from transcripts.tokens import count_tokens  # noqa: E402
+
 load_dotenv()
 
 DATABASE_URL = os.getenv('DATABASE_URL')
@@ -47,11 +53,8 @@ EMBEDDING_MODEL = "nomic-ai/nomic-embed-text-v1.5-GGUF"
 EMBEDDING_BATCH_SIZE = 20  # Process 20 texts per API call
 PROCESSING_THREADS = 3
 
-# OpenAI client
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY", "not-needed"),
-    base_url=os.getenv("OPENAI_BASE_URL", "http://127.0.0.1:1234/v1")
-)
+# Shared pooled client (timeouts, keep-alive, per-endpoint latency)
+client = get_client()
 
 # Thread-safe progress tracking
 progress_lock = threading.Lock()
@@ -283,22 +286,37 @@ def insert_chunks_with_embeddings(video_id: str, chunks: List[Dict]) -> bool:
                 chunk['text'],
                 chunk['start_time_seconds'],
                 chunk.get('duration'),
+                count_tokens(chunk['text']),
                 embedding_str,
                 'embedded' if embedding else 'pending',
                 datetime.utcnow()
             ))
         
-        # Bulk insert with ON CONFLICT
-        execute_values(
+        # Bulk insert with ON CONFLICT. execute_values sends one statement per
+        # page, so cur.rowcount only covers the last page; count RETURNING rows instead.
+        inserted = execute_values(
             cur,
             """
             INSERT INTO text_chunks
-            (id, video_id, text, start_time_seconds, duration, embedding, status, created_at)
+            (id, video_id, text, start_time_seconds, duration, token_count, embedding, status, created_at)
             VALUES %s
             ON CONFLICT (id) DO NOTHING
+            RETURNING id
             """,
-            values
+            values,
+            fetch=True
         )
+
+        if inserted:
+            # Bump the corpus generation in the same transaction so cached search
+            # results are invalidated exactly when the new chunks become visible.
+            # A re-run that inserted nothing leaves the caches alone.
+            cur.execute("""
+                INSERT INTO corpus_state (id, generation, updated_at)
+                VALUES (1, 1, NOW())
+                ON CONFLICT (id) DO UPDATE
+                SET generation = corpus_state.generation + 1, updated_at = NOW()
+            """)
         
         conn.commit()
         return True
@@ -424,6 +442,9 @@ def main():
     
     print(f"\n{'='*60}")
     print(f"Processing complete! {completed_count}/{total_count} videos processed.")
+    for endpoint, stats in model_latency.stats().items():
+        print(f"{endpoint}: {stats['requests']} requests, {stats['errors']} errors, "
+              f"p50 {stats['p50_ms']:.0f} ms, p95 {stats['p95_ms']:.0f} ms")
     print(f"{'='*60}")
 
 
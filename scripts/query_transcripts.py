@@ -4,6 +4,11 @@ from dotenv import load_dotenv
 import psycopg2
 from psycopg2 import sql
 import argparse
+from pathlib import Path
+
+# Repo root on the path for the Django-free shared helpers in transcripts/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from transcripts.documents import find_phrase, normalize_phrase  # noqa: E402
 
 load_dotenv()
 
@@ -99,11 +104,57 @@ def search_by_keyword(keyword):
         cursor.close()
         connection.close()
 
+def search_by_phrase(phrase):
+    """
+    Searches the per-video transcript documents for the given phrase (case-insensitive),
+    including phrases split across snippets, and prints each match with its timestamp.
+
+    :param phrase: The words the user would like to find in sequence
+    """
+    phrase = normalize_phrase(phrase or '')
+    if not phrase:
+        print("Error: Phrase cannot be empty for search.")
+        return
+
+    connection = get_db_connection()
+    cursor = connection.cursor()
+
+    try:
+        # UPPER(text) LIKE is served by the transcript_documents_text_trgm index
+        cursor.execute("""
+            SELECT video_id, text, offsets, start_times
+            FROM transcript_documents
+            WHERE UPPER(text) LIKE UPPER(%s)
+            ORDER BY video_id;
+        """, (f"%{phrase}%",))
+
+        print(f"\n--- Phrase Results for '{phrase}' ---")
+
+        found = 0
+        print(f"| {'Video ID':<11} | {'Start (sec)':<11} | {'Context':<50} |")
+        print("-" * 82)
+        for vid_id, text, offsets, start_times in cursor:
+            hits, _ = find_phrase(text, offsets, start_times, phrase)
+            for hit in hits:
+                found += 1
+                print(f"| {vid_id:<11} | {hit['start_time']:<11.2f} | {hit['context']:<50} |")
+
+        if found:
+            print(f"Found {found} results.")
+        else:
+            print("No matching transcripts found.")
+
+    except Exception as e:
+        print(f"Error executing phrase search: {e}")
+    finally:
+        cursor.close()
+        connection.close()
+
 if __name__ == "__main__":
     
     parser = argparse.ArgumentParser(
         description="Utility for querying the YouTube transcript database.",
-        epilog="Use -k <keyword> to search transcripts"
+        epilog="Use -k <keyword> to search transcripts, -p <phrase> to search across snippet boundaries"
     )
 
     parser.add_argument(
@@ -113,9 +164,18 @@ if __name__ == "__main__":
         default=None
     )
 
+    parser.add_argument(
+        '-p', '--phrase',
+        type=str,
+        help="Phrase to search for, also when it spans several transcript snippets.",
+        default=None
+    )
+
     args = parser.parse_args()
     
-    if args.keyword:
+    if args.phrase:
+        search_by_phrase(args.phrase)
+    elif args.keyword:
         search_by_keyword(args.keyword)
     else:
         v_count, t_count = query_database()
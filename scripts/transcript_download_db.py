@@ -7,11 +7,18 @@ from youtube_transcript_api._errors import TranscriptsDisabled
 from youtube_transcript_api.formatters import WebVTTFormatter
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 import random
 import time
 import threading
 import queue
+from pathlib import Path
+
+# Repo root on the path for the Django-free shared helpers in transcripts/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from transcripts.documents import build_document  # noqa: E402
+from transcripts.text_stats import count_words  # noqa: E402
 
 load_dotenv()
 
@@ -101,6 +108,46 @@ def get_video_transcripts(video_id):
         print(f"✗ Error fetching transcript for {video_id}: {e}")
         return None
 
+def word_count_deltas(old_counts, new_counts):
+    """(word, change) for every word whose count differs, sorted by word.
+
+    Sorted so concurrent ingests lock word_counts rows in the same order.
+    """
+    deltas = [
+        (word, new_counts.get(word, 0) - old_counts.get(word, 0))
+        for word in sorted(set(new_counts) | set(old_counts))
+    ]
+    return [(word, delta) for word, delta in deltas if delta]
+
+def replace_word_counts(cursor, video_id, new_counts):
+    """Replace the video's counts and apply the difference to the corpus-wide totals,
+    so re-ingesting a video does not count it twice. Words whose total drops to zero
+    are removed."""
+    cursor.execute("DELETE FROM video_word_counts WHERE video_id = %s RETURNING word, count", (video_id,))
+    old_counts = dict(cursor.fetchall())
+    if new_counts:
+        execute_values(
+            cursor,
+            "INSERT INTO video_word_counts (video_id, word, count) VALUES %s",
+            [(video_id, word, count) for word, count in sorted(new_counts.items())],
+            page_size=1000
+        )
+    deltas = word_count_deltas(old_counts, new_counts)
+    if deltas:
+        execute_values(
+            cursor,
+            """
+            INSERT INTO word_counts (word, count) VALUES %s
+            ON CONFLICT (word) DO UPDATE SET count = word_counts.count + EXCLUDED.count
+            """,
+            deltas,
+            page_size=1000
+        )
+        cursor.execute(
+            "DELETE FROM word_counts WHERE word = ANY(%s) AND count <= 0",
+            ([word for word, delta in deltas if delta < 0],)
+        )
+
 def store_transcript(video_id, transcript):
     try:
         connection = psycopg2.connect(
@@ -122,6 +169,24 @@ def store_transcript(video_id, transcript):
             (video_id,)
         )
 
+        # Re-ingesting a video replaces its snippets, document and word counts. The row lock
+        # serializes concurrent ingests (and build_word_counts) of the same video.
+        cursor.execute("SELECT 1 FROM videos WHERE video_id = %s FOR UPDATE", (video_id,))
+        cursor.execute("DELETE FROM transcripts WHERE video_id = %s", (video_id,))
+        # Chunks cut from the old snippets go too, so embedding_pipeline.py re-chunks the video
+        # (it picks up videos with transcripts and no text_chunks). Bump the corpus generation in the
+        # same transaction so cached search results are invalidated when the old chunks disappear.
+        cursor.execute("DELETE FROM text_chunks WHERE video_id = %s", (video_id,))
+        if cursor.rowcount:
+            cursor.execute(
+                """
+                INSERT INTO corpus_state (id, generation, updated_at)
+                VALUES (1, 1, NOW())
+                ON CONFLICT (id) DO UPDATE
+                SET generation = corpus_state.generation + 1, updated_at = NOW()
+                """
+            )
+
         # Insert transcript entries
         transcript_data = [
             (video_id, each["text"], each["start"], each["duration"])
@@ -134,6 +199,26 @@ def store_transcript(video_id, transcript):
             """
         cursor.executemany(insert_query, transcript_data)
 
+        # Per-video document for phrase search, written in the same transaction as the snippets
+        text, offsets, start_times = build_document(
+            (each["text"], each["start"]) for each in transcript
+        )
+        cursor.execute(
+            """
+            INSERT INTO transcript_documents (video_id, text, offsets, start_times, updated_at)
+            VALUES (%s, %s, %s, %s, NOW())
+            ON CONFLICT (video_id) DO UPDATE
+                SET text = EXCLUDED.text,
+                    offsets = EXCLUDED.offsets,
+                    start_times = EXCLUDED.start_times,
+                    updated_at = EXCLUDED.updated_at
+            """,
+            (video_id, text, offsets, start_times)
+        )
+
+        # Word frequencies for common_words/
+        replace_word_counts(cursor, video_id, count_words(each["text"] for each in transcript))
+
         connection.commit()
         cursor.close()
         connection.close()
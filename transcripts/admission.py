@@ -0,0 +1,223 @@
+"""Admission control for chat completions.
+
+At most ``max_concurrent`` completions run at once; the rest wait in a
+priority queue (lower value first, FIFO within a priority) until a slot frees
+up or their queue-time deadline passes. Requests are shed with
+AdmissionRejected - before queueing when the queue is full, or when the
+deadline expires - so an overloaded model server degrades into fast 503s
+instead of every request timing out together.
+
+Slots are handed directly to the next waiter on release, so sync callers
+(threads) and async callers (event loops) share one queue.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+import numpy as np
+
+# Priority for work nobody is waiting on (e.g. conversation summaries)
+BACKGROUND_PRIORITY = 10 ** 9
+
+WAIT_SAMPLES = 2048
+
+
+class AdmissionRejected(Exception):
+    """The request was shed; retry_after is a suggested delay in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('event', 'loop', 'future', 'granted', 'cancelled')
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+        self.cancelled = False
+
+    def grant(self) -> bool:
+        # Caller holds the controller lock
+        if self.loop is None:
+            self.granted = True
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
+        except RuntimeError:
+            # The waiter's event loop is gone
+            return False
+        self.granted = True
+        return True
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class AdmissionController:
+
+    def __init__(self, max_concurrent: int = 4, max_queue: int = 64, queue_timeout: float = 10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._heap = []  # (priority, sequence, waiter)
+        self._sequence = itertools.count()
+        self._active = 0
+        self._queued = 0
+        self._admitted = 0
+        self._rejected_full = 0
+        self._rejected_timeout = 0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._service_time = None  # EWMA of seconds a slot is held
+
+    # ==================== ACQUIRE / RELEASE ====================
+
+    def _try_enter(self, priority: float, waiter_factory):
+        """Returns None when a slot was taken immediately, else the queued waiter (lock held by caller)."""
+        if self._active < self.max_concurrent and not self._queued:
+            self._active += 1
+            self._admitted += 1
+            self._waits.append(0.0)
+            return None
+        if self._queued >= self.max_queue:
+            self._rejected_full += 1
+            raise AdmissionRejected('Model server is at capacity; queue is full', self._retry_after())
+        waiter = waiter_factory()
+        heapq.heappush(self._heap, (priority, next(self._sequence), waiter))
+        self._queued += 1
+        return waiter
+
+    def _give_up(self, waiter: _Waiter, started: float, timed_out: bool = True) -> bool:
+        """After a timeout/cancel: True if the slot was granted meanwhile (caller then owns it)."""
+        with self._lock:
+            if waiter.granted:
+                self._record_wait(started)
+                return True
+            waiter.cancelled = True
+            self._queued -= 1
+            if timed_out:
+                self._rejected_timeout += 1
+            return False
+
+    def _record_wait(self, started: float) -> None:
+        # Caller holds the lock
+        self._admitted += 1
+        self._waits.append(time.monotonic() - started)
+
+    def _release(self, held_for: float) -> None:
+        with self._lock:
+            self._service_time = held_for if self._service_time is None else (
+                0.8 * self._service_time + 0.2 * held_for
+            )
+            while self._heap:
+                _, _, waiter = heapq.heappop(self._heap)
+                if waiter.cancelled:
+                    continue
+                # Hand the slot straight to the next waiter; _active stays the same
+                self._queued -= 1
+                if waiter.grant():
+                    return
+            self._active -= 1
+
+    def _retry_after(self) -> int:
+        service_time = self._service_time or 1.0
+        return max(1, math.ceil(service_time * (self._queued + 1) / self.max_concurrent))
+
+    @contextmanager
+    def slot(self, priority: float = 0, timeout: float = None):
+        """Hold one completion slot for the duration of the with-block (blocking threads)."""
+        timeout = self.queue_timeout if timeout is None else timeout
+        started = time.monotonic()
+        with self._lock:
+            waiter = self._try_enter(priority, _Waiter)
+
+        if waiter is not None:
+            if waiter.event.wait(timeout):
+                with self._lock:
+                    self._record_wait(started)
+            elif not self._give_up(waiter, started):
+                raise AdmissionRejected(
+                    f'Model server busy: no capacity within {timeout:g}s', self.retry_after()
+                )
+
+        acquired = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - acquired)
+
+    @asynccontextmanager
+    async def aslot(self, priority: float = 0, timeout: float = None):
+        """Async slot(): waiting does not block the event loop."""
+        timeout = self.queue_timeout if timeout is None else timeout
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            waiter = self._try_enter(priority, lambda: _Waiter(loop))
+
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+                with self._lock:
+                    self._record_wait(started)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if self._give_up(waiter, started, timed_out=isinstance(e, asyncio.TimeoutError)):
+                    if isinstance(e, asyncio.CancelledError):
+                        # Granted just as the client went away: pass the slot on
+                        self._release(0.0)
+                        raise
+                else:
+                    if isinstance(e, asyncio.CancelledError):
+                        raise
+                    raise AdmissionRejected(
+                        f'Model server busy: no capacity within {timeout:g}s', self.retry_after()
+                    )
+
+        acquired = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - acquired)
+
+    # ==================== LOAD SHEDDING / METRICS ====================
+
+    def retry_after(self) -> int:
+        with self._lock:
+            return self._retry_after()
+
+    def overloaded(self):
+        """Retry-After seconds if a new request would be rejected right now, else None."""
+        with self._lock:
+            if self._queued >= self.max_queue:
+                return self._retry_after()
+            return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = list(self._waits)
+            stats = {
+                'max_concurrent': self.max_concurrent,
+                'active': self._active,
+                'queued': self._queued,
+                'max_queue': self.max_queue,
+                'queue_timeout_seconds': self.queue_timeout,
+                'admitted': self._admitted,
+                'rejected_queue_full': self._rejected_full,
+                'rejected_timeout': self._rejected_timeout,
+                'avg_service_seconds': self._service_time or 0.0,
+            }
+        p50, p95, p99 = np.percentile(waits, [50, 95, 99]) * 1000 if waits else (0.0, 0.0, 0.0)
+        stats.update({'wait_p50_ms': float(p50), 'wait_p95_ms': float(p95), 'wait_p99_ms': float(p99)})
+        return stats
@@ -0,0 +1,104 @@
+"""Semantic answer cache: reuse an LLM answer for a near-duplicate question with identical evidence."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Size-bounded, TTL'd cache of generated answers.
+
+    Entries are bucketed by (model, exact set of retrieved chunk ids). Within
+    a bucket a lookup hits when the cosine similarity between the new and the
+    cached question embeddings reaches ``similarity_threshold``. Every entry
+    is stamped with the version of the evidence it was generated from; a
+    lookup with a different version (the cited chunks were re-chunked or
+    deleted) drops the entry as stale.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: int = 3600, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()  # entry id -> (bucket, expires_at, evidence_version, embedding, result)
+        self._buckets = {}             # bucket -> set of entry ids
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _bucket(model: str, chunk_ids: Iterable[str]) -> tuple:
+        return model, frozenset(chunk_ids)
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def get(self, question_embedding, chunk_ids: Iterable[str], model: str, evidence_version) -> Optional[dict]:
+        """Return the cached result for a similar question over the same chunks, or None."""
+        bucket = self._bucket(model, chunk_ids)
+        query = self._unit(question_embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            best_id, best_similarity = None, self.similarity_threshold
+            for entry_id in list(self._buckets.get(bucket, ())):
+                _, expires_at, entry_version, embedding, _ = self._entries[entry_id]
+                if expires_at <= now or entry_version != evidence_version:
+                    self._remove(entry_id)
+                    continue
+                similarity = float(embedding @ query)
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None:
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self._hits += 1
+            return dict(self._entries[best_id][4], cache_similarity=best_similarity)
+
+    def set(self, question_embedding, chunk_ids: Iterable[str], model: str, evidence_version, result: dict) -> None:
+        bucket = self._bucket(model, chunk_ids)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (
+                bucket, time.monotonic() + self.ttl, evidence_version, self._unit(question_embedding), dict(result)
+            )
+            self._buckets.setdefault(bucket, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int) -> None:
+        # Caller must hold self._lock
+        bucket = self._entries.pop(entry_id)[0]
+        ids = self._buckets.get(bucket)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._buckets[bucket]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'similarity_threshold': self.similarity_threshold,
+            }
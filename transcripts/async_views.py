@@ -0,0 +1,152 @@
+"""Async versions of the semantic search and chat endpoints.
+
+Served under ASGI (``uvicorn transcripts_project.asgi:application``), a
+request awaiting the embedding or chat model only holds a coroutine, so one
+worker process can keep many chat requests in flight. DRF 3.14 has no async
+views, so these are plain Django views with the same request/response bodies
+as SemanticSearchAPIView and ChatAPIView, parsed by the same helpers.
+
+They are meant for ASGI. Under WSGI (runserver, gunicorn sync workers) they
+still work, but every request runs on a fresh event loop, so its model client
+is opened and closed per request and streamed answers arrive in one piece.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from .models import Conversation
+from .model_clients import aclose_async_client
+from .rag_service import aanswer_question, astream_answer, llm_admission
+from .memory import load_history, asave_turn, schedule_summary
+from .semantic_search import asemantic_search
+from .views import parse_chat_request, parse_search_request
+
+
+def _json_body(request) -> dict:
+    try:
+        data = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _overloaded_response(result: dict) -> JsonResponse:
+    response = JsonResponse(result, status=503)
+    response['Retry-After'] = str(result['retry_after'])
+    return response
+
+
+class _ModelClientView(View):
+    """Closes the per-loop model client after requests that were not served through ASGI."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        finally:
+            if not isinstance(request, ASGIRequest):
+                await aclose_async_client()
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class SemanticSearchAsyncView(_ModelClientView):
+    """Async semantic search: same request and response bodies as SemanticSearchAPIView."""
+
+    async def post(self, request):
+        data = _json_body(request)
+        if data is None:
+            return JsonResponse({'error': 'request body must be a JSON object'}, status=400)
+
+        params, error = parse_search_request(data)
+        if error:
+            return JsonResponse({'error': error}, status=400)
+
+        result = await asemantic_search(params['query'], params['video_id'], params['top_k'],
+                                        backend=params['backend'], mode=params['search_mode'],
+                                        diversify=params['diversify'])
+
+        if 'error' in result:
+            return JsonResponse(result, status=500)
+
+        return JsonResponse(result, status=200)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ChatAsyncView(_ModelClientView):
+    """Async RAG chat: same request and response bodies (including "stream": true) as ChatAPIView."""
+
+    async def post(self, request):
+        data = _json_body(request)
+        if data is None:
+            return JsonResponse({'error': 'request body must be a JSON object'}, status=400)
+
+        params, error = parse_chat_request(data)
+        if error:
+            return JsonResponse({'error': error}, status=400)
+        question, conversation_id, video_id = params['question'], params['conversation_id'], params['video_id']
+        top_k, search_mode, diversify = params['top_k'], params['search_mode'], params['diversify']
+        memory, stream = params['memory'], params['stream']
+
+        retry_after = llm_admission.overloaded()
+        if retry_after:
+            return _overloaded_response({'error': 'Model server is at capacity; retry later', 'retry_after': retry_after})
+
+        conversation, _ = await Conversation.objects.aget_or_create(session_id=conversation_id)
+
+        conversation_history, summary = await sync_to_async(load_history)(conversation, question, memory)
+
+        if stream:
+            events = astream_answer(question, video_id, conversation_history, top_k,
+                                    search_mode=search_mode, diversify=diversify, summary=summary,
+                                    conversation_id=conversation_id)
+            response = StreamingHttpResponse(
+                _sse_stream(events, conversation, question, memory,
+                            close_client=not isinstance(request, ASGIRequest)),
+                content_type='text/event-stream'
+            )
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+            return response
+
+        result = await aanswer_question(question, video_id, conversation_history, top_k,
+                                        search_mode=search_mode, diversify=diversify, summary=summary,
+                                        conversation_id=conversation_id)
+
+        if 'retry_after' in result:
+            return _overloaded_response(result)
+
+        if 'error' in result:
+            await asave_turn(conversation, question)
+            return JsonResponse(result, status=500)
+
+        await asave_turn(conversation, question, result['answer'])
+        if memory == 'summary':
+            schedule_summary(conversation.id)
+
+        return JsonResponse(result, status=200)
+
+
+async def _sse_stream(events, conversation, question, memory='window', close_client=False):
+    """Async counterpart of ChatAPIView._sse_stream.
+
+    Under WSGI Django drains the stream on a loop of its own, so close_client
+    closes that loop's model client once the stream ends.
+    """
+    try:
+        async for event, payload in events:
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+            if event == 'error' and 'retry_after' not in payload:
+                await asave_turn(conversation, question)
+            elif event == 'done':
+                await asave_turn(conversation, question, payload['answer'])
+                if memory == 'summary':
+                    schedule_summary(conversation.id)
+    finally:
+        if close_client:
+            await aclose_async_client()
@@ -0,0 +1,91 @@
+"""Per-conversation state carried between chat turns: the history window and the last evidence set."""
+
+import hashlib
+import threading
+from typing import Optional
+
+from django.core.cache import caches
+
+
+class ConversationContextCache:
+    """Two Django cache entries per conversation.
+
+    history:  the newest messages as (id, role, content) tuples, stamped with
+              Conversation.updated_at. Every saved turn bumps updated_at, so an
+              entry whose stamp differs from the row (a turn written by another
+              worker process) is ignored and reloaded from the database.
+    evidence: the chunks of the last retrieval with their embeddings, the query
+              embedding that found them, the search parameters and the corpus
+              generation they were retrieved under.
+    """
+
+    EVIDENCE_OUTCOMES = ('reused', 'extended', 'retrieved')
+
+    def __init__(self, ttl: int = 1800, cache_alias: str = 'default', enabled: bool = True):
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._history_hits = 0
+        self._history_misses = 0
+        self._evidence = dict.fromkeys(self.EVIDENCE_OUTCOMES, 0)
+
+    @staticmethod
+    def make_key(kind: str, session_id: str) -> str:
+        digest = hashlib.sha1(session_id.encode('utf-8')).hexdigest()
+        return f"conversation_{kind}:{digest}"
+
+    # ==================== HISTORY ====================
+
+    def get_history(self, conversation, record: bool = True) -> Optional[list]:
+        """The cached window if it matches conversation.updated_at, else None."""
+        if not self.enabled:
+            return None
+        entry = caches[self.cache_alias].get(self.make_key('history', conversation.session_id))
+        hit = entry is not None and entry['version'] == conversation.updated_at
+        if record:
+            with self._lock:
+                if hit:
+                    self._history_hits += 1
+                else:
+                    self._history_misses += 1
+        return entry['messages'] if hit else None
+
+    def set_history(self, conversation, messages: list) -> None:
+        if self.enabled:
+            caches[self.cache_alias].set(
+                self.make_key('history', conversation.session_id),
+                {'version': conversation.updated_at, 'messages': messages},
+                timeout=self.ttl,
+            )
+
+    # ==================== EVIDENCE ====================
+
+    def get_evidence(self, session_id: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        return caches[self.cache_alias].get(self.make_key('evidence', session_id))
+
+    def set_evidence(self, session_id: str, evidence: dict, outcome: str) -> None:
+        caches[self.cache_alias].set(self.make_key('evidence', session_id), evidence, timeout=self.ttl)
+        self.record_evidence(outcome)
+
+    def record_evidence(self, outcome: str) -> None:
+        with self._lock:
+            self._evidence[outcome] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._history_hits + self._history_misses
+            turns = sum(self._evidence.values())
+            return {
+                'enabled': self.enabled,
+                'history_hits': self._history_hits,
+                'history_misses': self._history_misses,
+                'history_hit_rate': self._history_hits / lookups if lookups else 0.0,
+                'evidence_reused': self._evidence['reused'],
+                'evidence_extended': self._evidence['extended'],
+                'evidence_retrieved': self._evidence['retrieved'],
+                'evidence_reuse_rate': self._evidence['reused'] / turns if turns else 0.0,
+                'ttl_seconds': self.ttl,
+            }
@@ -0,0 +1,69 @@
+"""Per-video transcript documents for phrase search.
+
+A video's snippets are only a few words each, so a phrase is often split
+across rows. A document joins them, in playback order and separated by single
+spaces, into one text; ``offsets[i]`` is the character position where snippet
+``i`` begins and ``start_times[i]`` its start in seconds, so any match position
+maps back to a timestamp with one binary search.
+
+Kept free of Django imports so scripts/transcript_download_db.py can build
+documents at ingest.
+"""
+
+import bisect
+import re
+from typing import Iterable, List, Optional, Tuple
+
+SEPARATOR = ' '
+# Characters of surrounding text returned with every match
+CONTEXT_CHARS = 60
+
+
+def normalize_phrase(phrase: str) -> str:
+    """Collapse whitespace (line breaks included) the way build_document does."""
+    return ' '.join(phrase.split())
+
+
+def build_document(snippets: Iterable[Tuple[str, Optional[float]]]) -> Tuple[str, List[int], List[float]]:
+    """Join (text, start_time) snippets in playback order; returns (text, offsets, start_times)."""
+    parts = []
+    offsets = []
+    start_times = []
+    position = 0
+    for text, start_time in snippets:
+        text = normalize_phrase(text or '')
+        if not text:
+            continue
+        if parts:
+            position += len(SEPARATOR)
+        offsets.append(position)
+        start_times.append(float(start_time or 0.0))
+        parts.append(text)
+        position += len(text)
+    return SEPARATOR.join(parts), offsets, start_times
+
+
+def find_phrase(text: str, offsets: List[int], start_times: List[float], phrase: str,
+                limit: int = None) -> Tuple[List[dict], int]:
+    """Case-insensitive occurrences of phrase in a document.
+
+    Returns (hits, total): at most ``limit`` hits in document order, and the
+    number of occurrences. Each hit has the start time of the snippet where
+    the match begins, how many snippets it spans and the surrounding text.
+    """
+    pattern = re.compile(re.escape(normalize_phrase(phrase)), re.IGNORECASE)
+    hits = []
+    total = 0
+    for match in pattern.finditer(text):
+        total += 1
+        if limit is not None and len(hits) >= limit:
+            continue
+        first = bisect.bisect_right(offsets, match.start()) - 1
+        last = bisect.bisect_right(offsets, match.end() - 1) - 1
+        hits.append({
+            'start_time': start_times[first],
+            'snippets': last - first + 1,
+            'position': match.start(),
+            'context': text[max(0, match.start() - CONTEXT_CHARS):match.end() + CONTEXT_CHARS],
+        })
+    return hits, total
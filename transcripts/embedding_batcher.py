@@ -0,0 +1,128 @@
+"""Micro-batching for query embeddings.
+
+Concurrent callers each submit one text; a dispatcher thread collects them for
+up to ``max_wait`` seconds (or until ``max_batch_size`` are waiting) and sends
+them as one embeddings request, then hands every caller its own vector. While
+``max_concurrent_batches`` requests are in flight, new texts keep queueing, so
+batches grow with load instead of requests multiplying. A caller never waits
+longer than ``timeout`` for its vector.
+"""
+
+import threading
+import time
+import queue
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor, TimeoutError
+from typing import Callable, List
+
+
+class EmbeddingBatcher:
+
+    def __init__(self, embed_fn: Callable[[List[str]], List[list]], max_batch_size: int = 32,
+                 max_wait: float = 0.005, max_concurrent_batches: int = 4, timeout: float = 150.0):
+        """
+        Args:
+            embed_fn: Embeds a list of texts with one upstream call; returns vectors in input order
+            max_batch_size: Most texts sent in one request
+            max_wait: Seconds the first text of a batch waits for company
+            max_concurrent_batches: Embedding requests allowed in flight at once
+            timeout: Seconds embed() waits for a vector (queueing included) before giving up
+        """
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._slots = threading.Semaphore(max_concurrent_batches)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_batches,
+                                            thread_name_prefix='embedding-batch')
+        self._dispatcher = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._texts = 0
+        self._largest_batch = 0
+
+    def submit(self, text: str) -> Future:
+        """Queue a text; the returned future resolves to its embedding."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> list:
+        """Blocking submit; raises concurrent.futures.TimeoutError after ``timeout`` seconds."""
+        future = self.submit(text)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def _ensure_started(self) -> None:
+        # Started lazily so forked worker processes each run their own dispatcher
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            with self._start_lock:
+                if self._dispatcher is None or not self._dispatcher.is_alive():
+                    self._dispatcher = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                    self._dispatcher.start()
+
+    def _run(self) -> None:
+        while True:
+            # Wait for a free request slot first: while all are busy, texts accumulate in the queue
+            self._slots.acquire()
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._executor.submit(self._dispatch, batch)
+
+    @staticmethod
+    def _resolve(future: Future, result=None, exception: BaseException = None) -> None:
+        # The caller may have timed out and cancelled its future already
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def _dispatch(self, batch: list) -> None:
+        try:
+            embeddings = self.embed_fn([text for text, _ in batch])
+        except BaseException as e:
+            for _, future in batch:
+                self._resolve(future, exception=e)
+            return
+        finally:
+            self._slots.release()
+
+        with self._stats_lock:
+            self._batches += 1
+            self._texts += len(batch)
+            self._largest_batch = max(self._largest_batch, len(batch))
+
+        if len(embeddings) != len(batch):
+            # Vectors cannot be matched to texts safely; fail the whole batch rather than leave futures pending
+            error = ValueError(f"Embeddings request returned {len(embeddings)} vectors for {len(batch)} texts")
+            for _, future in batch:
+                self._resolve(future, exception=error)
+            return
+        for (_, future), embedding in zip(batch, embeddings):
+            self._resolve(future, embedding)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                'batches': self._batches,
+                'texts': self._texts,
+                'mean_batch_size': self._texts / self._batches if self._batches else 0.0,
+                'largest_batch': self._largest_batch,
+                'queued': self._queue.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+            }
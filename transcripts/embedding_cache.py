@@ -0,0 +1,101 @@
+"""In-process LRU cache for query embeddings, optionally backed by Django's cache."""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from django.core.cache import caches
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so trivially different queries share a key."""
+    return ' '.join(query.lower().split())
+
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU cache with TTL for query embeddings.
+
+    Entries are keyed by the normalized query text and the embedding model.
+    When ``shared`` is enabled, misses in the local LRU fall through to the
+    Django cache framework so embeddings are shared across worker processes.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: int = 3600,
+                 shared: bool = False, cache_alias: str = 'default'):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self.cache_alias = cache_alias
+        self._entries = OrderedDict()  # key -> (expires_at, embedding)
+        self._lock = threading.Lock()
+        self._local_hits = 0
+        self._shared_hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_key(query: str, model: str) -> str:
+        digest = hashlib.sha1(f"{model}\x00{normalize_query(query)}".encode('utf-8')).hexdigest()
+        return f"query_embedding:{digest}"
+
+    def get(self, query: str, model: str) -> Optional[List[float]]:
+        """Return the cached embedding or None on a miss."""
+        key = self.make_key(query, model)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, embedding = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._local_hits += 1
+                    return embedding
+                del self._entries[key]
+
+        if self.shared:
+            embedding = caches[self.cache_alias].get(key)
+            if embedding is not None:
+                with self._lock:
+                    self._shared_hits += 1
+                    self._store(key, embedding, now)
+                return embedding
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def set(self, query: str, model: str, embedding: List[float]) -> None:
+        key = self.make_key(query, model)
+        with self._lock:
+            self._store(key, embedding, time.monotonic())
+        if self.shared:
+            caches[self.cache_alias].set(key, embedding, timeout=self.ttl)
+
+    def _store(self, key: str, embedding: List[float], now: float) -> None:
+        # Caller must hold self._lock
+        self._entries[key] = (now + self.ttl, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self._local_hits + self._shared_hits
+            lookups = hits + self._misses
+            return {
+                'hits': hits,
+                'local_hits': self._local_hits,
+                'shared_hits': self._shared_hits,
+                'misses': self._misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'shared': self.shared,
+            }
@@ -0,0 +1,183 @@
+"""Keyword search over transcript lines, served by the pg_trgm index on UPPER(text).
+
+phrase_search runs the same kind of indexed match over per-video documents
+(transcripts/documents.py), so phrases split across snippets are found too.
+
+``text__icontains`` compiles to ``UPPER(text) LIKE UPPER('%keyword%')``, which
+the trigram GIN index answers without scanning the table. Keywords shorter than
+one trigram ("AI", "ML") cannot use it and are matched with a plain
+case-insensitive LIKE on lower(text) instead, which scans the table like the
+unindexed search did. Pages are fetched with keyset cursors instead of OFFSET,
+so page N costs the same as page 1:
+
+'position'  - ordered by (video_id, start_time, id); the matching btree index
+              lets PostgreSQL stop after one page even for very common words.
+'relevance' - ordered by word similarity to the keyword (pg_trgm), then id.
+              Every match is scored, so cost grows with the number of matches.
+              Scores are cast to double precision so cursor values round-trip
+              through JSON exactly.
+"""
+
+import base64
+import json
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast, Lower
+
+from .documents import find_phrase, normalize_phrase
+from .models import TranscriptDocuments, Transcripts
+
+KEYWORD_ORDERS = ('position', 'relevance')
+
+# Trigram indexes cannot narrow patterns shorter than one trigram
+MIN_KEYWORD_LENGTH = 3
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def _after_position(video_id: str, start_time, pk: int) -> Q:
+    """Rows after (video_id, start_time, id) in ORDER BY video_id, start_time, id (NULL start_time last)."""
+    later = Q(video_id__gt=video_id)
+    if start_time is None:
+        return later | Q(video_id=video_id, start_time__isnull=True, id__gt=pk)
+    return (
+        later
+        | Q(video_id=video_id, start_time__gt=start_time)
+        | Q(video_id=video_id, start_time=start_time, id__gt=pk)
+        | Q(video_id=video_id, start_time__isnull=True)
+    )
+
+
+def _after_relevance(relevance: float, pk: int) -> Q:
+    return Q(relevance__lt=relevance) | Q(relevance=relevance, id__gt=pk)
+
+
+def keyword_search(keyword: str, page_size: int, cursor: str = None, order: str = 'position') -> dict:
+    """One page of transcript lines containing keyword (case-insensitive).
+
+    Args:
+        keyword: Substring to look for (shorter than MIN_KEYWORD_LENGTH: unindexed scan)
+        page_size: Rows per page (callers cap it at KEYWORD_SEARCH_MAX_PAGE_SIZE)
+        cursor: Optional - next_cursor of the previous page
+        order: One of KEYWORD_ORDERS
+
+    Returns:
+        Dict with the page's results and next_cursor (None on the last page)
+
+    Raises:
+        InvalidCursor: cursor was not produced by a previous page in the same order
+    """
+    if len(keyword) < MIN_KEYWORD_LENGTH:
+        # lower(text) is not the indexed expression, so the planner won't walk the whole trigram index
+        queryset = Transcripts.objects.annotate(text_lower=Lower('text')).filter(text_lower__contains=keyword.lower())
+    else:
+        queryset = Transcripts.objects.filter(text__icontains=keyword)
+    # word_similarity() returns real; as float8 the score survives the JSON cursor unchanged,
+    # so relevance = / < comparisons against it match exactly at page boundaries
+    queryset = queryset.annotate(relevance=Cast(TrigramWordSimilarity(keyword, 'text'), FloatField()))
+
+    if order == 'relevance':
+        ordering = ('-relevance', 'id')
+    else:
+        ordering = ('video_id', 'start_time', 'id')
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise InvalidCursor('Invalid cursor')
+        after = _after_relevance(*values) if order == 'relevance' else _after_position(*values)
+        try:
+            queryset = queryset.filter(after)
+        except (TypeError, ValueError):
+            # Cursor values of the wrong type (e.g. a position cursor used with order=relevance)
+            raise InvalidCursor('Invalid cursor')
+
+    # One extra row tells whether another page exists
+    rows = list(
+        queryset.order_by(*ordering).values('id', 'video_id', 'start_time', 'text', 'relevance')[:page_size + 1]
+    )
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    next_cursor = None
+    if has_next:
+        last = rows[-1]
+        if order == 'relevance':
+            next_cursor = encode_cursor([last['relevance'], last['id']])
+        else:
+            next_cursor = encode_cursor([last['video_id'], last['start_time'], last['id']])
+
+    return {
+        'keyword': keyword,
+        'order': order,
+        'count': len(rows),
+        'next_cursor': next_cursor,
+        'results': [
+            {
+                'video_id': row['video_id'],
+                'start_time': row['start_time'],
+                'text': row['text'].replace('\n', ' '),
+                'relevance': row['relevance'],
+            }
+            for row in rows
+        ],
+    }
+
+
+def phrase_search(phrase: str, page_size: int, cursor: str = None, video_id: str = None,
+                  hits_per_video: int = 50) -> dict:
+    """One page of videos whose transcript contains phrase (case-insensitive), with timestamped hits.
+
+    Args:
+        phrase: Words to find in sequence (at least MIN_KEYWORD_LENGTH characters)
+        page_size: Videos per page
+        cursor: Optional - next_cursor of the previous page
+        video_id: Optional - search this video only
+        hits_per_video: Most hits returned per video ('matches' still counts all of them)
+
+    Raises:
+        InvalidCursor: cursor was not produced by a previous phrase_search page
+    """
+    phrase = normalize_phrase(phrase)
+    # The index narrows candidates to documents containing the phrase; find_phrase locates it in each
+    queryset = TranscriptDocuments.objects.filter(text__icontains=phrase)
+    if video_id:
+        queryset = queryset.filter(video_id=video_id)
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if not isinstance(values, list) or len(values) != 1 or not isinstance(values[0], str):
+            raise InvalidCursor('Invalid cursor')
+        queryset = queryset.filter(video_id__gt=values[0])
+
+    documents = list(
+        queryset.order_by('video_id').values_list('video_id', 'text', 'offsets', 'start_times')[:page_size + 1]
+    )
+    has_next = len(documents) > page_size
+    documents = documents[:page_size]
+
+    results = []
+    for doc_video_id, text, offsets, start_times in documents:
+        hits, total = find_phrase(text, offsets, start_times, phrase, limit=hits_per_video)
+        results.append({'video_id': doc_video_id, 'matches': total, 'hits': hits})
+
+    return {
+        'phrase': phrase,
+        'count': len(results),
+        'next_cursor': encode_cursor([documents[-1][0]]) if has_next else None,
+        'results': results,
+    }
@@ -0,0 +1,47 @@
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand
+
+from transcripts.documents import build_document
+from transcripts.models import TranscriptDocuments, Transcripts
+
+
+class Command(BaseCommand):
+    help = "Build the per-video transcript documents used by phrase search from the transcripts table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--video',
+            action='append',
+            dest='videos',
+            help="Only rebuild this video (repeatable). Default: every video with transcripts.",
+        )
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help="Only build documents for videos that do not have one yet.",
+        )
+
+    def handle(self, *args, **options):
+        rows = Transcripts.objects.all()
+        if options['videos']:
+            rows = rows.filter(video_id__in=options['videos'])
+        if options['missing']:
+            rows = rows.exclude(video_id__in=TranscriptDocuments.objects.values('video_id'))
+
+        # Streams snippets video by video in playback order (transcripts_video_start_id index)
+        snippets = rows.order_by('video_id', 'start_time', 'id').values_list(
+            'video_id', 'text', 'start_time'
+        ).iterator(chunk_size=10000)
+
+        built = 0
+        for video_id, group in groupby(snippets, key=itemgetter(0)):
+            text, offsets, start_times = build_document((text, start) for _, text, start in group)
+            TranscriptDocuments.objects.update_or_create(
+                video_id=video_id,
+                defaults={'text': text, 'offsets': offsets, 'start_times': start_times},
+            )
+            built += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Built {built} transcript documents"))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from transcripts.vector_index import NumpyVectorIndex
+
+
+class Command(BaseCommand):
+    help = "Snapshot text_chunks embeddings into the memory-mapped NumPy vector index."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help="Discard the current snapshot and rebuild it from scratch.",
+        )
+        parser.add_argument(
+            '--dtype',
+            choices=['float16', 'float32'],
+            default=getattr(settings, 'VECTOR_INDEX_DTYPE', 'float16'),
+            help="Storage precision of the embedding matrix.",
+        )
+
+    def handle(self, *args, **options):
+        index = NumpyVectorIndex(settings.VECTOR_INDEX_PATH, dtype=options['dtype'])
+        added = index.refresh(rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Vector index at {settings.VECTOR_INDEX_PATH}: added {added} chunks"
+        ))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from transcripts.models import Transcripts, Videos, VideoWordCounts
+from transcripts.text_stats import count_words
+
+
+class Command(BaseCommand):
+    help = "Recount the word frequency tables behind common_words/ from the transcripts table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--video',
+            action='append',
+            dest='videos',
+            help="Only recount this video (repeatable). Default: every video with transcripts.",
+        )
+
+    def handle(self, *args, **options):
+        videos = Transcripts.objects.order_by('video_id').values_list('video_id', flat=True).distinct()
+        if options['videos']:
+            videos = videos.filter(video_id__in=options['videos'])
+
+        recounted = 0
+        for video_id in list(videos):
+            with transaction.atomic():
+                # Same row lock as scripts/transcript_download_db.py: a concurrent re-ingest of this
+                # video either finishes first or waits, so its snippets are read and counted together
+                list(Videos.objects.select_for_update().filter(video_id=video_id).values_list('video_id'))
+                counts = count_words(
+                    Transcripts.objects.filter(video_id=video_id).values_list('text', flat=True).iterator(
+                        chunk_size=10000
+                    )
+                )
+                VideoWordCounts.objects.filter(video_id=video_id).delete()
+                VideoWordCounts.objects.bulk_create(
+                    [VideoWordCounts(video_id=video_id, word=word, count=count) for word, count in counts.items()],
+                    batch_size=5000,
+                )
+            recounted += 1
+
+        # The corpus-wide table is the per-video sum; rebuilt in one statement
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Waits for in-flight ingests and blocks new ones until the totals are rebuilt.
+            # Tables are locked in the order the ingest script writes them, so the two cannot deadlock.
+            cursor.execute("LOCK TABLE video_word_counts, word_counts IN SHARE ROW EXCLUSIVE MODE")
+            cursor.execute("DELETE FROM word_counts")
+            cursor.execute("""
+                INSERT INTO word_counts (word, count)
+                SELECT word, SUM(count) FROM video_word_counts GROUP BY word
+            """)
+
+        self.stdout.write(self.style.SUCCESS(f"Recounted words for {recounted} videos"))
@@ -0,0 +1,163 @@
+"""Conversation memory: which earlier turns are replayed into the chat prompt.
+
+'window'  - the last HISTORY_LIMIT raw messages.
+'summary' - a stored rolling summary of older turns plus the raw messages not
+            yet folded into it. Folding runs on a background thread after the
+            turn is saved, so the request never waits on the extra LLM call.
+
+The newest HISTORY_LIMIT messages are kept in the conversation cache between
+turns, so a follow-up normally reads no Message rows.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .admission import BACKGROUND_PRIORITY
+from .model_clients import get_client
+from .models import Conversation, Message
+from .rag_service import CHAT_MODEL, conversation_cache, llm_admission
+
+HISTORY_LIMIT = 10
+
+MEMORY_MODES = ('window', 'summary')
+
+SUMMARY_PROMPT = """You maintain a running summary of a tutoring conversation about YouTube video content.
+Merge the new messages into the current summary. Keep the questions asked, the answers' key facts and the
+videos/timestamps cited; drop greetings and repetition. Reply with the updated summary only, at most 200 words."""
+
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='conversation-summary')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _recent_messages(conversation: Conversation) -> list:
+    """The newest HISTORY_LIMIT messages as (id, role, content), oldest first."""
+    window = conversation_cache.get_history(conversation)
+    if window is None:
+        # Served by the (conversation, timestamp) index; id breaks ties between messages of one turn
+        recent = conversation.messages.filter(role__in=['user', 'assistant']).order_by(
+            '-timestamp', '-id'
+        ).values_list('id', 'role', 'content')[:HISTORY_LIMIT]
+        window = list(reversed(recent))  # Reverse order to be chronological
+        conversation_cache.set_history(conversation, window)
+    return window
+
+
+def load_history(conversation: Conversation, question: str, memory: str = None) -> tuple:
+    """Returns (conversation_history, summary) for the prompt; history ends with the current question."""
+    memory = memory or getattr(settings, 'CONVERSATION_MEMORY', 'window')
+
+    window = _recent_messages(conversation)
+    summary = ''
+    if memory == 'summary':
+        # Turns already folded into the summary are not replayed verbatim
+        window = [message for message in window if message[0] > conversation.summarized_until_id]
+        summary = conversation.summary
+
+    conversation_history = [{"role": role, "content": content} for _, role, content in window]
+    conversation_history.append({"role": "user", "content": question})
+    return conversation_history, summary
+
+
+def _turn_messages(conversation: Conversation, question: str, answer: str = None) -> list:
+    messages = [Message(conversation=conversation, role='user', content=question)]
+    if answer is not None:
+        messages.append(Message(conversation=conversation, role='assistant', content=answer))
+    return messages
+
+
+def save_turn(conversation: Conversation, question: str, answer: str = None) -> None:
+    """Persist the user message and, if generation succeeded, the answer with one INSERT.
+
+    Also bumps conversation.updated_at, the version of the cached history window,
+    and appends the turn to that window.
+    """
+    messages = _turn_messages(conversation, question, answer)
+    window = conversation_cache.get_history(conversation, record=False)
+    now = timezone.now()
+    with transaction.atomic():
+        Message.objects.bulk_create(messages)
+        # No row matched: another turn was saved since this request read the conversation
+        in_sequence = Conversation.objects.filter(
+            pk=conversation.pk, updated_at=conversation.updated_at
+        ).update(updated_at=now)
+        if not in_sequence:
+            Conversation.objects.filter(pk=conversation.pk).update(updated_at=now)
+
+    conversation.updated_at = now
+    if in_sequence and window is not None:
+        window = window + [(message.id, message.role, message.content) for message in messages]
+        conversation_cache.set_history(conversation, window[-HISTORY_LIMIT:])
+
+
+async def asave_turn(conversation: Conversation, question: str, answer: str = None) -> None:
+    await sync_to_async(save_turn)(conversation, question, answer)
+
+
+def summarize_conversation(conversation_id: int) -> bool:
+    """Fold all but the newest raw messages into the stored summary once enough have accumulated.
+
+    Returns True if the summary was updated.
+    """
+    keep = getattr(settings, 'CONVERSATION_SUMMARY_KEEP_MESSAGES', 4)
+    trigger = getattr(settings, 'CONVERSATION_SUMMARY_TRIGGER_MESSAGES', 8)
+
+    conversation = Conversation.objects.get(pk=conversation_id)
+    unsummarized = list(
+        conversation.messages.filter(
+            role__in=['user', 'assistant'], id__gt=conversation.summarized_until_id
+        ).order_by('id').values_list('id', 'role', 'content')
+    )
+    if len(unsummarized) < max(trigger, keep + 1):
+        return False
+
+    to_fold = unsummarized[:len(unsummarized) - keep]
+    new_messages = "\n".join(f"{role}: {content}" for _, role, content in to_fold)
+
+    # Yields to interactive requests; if it is shed, the next turn schedules it again
+    with llm_admission.slot(priority=BACKGROUND_PRIORITY):
+        response = get_client().chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"Current summary:\n{conversation.summary or '(empty)'}\n\n"
+                                            f"New messages:\n{new_messages}"},
+            ],
+            temperature=0.2,
+            max_tokens=getattr(settings, 'CONVERSATION_SUMMARY_MAX_TOKENS', 300),
+        )
+    summary = (response.choices[0].message.content or '').strip()
+    if not summary:
+        return False
+
+    # Conditional update: a concurrent run (another worker process) may have advanced the summary already
+    updated = Conversation.objects.filter(
+        pk=conversation_id, summarized_until_id=conversation.summarized_until_id
+    ).update(summary=summary, summarized_until_id=to_fold[-1][0])
+    return bool(updated)
+
+
+def _summarize_in_background(conversation_id: int) -> None:
+    try:
+        summarize_conversation(conversation_id)
+    except Exception as e:
+        print(f"Conversation summary failed for {conversation_id}: {str(e)}")
+    finally:
+        with _pending_lock:
+            _pending.discard(conversation_id)
+        # Pool threads outlive the request; don't leave their connection open
+        connection.close()
+
+
+def schedule_summary(conversation_id: int) -> None:
+    """Queue summarize_conversation off the request path (at most one run per conversation at a time)."""
+    with _pending_lock:
+        if conversation_id in _pending:
+            return
+        _pending.add(conversation_id)
+    _summary_executor.submit(_summarize_in_background, conversation_id)
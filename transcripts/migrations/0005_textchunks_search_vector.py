@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcripts', '0004_conversation_message'),
+    ]
+
+    # Django 4.2 has no GeneratedField, so the stored tsvector column lives
+    # outside the model state and is only read by raw SQL in semantic_search.
+    operations = [
+        migrations.RunSQL(
+            sql="""
+            ALTER TABLE text_chunks
+                ADD COLUMN search_vector tsvector
+                GENERATED ALWAYS AS (to_tsvector('english', coalesce(text, ''))) STORED;
+            CREATE INDEX text_chunks_search_vector_idx
+                ON text_chunks USING GIN (search_vector);
+            """,
+            reverse_sql="""
+            DROP INDEX IF EXISTS text_chunks_search_vector_idx;
+            ALTER TABLE text_chunks DROP COLUMN IF EXISTS search_vector;
+            """,
+        ),
+    ]
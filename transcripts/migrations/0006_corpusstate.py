@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcripts', '0005_textchunks_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorpusState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'corpus_state',
+                'managed': True,
+            },
+        ),
+        migrations.RunSQL(
+            sql="INSERT INTO corpus_state (id, generation, updated_at) VALUES (1, 0, now()) ON CONFLICT (id) DO NOTHING;",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+import pgvector.django.indexes
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; it keeps
+    # text_chunks writable while the HNSW graph builds
+    atomic = False
+
+    dependencies = [
+        ('transcripts', '0006_corpusstate'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='textchunks',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='text_chunks_embedding_hnsw', opclasses=['vector_l2_ops']),
+        ),
+    ]
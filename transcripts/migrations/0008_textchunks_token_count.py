@@ -0,0 +1,58 @@
+from django.db import migrations, models
+
+try:
+    import tiktoken
+except ImportError:  # Optional dependency
+    tiktoken = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _token_counter():
+    """Frozen copy of transcripts.tokens.count_tokens as it was when this migration was written."""
+    encoding = None
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.get_encoding('o200k_base')
+        except Exception:
+            encoding = None
+
+    def count_tokens(text):
+        if not text:
+            return 0
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    return count_tokens
+
+
+def backfill_token_counts(apps, schema_editor):
+    TextChunks = apps.get_model('transcripts', 'TextChunks')
+    count_tokens = _token_counter()
+    batch = []
+    for chunk in TextChunks.objects.filter(token_count__isnull=True).only('id', 'text').iterator(
+            chunk_size=BACKFILL_BATCH_SIZE):
+        chunk.token_count = count_tokens(chunk.text)
+        batch.append(chunk)
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            TextChunks.objects.bulk_update(batch, ['token_count'])
+            batch = []
+    if batch:
+        TextChunks.objects.bulk_update(batch, ['token_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcripts', '0007_textchunks_embedding_hnsw'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='textchunks',
+            name='token_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_token_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; it keeps the
+    # transcripts table writable while the indexes build
+    atomic = False
+
+    dependencies = [
+        ('transcripts', '0010_message_conversation_timestamp_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='transcripts',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('text'), name='gin_trgm_ops'), name='transcripts_text_upper_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='transcripts',
+            index=models.Index(fields=['video', 'start_time', 'id'], name='transcripts_video_start_id'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcripts', '0011_transcripts_keyword_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscriptDocuments',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField()),
+                ('offsets', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=None)),
+                ('start_times', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), size=None)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('video', models.OneToOneField(db_column='video_id', on_delete=django.db.models.deletion.CASCADE, to='transcripts.videos', to_field='video_id')),
+            ],
+            options={
+                'db_table': 'transcript_documents',
+                'managed': True,
+                'indexes': [django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('text'), name='gin_trgm_ops'), name='transcript_documents_text_trgm')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcripts', '0012_transcriptdocuments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WordCounts',
+            fields=[
+                ('word', models.TextField(primary_key=True, serialize=False)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'word_counts',
+                'managed': True,
+                'indexes': [models.Index(fields=['-count'], name='word_counts_count_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VideoWordCounts',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.TextField()),
+                ('count', models.BigIntegerField(default=0)),
+                ('video', models.ForeignKey(db_column='video_id', on_delete=django.db.models.deletion.CASCADE, to='transcripts.videos', to_field='video_id')),
+            ],
+            options={
+                'db_table': 'video_word_counts',
+                'managed': True,
+                'indexes': [models.Index(fields=['video', '-count'], name='video_word_counts_top_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='videowordcounts',
+            constraint=models.UniqueConstraint(fields=('video', 'word'), name='video_word_counts_video_word_uniq'),
+        ),
+    ]
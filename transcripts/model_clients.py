@@ -0,0 +1,224 @@
+"""Shared clients for the OpenAI-compatible model server (LM Studio).
+
+One pooled HTTP transport per process instead of a client per module, with
+explicit connect/read timeouts, capped keep-alive connections and optional
+HTTP/2. Every request is timed per endpoint at the transport (time to response
+headers, which for streamed completions is time to first byte), including
+requests that end in a timeout or transport error.
+
+No Django imports: scripts/embedding_pipeline.py uses this module too, so all
+tuning comes from environment variables:
+
+    OPENAI_BASE_URL, OPENAI_API_KEY
+    MODEL_HTTP_MAX_CONNECTIONS        max open connections per client   (default 100)
+    MODEL_HTTP_MAX_KEEPALIVE          idle connections kept in the pool (default 20)
+    MODEL_HTTP_KEEPALIVE_EXPIRY       seconds an idle connection is kept (default 30)
+    MODEL_HTTP_CONNECT_TIMEOUT        seconds                            (default 5)
+    MODEL_HTTP_READ_TIMEOUT           seconds between bytes read         (default 120)
+    MODEL_HTTP2                       'True' to negotiate HTTP/2 (needs the h2 package)
+"""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from collections import deque
+
+import httpx
+import numpy as np
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, OpenAI
+
+load_dotenv()
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "http://127.0.0.1:1234/v1")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "not-needed")
+
+LATENCY_SAMPLES = 2048
+
+
+class EndpointLatency:
+    """Per-endpoint request counts, errors, timeouts and latency percentiles over recent requests.
+
+    Failed requests are counted as errors and their time to failure is part of
+    the percentiles, so timeouts show up in the tail.
+    """
+
+    def __init__(self, samples: int = LATENCY_SAMPLES):
+        self._samples = samples
+        self._lock = threading.Lock()
+        self._endpoints = {}  # "METHOD /path" -> {'count', 'errors', 'timeouts', 'latencies'}
+
+    def record(self, endpoint: str, seconds: float, ok: bool, timeout: bool = False) -> None:
+        with self._lock:
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = {
+                    'count': 0, 'errors': 0, 'timeouts': 0, 'latencies': deque(maxlen=self._samples)
+                }
+            entry['count'] += 1
+            if not ok:
+                entry['errors'] += 1
+            if timeout:
+                entry['timeouts'] += 1
+            entry['latencies'].append(seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = {
+                name: (e['count'], e['errors'], e['timeouts'], list(e['latencies']))
+                for name, e in self._endpoints.items()
+            }
+        stats = {}
+        for name, (count, errors, timeouts, latencies) in snapshot.items():
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if latencies else (0.0, 0.0, 0.0)
+            stats[name] = {
+                'requests': count,
+                'errors': errors,
+                'timeouts': timeouts,
+                'p50_ms': float(p50),
+                'p95_ms': float(p95),
+                'p99_ms': float(p99),
+            }
+        return stats
+
+
+model_latency = EndpointLatency()
+
+
+def _endpoint(request: httpx.Request) -> str:
+    return f"{request.method} {request.url.path}"
+
+
+def _record_response(request: httpx.Request, start: float, response: httpx.Response) -> None:
+    model_latency.record(_endpoint(request), time.perf_counter() - start, response.status_code < 400)
+
+
+def _record_failure(request: httpx.Request, start: float, error: Exception) -> None:
+    model_latency.record(_endpoint(request), time.perf_counter() - start, False,
+                         timeout=isinstance(error, httpx.TimeoutException))
+
+
+class InstrumentedTransport(httpx.BaseTransport):
+    """Wraps a transport and records every request in model_latency, failed ones included.
+
+    Response event hooks never run when a request times out or the connection
+    fails, which are the failures worth seeing.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = self._transport.handle_request(request)
+        except Exception as e:
+            _record_failure(request, start, e)
+            raise
+        _record_response(request, start, response)
+        return response
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncInstrumentedTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of InstrumentedTransport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception as e:
+            _record_failure(request, start, e)
+            raise
+        _record_response(request, start, response)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _http2_enabled() -> bool:
+    if os.getenv('MODEL_HTTP2', 'False') != 'True':
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        print("MODEL_HTTP2=True but the h2 package is not installed; using HTTP/1.1")
+        return False
+    return True
+
+
+def _transport_options() -> dict:
+    return {
+        'limits': httpx.Limits(
+            max_connections=int(os.getenv('MODEL_HTTP_MAX_CONNECTIONS', '100')),
+            max_keepalive_connections=int(os.getenv('MODEL_HTTP_MAX_KEEPALIVE', '20')),
+            keepalive_expiry=float(os.getenv('MODEL_HTTP_KEEPALIVE_EXPIRY', '30')),
+        ),
+        'http2': _http2_enabled(),
+    }
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        connect=float(os.getenv('MODEL_HTTP_CONNECT_TIMEOUT', '5')),
+        read=float(os.getenv('MODEL_HTTP_READ_TIMEOUT', '120')),
+        write=30.0,
+        pool=float(os.getenv('MODEL_HTTP_CONNECT_TIMEOUT', '5')),
+    )
+
+
+_client = None
+_client_lock = threading.Lock()
+# Async connections belong to the event loop that opened them (one loop under uvicorn,
+# one per request when async views run under WSGI), so keep one async client per loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client() -> OpenAI:
+    """Process-wide OpenAI client on the pooled, instrumented transport (thread-safe)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = httpx.Client(
+                    transport=InstrumentedTransport(httpx.HTTPTransport(**_transport_options())),
+                    timeout=_timeout(),
+                )
+                _client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, http_client=http_client)
+    return _client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """AsyncOpenAI client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        http_client = httpx.AsyncClient(
+            transport=AsyncInstrumentedTransport(httpx.AsyncHTTPTransport(**_transport_options())),
+            timeout=_timeout(),
+        )
+        client = _async_clients[loop] = AsyncOpenAI(
+            api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, http_client=http_client
+        )
+    return client
+
+
+async def aclose_async_client() -> None:
+    """Close the running loop's client, for loops that end with the request.
+
+    Under uvicorn there is one long-lived loop per worker and its client is
+    reused for every request. Under WSGI each async view call (and a streamed
+    body) runs on its own short-lived loop, whose pooled connections would
+    otherwise stay open until garbage collection.
+    """
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
@@ -5,8 +5,11 @@
 #   * Make sure each ForeignKey and OneToOneField has `on_delete` set to the desired behavior
 #   * Remove `managed = False` lines if you wish to allow Django to create, modify, and delete the table
 # Feel free to rename the models, but don't rename db_table values or field names.
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
-from pgvector.django import VectorField
+from django.db.models.functions import Upper
+from pgvector.django import VectorField, HnswIndex
 
 
 class TranscriptEnrichments(models.Model):
@@ -29,6 +32,62 @@ class Transcripts(models.Model):
     class Meta:
         managed = True
         db_table = 'transcripts'
+        indexes = [
+            # Keyword search: icontains compiles to UPPER(text) LIKE UPPER('%...%')
+            GinIndex(OpClass(Upper('text'), name='gin_trgm_ops'), name='transcripts_text_upper_trgm'),
+            # Keyset pagination of keyword search results
+            models.Index(fields=['video', 'start_time', 'id'], name='transcripts_video_start_id'),
+        ]
+
+
+class TranscriptDocuments(models.Model):
+    """A video's whole transcript as one text for phrase search (see transcripts/documents.py).
+
+    offsets[i] is the character position in text where snippet i begins and
+    start_times[i] its start in seconds.
+    """
+    video = models.OneToOneField('Videos', models.CASCADE, to_field='video_id', db_column='video_id')
+    text = models.TextField()
+    offsets = ArrayField(models.IntegerField())
+    start_times = ArrayField(models.FloatField())
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        managed = True
+        db_table = 'transcript_documents'
+        indexes = [
+            GinIndex(OpClass(Upper('text'), name='gin_trgm_ops'), name='transcript_documents_text_trgm'),
+        ]
+
+
+class WordCounts(models.Model):
+    """Corpus-wide word frequencies (transcripts.text_stats.tokenize), kept current at ingest."""
+    word = models.TextField(primary_key=True)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = True
+        db_table = 'word_counts'
+        indexes = [
+            models.Index(fields=['-count'], name='word_counts_count_idx'),
+        ]
+
+
+class VideoWordCounts(models.Model):
+    """Per-video word frequencies; WordCounts holds their sum over all videos."""
+    video = models.ForeignKey('Videos', models.CASCADE, to_field='video_id', db_column='video_id')
+    word = models.TextField()
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = True
+        db_table = 'video_word_counts'
+        constraints = [
+            models.UniqueConstraint(fields=['video', 'word'], name='video_word_counts_video_word_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['video', '-count'], name='video_word_counts_top_idx'),
+        ]
 
 
 class Videos(models.Model):
@@ -47,6 +106,8 @@ class TextChunks(models.Model):
     text = models.TextField()
     start_time_seconds = models.FloatField()
     duration = models.FloatField(null=True, blank=True)
+    # Set at ingest (transcripts.tokens.count_tokens) so the RAG packer never tokenizes chunks per request
+    token_count = models.IntegerField(null=True, blank=True)
     embedding = VectorField(dimensions=768, null=True, blank=True)
     status = models.CharField(
         max_length=20,
@@ -72,13 +133,32 @@ class TextChunks(models.Model):
         indexes = [
             models.Index(fields=['video', 'start_time_seconds']),
             models.Index(fields=['status']),
+            HnswIndex(
+                name='text_chunks_embedding_hnsw',
+                fields=['embedding'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_l2_ops'],
+            ),
         ]
 
+class CorpusState(models.Model):
+    """Singleton row (id=1) whose generation is bumped by the embedding pipeline on every ingest."""
+    generation = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        managed = True
+        db_table = 'corpus_state'
+
 class Conversation(models.Model):
     """Represents a single conversation session."""
     session_id = models.CharField(max_length=255, unique=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Rolling summary used by the 'summary' memory mode; covers messages with id <= summarized_until_id
+    summary = models.TextField(blank=True, default='')
+    summarized_until_id = models.BigIntegerField(default=0)
 
     def __str__(self):
         return f"Conversation: {self.session_id}"
@@ -96,6 +176,10 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # History reads: latest messages of one conversation
+            models.Index(fields=['conversation', 'timestamp']),
+        ]
 
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
\ No newline at end of file
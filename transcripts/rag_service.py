@@ -1,44 +1,265 @@
-from openai import OpenAI
-from .semantic_search import semantic_search
+from asgiref.sync import sync_to_async
+from .admission import AdmissionController, AdmissionRejected
+from .answer_cache import SemanticAnswerCache
+from .conversation_cache import ConversationContextCache
+from .model_clients import get_client, get_async_client
+from .models import TextChunks
+from .retrieval import as_array
+from .singleflight import SingleFlight
+from .semantic_search import semantic_search, asemantic_search, embed_query, aembed_query, corpus_generation
+from .tokens import count_tokens, count_message_tokens
 from django.conf import settings
-import os
-from dotenv import load_dotenv
+import hashlib
+import json
+import numpy as np
 
-load_dotenv()
+CHAT_MODEL = "openai/gpt-oss-20b"
 
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY", "not-needed"),
-    base_url=os.getenv("OPENAI_BASE_URL", "http://127.0.0.1:1234/v1")
+answer_cache = SemanticAnswerCache(
+    max_entries=getattr(settings, 'ANSWER_CACHE_SIZE', 512),
+    ttl=getattr(settings, 'ANSWER_CACHE_TTL', 3600),
+    similarity_threshold=getattr(settings, 'ANSWER_CACHE_SIMILARITY', 0.95),
+)
+generation_flight = SingleFlight()
+conversation_cache = ConversationContextCache(
+    ttl=getattr(settings, 'CONVERSATION_CACHE_TTL', 1800),
+    enabled=getattr(settings, 'CONVERSATION_CACHE_ENABLED', True),
+)
+# Caps concurrent completions against the local model server; excess requests queue by prompt size
+llm_admission = AdmissionController(
+    max_concurrent=getattr(settings, 'LLM_MAX_CONCURRENCY', 4),
+    max_queue=getattr(settings, 'LLM_MAX_QUEUE', 32),
+    queue_timeout=getattr(settings, 'LLM_QUEUE_TIMEOUT_SECONDS', 15.0),
 )
 
-def answer_question(question: str, video_id: str = None, conversation_history: list = None, top_k: int = 3) -> dict:
-    """RAG Pipeline: Retrieve → Augment → Generate → Cite"""
+SYSTEM_PROMPT = """You are an AI tutor answering questions about YouTube video content.
+IMPORTANT RULES:
+1. Answer ONLY based on the provided video context.
+2. If the question is not covered by the context, respond with: "This topic is not covered in the available videos."
+3. Do NOT make up information.
+4. Cite which video(s) provided your answer by including the video title and the full YouTube URL with timestamp (e.g., [Video Title] (URL: ...))."""
 
-    # --- Step 1: RETRIEVAL - Find relevant transcript chunks ---
-    retrieval_result = semantic_search(question, video_id=video_id, top_k=top_k)
-    
+SYSTEM_PROMPT_TOKENS = count_message_tokens([{"role": "system", "content": SYSTEM_PROMPT}])
+# "Video: ... (URL: ...)\nText: " wrapper build_messages adds around every chunk
+CHUNK_OVERHEAD_TOKENS = 32
+
+def _retrieval_error(retrieval_result: dict):
     if 'error' in retrieval_result:
         if 'Failed to embed query' in retrieval_result['error']:
             return {"error": "LM Studio Embedding model connection failed (Check RAG UI state)."}
         return retrieval_result
-
-    chunks = retrieval_result['results']
-    if not chunks:
+    if not retrieval_result['results']:
         return {"error": "No relevant content found in knowledge base."}
+    return None
 
-    # --- Step 2: AUGMENTATION - Format chunks into structured context ---
+def _search_chunks(question: str, video_id: str, top_k: int, search_mode: str, diversify: bool) -> tuple:
+    retrieval_result = semantic_search(question, video_id=video_id, top_k=top_k, mode=search_mode,
+                                       diversify=diversify)
+
+    error = _retrieval_error(retrieval_result)
+    if error:
+        return None, error
+    return retrieval_result['results'], None
+
+async def _asearch_chunks(question: str, video_id: str, top_k: int, search_mode: str, diversify: bool) -> tuple:
+    retrieval_result = await asemantic_search(question, video_id=video_id, top_k=top_k, mode=search_mode,
+                                              diversify=diversify)
+
+    error = _retrieval_error(retrieval_result)
+    if error:
+        return None, error
+    return retrieval_result['results'], None
+
+def _unit(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+def _evidence_params(video_id: str, top_k: int, search_mode: str, diversify: bool) -> tuple:
+    """Everything besides the question that shapes a retrieval; evidence is only reused when it matches."""
+    return video_id or '', int(top_k), search_mode or getattr(settings, 'SEMANTIC_SEARCH_MODE', 'vector'), diversify
+
+def _prior_evidence(conversation_id: str, query_embedding, params: tuple) -> tuple:
+    """Returns (evidence, cosine similarity of the question to the one that retrieved it), or (None, 0.0)."""
+    evidence = conversation_cache.get_evidence(conversation_id)
+    if (evidence is None or evidence['params'] != params
+            or evidence['generation'] != corpus_generation.current()):
+        return None, 0.0
+    return evidence, float(_unit(query_embedding) @ evidence['query_embedding'])
+
+def _rescore(chunks: list, embeddings: list, query_embedding) -> list:
+    """Score chunks against a new question the way the search does (1 - L2 distance)."""
+    query = np.asarray(query_embedding, dtype=np.float32)
+    return [
+        dict(chunk, similarity_score=1 - float(np.linalg.norm(query - embedding)))
+        for chunk, embedding in zip(chunks, embeddings)
+    ]
+
+def _reuse_evidence(evidence: dict, similarity: float, query_embedding):
+    """Prior chunks re-ranked for the follow-up if it is close enough to skip retrieval, else None."""
+    if evidence is None or similarity < getattr(settings, 'CONVERSATION_EVIDENCE_REUSE_SIMILARITY', 0.9):
+        return None
+    conversation_cache.record_evidence('reused')
+    chunks = _rescore(evidence['chunks'], evidence['chunk_embeddings'], query_embedding)
+    chunks.sort(key=lambda chunk: -chunk['similarity_score'])
+    return chunks
+
+def _chunk_embeddings(chunks: list) -> tuple:
+    """(chunks, one vector per chunk) for the chunks still stored.
+
+    Merged chunks (collapse_adjacent) use the mean of their parts; parts deleted
+    since the search (a video was re-chunked) are skipped, and a chunk with no
+    part left is dropped.
+    """
+    ids = [chunk_id for chunk in chunks for chunk_id in (chunk.get('merged_chunk_ids') or [chunk['id']])]
+    vectors = dict(TextChunks.objects.filter(id__in=ids).values_list('id', 'embedding'))
+    kept, embeddings = [], []
+    for chunk in chunks:
+        parts = [as_array(vectors[chunk_id])
+                 for chunk_id in (chunk.get('merged_chunk_ids') or [chunk['id']]) if chunk_id in vectors]
+        if parts:
+            kept.append(chunk)
+            embeddings.append(np.mean(parts, axis=0))
+    return kept, embeddings
+
+def _store_evidence(conversation_id: str, query_embedding, params: tuple, chunks: list,
+                    evidence: dict, similarity: float) -> list:
+    """Remember freshly retrieved chunks; a related follow-up also keeps prior chunks that still rank."""
+    stored, embeddings = _chunk_embeddings(chunks)
+    outcome = 'retrieved'
+
+    if evidence is not None and similarity >= getattr(settings, 'CONVERSATION_EVIDENCE_EXTEND_SIMILARITY', 0.75):
+        fresh_ids = {chunk['id'] for chunk in chunks}
+        carried = [(chunk, embedding) for chunk, embedding in zip(evidence['chunks'], evidence['chunk_embeddings'])
+                   if chunk['id'] not in fresh_ids]
+        if carried:
+            carried_chunks = _rescore([chunk for chunk, _ in carried], [e for _, e in carried], query_embedding)
+            ranked = sorted(zip(stored + carried_chunks, embeddings + [e for _, e in carried]),
+                            key=lambda item: -item[0]['similarity_score'])[:len(chunks)]
+            chunks = stored = [chunk for chunk, _ in ranked]
+            embeddings = [embedding for _, embedding in ranked]
+            outcome = 'extended'
+
+    conversation_cache.set_evidence(conversation_id, {
+        'params': params,
+        'generation': corpus_generation.current(),
+        'query_embedding': _unit(query_embedding),
+        'chunks': stored,
+        'chunk_embeddings': embeddings,
+    }, outcome)
+    return chunks
+
+def retrieve_chunks(question: str, video_id: str = None, top_k: int = 3, search_mode: str = None,
+                    diversify: bool = None, conversation_id: str = None) -> tuple:
+    """Step 1 (RETRIEVAL): returns (chunks, None) or (None, error dict).
+
+    With a conversation_id, a follow-up close to the question that retrieved the
+    conversation's last evidence (CONVERSATION_EVIDENCE_REUSE_SIMILARITY) reuses
+    that evidence without searching; a related one (..._EXTEND_SIMILARITY)
+    searches and lets the prior chunks compete with the new results.
+    """
+    if diversify is None:
+        diversify = getattr(settings, 'RAG_DIVERSIFY', False)
+
+    if not (conversation_id and conversation_cache.enabled):
+        return _search_chunks(question, video_id, top_k, search_mode, diversify)
+
+    try:
+        query_embedding = embed_query(question)  # Reused by the search below through the embedding cache
+    except Exception:
+        return _search_chunks(question, video_id, top_k, search_mode, diversify)  # Reports the failure
+
+    params = _evidence_params(video_id, top_k, search_mode, diversify)
+    evidence, similarity = _prior_evidence(conversation_id, query_embedding, params)
+    chunks = _reuse_evidence(evidence, similarity, query_embedding)
+    if chunks:
+        return chunks, None
+
+    chunks, error = _search_chunks(question, video_id, top_k, search_mode, diversify)
+    if error:
+        return None, error
+    return _store_evidence(conversation_id, query_embedding, params, chunks, evidence, similarity), None
+
+async def aretrieve_chunks(question: str, video_id: str = None, top_k: int = 3, search_mode: str = None,
+                           diversify: bool = None, conversation_id: str = None) -> tuple:
+    """Async retrieve_chunks."""
+    if diversify is None:
+        diversify = getattr(settings, 'RAG_DIVERSIFY', False)
+
+    if not (conversation_id and conversation_cache.enabled):
+        return await _asearch_chunks(question, video_id, top_k, search_mode, diversify)
+
+    try:
+        query_embedding = await aembed_query(question)
+    except Exception:
+        return await _asearch_chunks(question, video_id, top_k, search_mode, diversify)
+
+    params = _evidence_params(video_id, top_k, search_mode, diversify)
+    evidence, similarity = await sync_to_async(_prior_evidence)(conversation_id, query_embedding, params)
+    chunks = _reuse_evidence(evidence, similarity, query_embedding)
+    if chunks:
+        return chunks, None
+
+    chunks, error = await _asearch_chunks(question, video_id, top_k, search_mode, diversify)
+    if error:
+        return None, error
+    return await sync_to_async(_store_evidence)(
+        conversation_id, query_embedding, params, chunks, evidence, similarity
+    ), None
+
+def _chunk_tokens(chunk: dict) -> int:
+    # Counts are stored at ingest; only chunks embedded before token_count existed are counted here
+    token_count = chunk.get('token_count')
+    return token_count if token_count is not None else count_tokens(chunk.get('text', ''))
+
+def pack_context(question: str, chunks: list, conversation_history: list = None, summary: str = None) -> tuple:
+    """Fit history and evidence into settings.RAG_PROMPT_TOKEN_BUDGET.
+
+    The conversation summary (if any) counts against the history budget first.
+    History keeps its newest messages within RAG_HISTORY_TOKEN_BUDGET; evidence
+    gets the rest of the budget. Chunks arrive best-first, so the lowest-ranked
+    ones are dropped first; the best chunk is always kept.
+
+    Returns (chunks, conversation_history, prompt_tokens).
+    """
+    budget = getattr(settings, 'RAG_PROMPT_TOKEN_BUDGET', 3072)
+    history_budget = getattr(settings, 'RAG_HISTORY_TOKEN_BUDGET', 768)
+
+    used = SYSTEM_PROMPT_TOKENS + count_message_tokens(
+        [{"role": "user", "content": f"Context from videos:\n\n\nQuestion: {question}"}]
+    )
+
+    packed_history = []
+    history_tokens = count_tokens(_summary_block(summary)) if summary else 0
+    for message in reversed(conversation_history or []):
+        cost = count_message_tokens([message])
+        if history_tokens + cost > history_budget:
+            break
+        packed_history.append(message)
+        history_tokens += cost
+    packed_history.reverse()
+    used += history_tokens
+
+    packed_chunks = []
+    for chunk in chunks:
+        cost = _chunk_tokens(chunk) + CHUNK_OVERHEAD_TOKENS
+        if packed_chunks and used + cost > budget:
+            break
+        packed_chunks.append(chunk)
+        used += cost
+
+    return packed_chunks, packed_history, used
+
+def _summary_block(summary: str) -> str:
+    return f"\n\nSummary of the earlier conversation:\n{summary}"
+
+def build_messages(question: str, chunks: list, conversation_history: list = None, summary: str = None) -> list:
+    """Step 2 (AUGMENTATION): format chunks into context and assemble the chat messages."""
     context_text = "\n\n".join([
         f"Video: {chunk.get('title', 'Unknown')} (URL: https://youtube.com/watch?v={chunk.get('youtube_video_id', '')}&t={int(chunk.get('start_time_seconds', 0))}s)\nText: {chunk.get('text', '')}"
         for chunk in chunks
     ])
 
-    # --- Step 3: GENERATION - LLM synthesizes answer using context ---
-    system_prompt = """You are an AI tutor answering questions about YouTube video content.
-IMPORTANT RULES:
-1. Answer ONLY based on the provided video context.
-2. If the question is not covered by the context, respond with: "This topic is not covered in the available videos."
-3. Do NOT make up information.
-4. Cite which video(s) provided your answer by including the video title and the full YouTube URL with timestamp (e.g., [Video Title] (URL: ...))."""
+    system_prompt = SYSTEM_PROMPT + _summary_block(summary) if summary else SYSTEM_PROMPT
 
     messages = [
         {"role": "system", "content": system_prompt},
@@ -48,40 +269,305 @@ IMPORTANT RULES:
     if conversation_history:
         messages = messages[:1] + conversation_history + messages[1:]
 
+    return messages
+
+def build_citations(chunks: list) -> tuple:
+    """Step 4 (CITATION TRACKING): returns (citations, confidence)."""
+    citations = []
+    similarity_scores = []
+
+    for chunk in chunks:
+        similarity = float(chunk.get('similarity_score', 0.0))
+        similarity_scores.append(similarity)
+
+        citations.append({
+            "video_id": chunk.get('youtube_video_id', ''),
+            "timestamp_seconds": chunk.get('start_time_seconds', 0),
+            "url": f"https://youtube.com/watch?v={chunk.get('youtube_video_id', '')}&t={int(chunk.get('start_time_seconds', 0))}s",
+            "similarity": similarity
+        })
+
+    confidence = sum(similarity_scores) / len(similarity_scores) if similarity_scores else 0.0
+    return citations, confidence
+
+def _answer_cache_lookup(question: str, chunks: list, conversation_history: list = None, summary: str = None):
+    """Returns (cache_key, cached_result); cache_key is None when the answer must not be cached."""
+    if not getattr(settings, 'ANSWER_CACHE_ENABLED', True):
+        return None, None
+
+    # Only first turns are cacheable: with earlier turns the answer also depends on the conversation
+    if summary or (conversation_history and conversation_history != [{"role": "user", "content": question}]):
+        return None, None
+
     try:
-        response = client.chat.completions.create(
-            model="openai/gpt-oss-20b", 
+        question_embedding = embed_query(question)  # Served by the query embedding cache
+    except Exception:
+        return None, None
+
+    chunk_ids = []
+    for chunk in chunks:
+        chunk_ids.extend(chunk.get('merged_chunk_ids') or [chunk['id']])
+
+    cache_key = (question_embedding, chunk_ids, CHAT_MODEL, _evidence_version(chunk_ids))
+    return cache_key, answer_cache.get(*cache_key)
+
+def _evidence_version(chunk_ids: list) -> tuple:
+    """(id, created_at) of each cited chunk, so ingesting other videos leaves cached answers valid.
+
+    Chunk ids are deterministic per video and position, but re-chunking a video
+    deletes its rows and inserts new ones, so created_at changes with it; a
+    deleted chunk has no stamp.
+    """
+    created = dict(TextChunks.objects.filter(id__in=chunk_ids).values_list('id', 'created_at'))
+    return tuple(
+        (chunk_id, created[chunk_id].isoformat() if chunk_id in created else None)
+        for chunk_id in sorted(set(chunk_ids))
+    )
+
+def _generation_key(messages: list) -> str:
+    """Identity of a completion request: same model and prompt (question, evidence, history)."""
+    payload = json.dumps([CHAT_MODEL, messages], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _answer_result(answer: str, chunks: list, prompt_tokens: int, cache_key) -> dict:
+    # --- Step 4: CITATION TRACKING - Extract and format sources ---
+    citations, confidence = build_citations(chunks)
+
+    result = {
+        "answer": answer,
+        "sources": citations,
+        "confidence": confidence,
+        "model": CHAT_MODEL,
+        "prompt_tokens": prompt_tokens
+    }
+    if cache_key:
+        answer_cache.set(*cache_key, result)
+    return result
+
+def _generate_answer(messages: list, chunks: list, prompt_tokens: int, cache_key) -> dict:
+    """Steps 3-4 of answer_question; run once per set of identical in-flight prompts."""
+    # --- Step 3: GENERATION - LLM synthesizes answer using context ---
+    # Shorter prompts are admitted first: they finish sooner and free the slot
+    with llm_admission.slot(priority=prompt_tokens):
+        response = get_client().chat.completions.create(
+            model=CHAT_MODEL,
             messages=messages,
             temperature=0.7,
-            max_tokens=512, 
+            max_tokens=512,
         )
+    return _answer_result(response.choices[0].message.content, chunks, prompt_tokens, cache_key)
+
+async def _agenerate_answer(messages: list, chunks: list, prompt_tokens: int, cache_key) -> dict:
+    async with llm_admission.aslot(priority=prompt_tokens):
+        response = await get_async_client().chat.completions.create(
+            model=CHAT_MODEL,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=512,
+        )
+    return _answer_result(response.choices[0].message.content, chunks, prompt_tokens, cache_key)
+
+def answer_question(question: str, video_id: str = None, conversation_history: list = None, top_k: int = 3,
+                    search_mode: str = None, diversify: bool = None, summary: str = None,
+                    conversation_id: str = None) -> dict:
+    """RAG Pipeline: Retrieve → Augment → Generate → Cite"""
+
+    # --- Step 1: RETRIEVAL - Find relevant transcript chunks ---
+    chunks, error = retrieve_chunks(question, video_id, top_k, search_mode, diversify, conversation_id)
+    if error:
+        return error
+
+    # Fit evidence and history into the prompt token budget
+    chunks, conversation_history, prompt_tokens = pack_context(question, chunks, conversation_history, summary)
+
+    # Near-duplicate first-turn question over the same evidence: reuse the answer
+    cache_key, cached = _answer_cache_lookup(question, chunks, conversation_history, summary)
+    if cached:
+        return dict(cached, cached=True)
+
+    # --- Step 2: AUGMENTATION - Format chunks into structured context ---
+    messages = build_messages(question, chunks, conversation_history, summary)
+
+    # --- Steps 3-4: GENERATION + CITATIONS - identical in-flight prompts share one completion ---
+    try:
+        result = generation_flight.do(
+            _generation_key(messages), _generate_answer, messages, chunks, prompt_tokens, cache_key
+        )
+        return dict(result)
+
+    except AdmissionRejected as e:
+        return {"error": str(e), "retry_after": e.retry_after}
+
+    except Exception as e:
+        print(f"LLM generation failed in rag_service.py: {str(e)}")
+        return {"error": f"LLM generation failed: {str(e)}. Check LM Studio logs for /v1/chat/completions errors."}
+
+def stream_answer(question: str, video_id: str = None, conversation_history: list = None, top_k: int = 3,
+                  search_mode: str = None, diversify: bool = None, summary: str = None,
+                  conversation_id: str = None):
+    """Streaming RAG Pipeline: yields (event, payload) tuples as the answer is generated.
+
+    Events, in order:
+        ("sources", {"sources": [...], "confidence": float, "model": str})  as soon as retrieval finishes
+        ("token", {"text": str})                                            for every streamed delta
+        ("done", {"answer": str, "sources": [...], "confidence": float, "model": str})
+    or a single ("error", {"error": str}) if retrieval or generation fails; when the request is shed
+    by admission control the error payload also carries "retry_after" (seconds).
+    """
+    chunks, error = retrieve_chunks(question, video_id, top_k, search_mode, diversify, conversation_id)
+    if error:
+        yield "error", error
+        return
+
+    # Fit evidence and history into the prompt token budget
+    chunks, conversation_history, prompt_tokens = pack_context(question, chunks, conversation_history, summary)
+
+    cache_key, cached = _answer_cache_lookup(question, chunks, conversation_history, summary)
+    if cached:
+        yield "sources", {"sources": cached["sources"], "confidence": cached["confidence"], "model": CHAT_MODEL}
+        yield "token", {"text": cached["answer"]}
+        yield "done", dict(cached, cached=True)
+        return
 
-        answer = response.choices[0].message.content
-
-        # --- Step 4: CITATION TRACKING - Extract and format sources ---
-        citations = []
-        similarity_scores = []
-        
-        for chunk in chunks:
-            similarity = float(chunk.get('similarity_score', 0.0)) 
-            similarity_scores.append(similarity)
-            
-            citations.append({
-                "video_id": chunk.get('youtube_video_id', ''),
-                "timestamp_seconds": chunk.get('start_time_seconds', 0), 
-                "url": f"https://youtube.com/watch?v={chunk.get('youtube_video_id', '')}&t={int(chunk.get('start_time_seconds', 0))}s",
-                "similarity": similarity 
-            })
-
-        confidence = sum(similarity_scores) / len(similarity_scores) if similarity_scores else 0.0
-
-        return {
-            "answer": answer,
+    citations, confidence = build_citations(chunks)
+    yield "sources", {"sources": citations, "confidence": confidence, "model": CHAT_MODEL}
+
+    messages = build_messages(question, chunks, conversation_history, summary)
+
+    try:
+        # The slot is held until the stream ends (or the client disconnects and the generator closes)
+        with llm_admission.slot(priority=prompt_tokens):
+            stream = get_client().chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=512,
+                stream=True,
+            )
+
+            try:
+                parts = []
+                for event in stream:
+                    if not event.choices:
+                        continue
+                    delta = event.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        yield "token", {"text": delta}
+            finally:
+                # Release the upstream HTTP response (and the model's generation) on disconnect too
+                stream.close()
+
+        result = {
+            "answer": "".join(parts),
             "sources": citations,
             "confidence": confidence,
-            "model": "openai/gpt-oss-20b"
+            "model": CHAT_MODEL,
+            "prompt_tokens": prompt_tokens
         }
+        if cache_key:
+            answer_cache.set(*cache_key, result)
+        yield "done", result
+
+    except AdmissionRejected as e:
+        yield "error", {"error": str(e), "retry_after": e.retry_after}
+
+    except Exception as e:
+        print(f"LLM streaming failed in rag_service.py: {str(e)}")
+        yield "error", {"error": f"LLM generation failed: {str(e)}. Check LM Studio logs for /v1/chat/completions errors."}
+
+async def aanswer_question(question: str, video_id: str = None, conversation_history: list = None, top_k: int = 3,
+                           search_mode: str = None, diversify: bool = None, summary: str = None,
+                           conversation_id: str = None) -> dict:
+    """Async answer_question: awaits the embedding and chat requests instead of blocking a worker."""
+    chunks, error = await aretrieve_chunks(question, video_id, top_k, search_mode, diversify, conversation_id)
+    if error:
+        return error
+
+    # Fit evidence and history into the prompt token budget
+    chunks, conversation_history, prompt_tokens = pack_context(question, chunks, conversation_history, summary)
+
+    # Lookup reads the cited chunks' stamps from the database
+    cache_key, cached = await sync_to_async(_answer_cache_lookup)(question, chunks, conversation_history, summary)
+    if cached:
+        return dict(cached, cached=True)
+
+    messages = build_messages(question, chunks, conversation_history, summary)
+
+    try:
+        result = await generation_flight.ado(
+            _generation_key(messages), _agenerate_answer, messages, chunks, prompt_tokens, cache_key
+        )
+        return dict(result)
+
+    except AdmissionRejected as e:
+        return {"error": str(e), "retry_after": e.retry_after}
 
     except Exception as e:
         print(f"LLM generation failed in rag_service.py: {str(e)}")
-        return {"error": f"LLM generation failed: {str(e)}. Check LM Studio logs for /v1/chat/completions errors."}
\ No newline at end of file
+        return {"error": f"LLM generation failed: {str(e)}. Check LM Studio logs for /v1/chat/completions errors."}
+
+async def astream_answer(question: str, video_id: str = None, conversation_history: list = None, top_k: int = 3,
+                         search_mode: str = None, diversify: bool = None, summary: str = None,
+                         conversation_id: str = None):
+    """Async stream_answer: an async generator yielding the same (event, payload) tuples."""
+    chunks, error = await aretrieve_chunks(question, video_id, top_k, search_mode, diversify, conversation_id)
+    if error:
+        yield "error", error
+        return
+
+    # Fit evidence and history into the prompt token budget
+    chunks, conversation_history, prompt_tokens = pack_context(question, chunks, conversation_history, summary)
+
+    cache_key, cached = await sync_to_async(_answer_cache_lookup)(question, chunks, conversation_history, summary)
+    if cached:
+        yield "sources", {"sources": cached["sources"], "confidence": cached["confidence"], "model": CHAT_MODEL}
+        yield "token", {"text": cached["answer"]}
+        yield "done", dict(cached, cached=True)
+        return
+
+    citations, confidence = build_citations(chunks)
+    yield "sources", {"sources": citations, "confidence": confidence, "model": CHAT_MODEL}
+
+    messages = build_messages(question, chunks, conversation_history, summary)
+
+    try:
+        async with llm_admission.aslot(priority=prompt_tokens):
+            stream = await get_async_client().chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=512,
+                stream=True,
+            )
+
+            try:
+                parts = []
+                async for event in stream:
+                    if not event.choices:
+                        continue
+                    delta = event.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        yield "token", {"text": delta}
+            finally:
+                # Release the upstream HTTP response (and the model's generation) on disconnect too
+                await stream.close()
+
+        result = {
+            "answer": "".join(parts),
+            "sources": citations,
+            "confidence": confidence,
+            "model": CHAT_MODEL,
+            "prompt_tokens": prompt_tokens
+        }
+        if cache_key:
+            answer_cache.set(*cache_key, result)
+        yield "done", result
+
+    except AdmissionRejected as e:
+        yield "error", {"error": str(e), "retry_after": e.retry_after}
+
+    except Exception as e:
+        print(f"LLM streaming failed in rag_service.py: {str(e)}")
+        yield "error", {"error": f"LLM generation failed: {str(e)}. Check LM Studio logs for /v1/chat/completions errors."}
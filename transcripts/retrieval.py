@@ -0,0 +1,110 @@
+"""Post-processing for retrieved chunks: MMR diversification and overlap collapse."""
+
+from typing import List
+
+import numpy as np
+
+# Chunks closer than this (seconds) after the previous chunk ends count as adjacent
+ADJACENCY_GAP_SECONDS = 1.0
+# Longest word overlap looked for when stitching adjacent chunks (pipeline uses 20)
+MAX_OVERLAP_WORDS = 50
+
+
+def as_array(vector) -> np.ndarray:
+    """float32 array from a stored vector, whichever of list, ndarray or pgvector Vector the driver returned."""
+    if hasattr(vector, 'to_numpy'):
+        vector = vector.to_numpy()
+    return np.asarray(vector, dtype=np.float32)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def mmr_select(query_embedding, candidates: List[dict], top_k: int, mmr_lambda: float = 0.7) -> List[dict]:
+    """Pick top_k candidates by maximal marginal relevance.
+
+    Each step picks argmax(lambda * sim(query, c) - (1 - lambda) * max sim(c, selected)),
+    with cosine similarities computed once as matrix products.
+
+    Args:
+        query_embedding: Query vector
+        candidates: Result dicts, each carrying an 'embedding' vector
+        top_k: Number of chunks to keep
+        mmr_lambda: 1.0 = pure relevance, 0.0 = pure diversity
+    """
+    if len(candidates) <= top_k:
+        return list(candidates)
+
+    embeddings = _normalize_rows(np.asarray([as_array(c['embedding']) for c in candidates]))
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(np.linalg.norm(query), 1e-12)
+
+    relevance = embeddings @ query
+    pairwise = embeddings @ embeddings.T
+
+    selected = [int(np.argmax(relevance))]
+    max_redundancy = pairwise[selected[0]].copy()
+    available = np.ones(len(candidates), dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < top_k:
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * max_redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_redundancy, pairwise[best], out=max_redundancy)
+
+    return [candidates[i] for i in selected]
+
+
+def _stitch(left: str, right: str) -> str:
+    """Join two overlapping chunk texts, dropping the repeated overlap words."""
+    left_words = left.split()
+    right_words = right.split()
+    for size in range(min(len(left_words), len(right_words), MAX_OVERLAP_WORDS), 0, -1):
+        if left_words[-size:] == right_words[:size]:
+            return ' '.join(left_words + right_words[size:])
+    return ' '.join(left_words + right_words)
+
+
+def collapse_adjacent(chunks: List[dict]) -> List[dict]:
+    """Merge time-adjacent chunks from the same video into one piece of evidence.
+
+    The merged chunk keeps the earliest start time and the best similarity
+    score, and lists the source chunk ids in 'merged_chunk_ids'. Output keeps
+    the order of each group's best-scoring chunk.
+    """
+    by_video = {}
+    for rank, chunk in enumerate(chunks):
+        by_video.setdefault(chunk['video_id'], []).append((rank, chunk))
+
+    merged = []
+    for video_chunks in by_video.values():
+        video_chunks.sort(key=lambda item: item[1]['start_time_seconds'] or 0)
+        current_rank, current = video_chunks[0]
+        current = dict(current)
+        for rank, chunk in video_chunks[1:]:
+            current_start = current['start_time_seconds'] or 0
+            current_end = current_start + (current.get('duration') or 0)
+            if (chunk['start_time_seconds'] or 0) <= current_end + ADJACENCY_GAP_SECONDS:
+                chunk_end = (chunk['start_time_seconds'] or 0) + (chunk.get('duration') or 0)
+                current['text'] = _stitch(current['text'], chunk['text'])
+                current['duration'] = max(current_end, chunk_end) - current_start
+                current['similarity_score'] = max(current['similarity_score'], chunk['similarity_score'])
+                if current.get('token_count') is not None and chunk.get('token_count') is not None:
+                    # Includes the dropped overlap, so a slight overestimate - safe for budgeting
+                    current['token_count'] += chunk['token_count']
+                else:
+                    current['token_count'] = None
+                current.setdefault('merged_chunk_ids', [current['id']]).append(chunk['id'])
+                current_rank = min(current_rank, rank)
+            else:
+                merged.append((current_rank, current))
+                current_rank, current = rank, dict(chunk)
+        merged.append((current_rank, current))
+
+    merged.sort(key=lambda item: item[0])
+    return [chunk for _, chunk in merged]
@@ -0,0 +1,79 @@
+"""Semantic search result cache, invalidated by the corpus generation counter."""
+
+import hashlib
+import threading
+import time
+
+import numpy as np
+from django.core.cache import caches
+
+from .embedding_cache import normalize_query
+from .models import CorpusState
+
+
+class CorpusGeneration:
+    """Reads corpus_state.generation, re-polling the database at most every ``poll_seconds``."""
+
+    def __init__(self, poll_seconds: float = 1.0):
+        self.poll_seconds = poll_seconds
+        self._value = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> int:
+        now = time.monotonic()
+        if self._value is not None and now - self._checked_at < self.poll_seconds:
+            return self._value
+
+        generation = CorpusState.objects.filter(pk=1).values_list('generation', flat=True).first() or 0
+        with self._lock:
+            self._value = generation
+            self._checked_at = now
+        return generation
+
+
+class SearchResultCache:
+    """Caches semantic_search result lists in the Django cache framework.
+
+    Keys combine a hash of the query vector with every filter that changes the
+    result (video_id, top_k, backend, mode) and the corpus version, so bumping
+    the generation makes every older entry unreachable; they then age out by TTL.
+    """
+
+    def __init__(self, ttl: int = 300, cache_alias: str = 'default'):
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_key(query: str, query_embedding, video_id: str, top_k: int,
+                 backend: str, mode: str, corpus_version: str) -> str:
+        digest = hashlib.sha1(np.asarray(query_embedding, dtype=np.float32).tobytes())
+        # Lexical ranking depends on the query text itself, not only its embedding
+        lexical = normalize_query(query) if mode == 'hybrid' else ''
+        digest.update(f"\x00{video_id or ''}\x00{top_k}\x00{backend}\x00{mode}\x00{lexical}".encode('utf-8'))
+        return f"search_results:{corpus_version}:{digest.hexdigest()}"
+
+    def get(self, key: str):
+        results = caches[self.cache_alias].get(key)
+        with self._lock:
+            if results is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return results
+
+    def set(self, key: str, results: list) -> None:
+        caches[self.cache_alias].set(key, results, timeout=self.ttl)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'ttl_seconds': self.ttl,
+            }
@@ -1,99 +1,617 @@
 """Semantic search using pgvector cosine similarity."""
 
-import os
+import asyncio
 import time
-from openai import OpenAI
-from django.db import connection
+from contextlib import contextmanager
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction, DatabaseError
 #from .models import Transcripts, Videos
-from dotenv import load_dotenv
 
-load_dotenv()
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_cache import QueryEmbeddingCache, normalize_query
+from .model_clients import get_client, get_async_client
+from .models import TextChunks
+from .retrieval import mmr_select, collapse_adjacent
+from .search_cache import CorpusGeneration, SearchResultCache
+from .singleflight import SingleFlight
+from .vector_index import get_vector_index, refresh_if_stale
 
-# OpenAI Client and Embedding
+# Embedding model (served through the shared pooled client in model_clients)
 EMBEDDING_MODEL = "nomic-ai/nomic-embed-text-v1.5-GGUF"
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY", "not-needed"),
-    base_url=os.getenv("OPENAI_BASE_URL", "http://127.0.0.1:1234/v1")
+
+query_embedding_cache = QueryEmbeddingCache(
+    max_size=getattr(settings, 'EMBEDDING_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'EMBEDDING_CACHE_TTL', 3600),
+    shared=getattr(settings, 'EMBEDDING_CACHE_SHARED', False),
 )
 
-def semantic_search(query: str, video_id: str = None, top_k: int = 5) -> dict:
-    """Find semantically similar transcripts using embeddings.
+search_result_cache = SearchResultCache(ttl=getattr(settings, 'SEARCH_RESULT_CACHE_TTL', 300))
+corpus_generation = CorpusGeneration(poll_seconds=getattr(settings, 'CORPUS_GENERATION_POLL_SECONDS', 1.0))
+embedding_flight = SingleFlight()
 
-    Args:
-        query: User's search query (e.g., "How do transformers work?")
-        video_id: Optional - search specific video only
-        top_k: Number of results to return
+def _embed_texts(texts: list) -> list:
+    """One embeddings request for many texts; vectors in input order."""
+    response = get_client().embeddings.create(
+        model=EMBEDDING_MODEL,
+        input=texts
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
-    Returns:
-        Dict with results and metadata
-    """
-    start_time = time.time()
+# Concurrent single-query misses are sent together as one embeddings request
+embedding_batcher = EmbeddingBatcher(
+    _embed_texts,
+    max_batch_size=getattr(settings, 'EMBEDDING_BATCH_MAX_SIZE', 32),
+    max_wait=getattr(settings, 'EMBEDDING_BATCH_MAX_WAIT_MS', 5) / 1000,
+    max_concurrent_batches=getattr(settings, 'EMBEDDING_BATCH_CONCURRENCY', 4),
+    timeout=getattr(settings, 'EMBEDDING_BATCH_TIMEOUT_SECONDS', 150),
+)
 
-    # Step 1: Generate embedding for query
-    try:
-        query_response = client.embeddings.create(
+def _fetch_query_embedding(query: str) -> list:
+    if getattr(settings, 'EMBEDDING_BATCH_ENABLED', True):
+        embedding = embedding_batcher.embed(query)
+    else:
+        embedding = _embed_texts([query])[0]
+    query_embedding_cache.set(query, EMBEDDING_MODEL, embedding)
+    return embedding
+
+def embed_query(query: str) -> list:
+    """Return the embedding for a query, served from the cache when possible."""
+    embedding = query_embedding_cache.get(query, EMBEDDING_MODEL)
+    if embedding is not None:
+        return embedding
+
+    # Concurrent misses for the same (normalized) text share one embeddings request
+    return embedding_flight.do((EMBEDDING_MODEL, normalize_query(query)), _fetch_query_embedding, query)
+
+async def _afetch_query_embedding(query: str) -> list:
+    if getattr(settings, 'EMBEDDING_BATCH_ENABLED', True):
+        # Batched together with sync and async callers alike; awaiting the future holds no thread
+        embedding = await asyncio.wait_for(asyncio.wrap_future(embedding_batcher.submit(query)),
+                                           embedding_batcher.timeout)
+    else:
+        query_response = await get_async_client().embeddings.create(
             model=EMBEDDING_MODEL,
             input=query
         )
-        query_embedding = query_response.data[0].embedding
-    except Exception as e:
-        return {
-            'error': f'Failed to embed query: {str(e)}',
-            'query': query
-        }
+        embedding = query_response.data[0].embedding
+    if query_embedding_cache.shared:
+        await sync_to_async(query_embedding_cache.set)(query, EMBEDDING_MODEL, embedding)
+    else:
+        query_embedding_cache.set(query, EMBEDDING_MODEL, embedding)
+    return embedding
+
+async def aembed_query(query: str) -> list:
+    """Async embed_query; shares the same cache."""
+    # A shared (Redis) cache lookup is a blocking network call, so keep it off the event loop
+    if query_embedding_cache.shared:
+        embedding = await sync_to_async(query_embedding_cache.get)(query, EMBEDDING_MODEL)
+    else:
+        embedding = query_embedding_cache.get(query, EMBEDDING_MODEL)
+    if embedding is not None:
+        return embedding
+
+    return await embedding_flight.ado((EMBEDDING_MODEL, normalize_query(query)), _afetch_query_embedding, query)
+
+def embed_queries(queries: list) -> list:
+    """Embed many queries with at most one embeddings request (cache hits are skipped)."""
+    embeddings = [query_embedding_cache.get(query, EMBEDDING_MODEL) for query in queries]
+
+    # Deduplicate misses so repeated queries in a batch are only embedded once
+    missing = list(dict.fromkeys(q for q, e in zip(queries, embeddings) if e is None))
+    if missing:
+        fetched = {}
+        for query, embedding in zip(missing, _embed_texts(missing)):
+            fetched[query] = embedding
+            query_embedding_cache.set(query, EMBEDDING_MODEL, embedding)
+        embeddings = [e if e is not None else fetched[q] for q, e in zip(queries, embeddings)]
+
+    return embeddings
+
+def bounded_top_k(top_k) -> int:
+    """top_k as an int clamped to [1, SEARCH_MAX_TOP_K]; raises TypeError/ValueError if it is not a number."""
+    return max(1, min(int(top_k), getattr(settings, 'SEARCH_MAX_TOP_K', 100)))
+
+def _add_youtube_links(results: list) -> None:
+    """Add YouTube links with timestamps to result dicts in place."""
+    for result in results:
+        if result['start_time_seconds']:
+            mins = int(result['start_time_seconds'] // 60)
+            secs = int(result['start_time_seconds'] % 60)
+            result['youtube_url'] = (
+                f"https://youtube.com/watch?v="
+                f"{result['youtube_video_id']}&t={mins}m{secs}s"
+            )
+
+def _as_vector_param(embedding) -> str:
+    """Query embedding as a pgvector literal; each statement binds it once and casts it to vector."""
+    return '[' + ','.join(map(str, embedding)) + ']'
 
-    # Step 2: Format as pgvector expects
-    embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
+def _fetch_results(cursor, sql: str, params) -> list:
+    """Run a search statement and turn its rows into result dicts (distance -> similarity_score)."""
+    cursor.execute(sql, params)
+    columns = [col[0] for col in cursor.description]
+    results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    for result in results:
+        result['similarity_score'] = 1 - result.pop('distance')
+    return results
 
-    # Step 3: Build SQL based on filters
+def _video_chunk_count(video_id: str) -> int:
+    """Embedded chunks in one video, cached per corpus generation."""
+    key = f"video_chunk_count:{corpus_generation.current()}:{video_id}"
+    return caches['default'].get_or_set(
+        key,
+        lambda: TextChunks.objects.filter(video_id=video_id, embedding__isnull=False).count(),
+        timeout=3600,
+    )
+
+def _use_exact_video_scan(video_id: str) -> bool:
+    """Small videos are scanned exactly; only large ones go through the ANN index."""
+    return _video_chunk_count(video_id) <= getattr(settings, 'VIDEO_EXACT_SEARCH_MAX_CHUNKS', 5000)
+
+# SQLSTATEs for SET of an hnsw.* parameter the installed pgvector does not define
+# (undefined_object; invalid_name when the extension reserved the "hnsw" prefix)
+UNSUPPORTED_PARAMETER_SQLSTATES = ('42704', '42602')
+
+_iterative_scan_supported = None
+
+def _pgvector_version(version: str) -> tuple:
+    return tuple(int(part) for part in version.split('.')[:2] if part.isdigit())
+
+def _use_iterative_scan() -> bool:
+    """Whether filtered ANN searches set hnsw.iterative_scan; pgvector's version is read once per process."""
+    global _iterative_scan_supported
+    if not getattr(settings, 'PGVECTOR_ITERATIVE_SCAN', True):
+        return False
+    if _iterative_scan_supported is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            row = cursor.fetchone()
+        _iterative_scan_supported = row is not None and _pgvector_version(row[0]) >= (0, 8)
+    return _iterative_scan_supported
+
+def _iterative_scan_rejected(error: DatabaseError) -> bool:
+    """Whether error is pgvector refusing hnsw.iterative_scan; if so, stop setting it in this process."""
+    global _iterative_scan_supported
+    if (getattr(error.__cause__, 'pgcode', None) in UNSUPPORTED_PARAMETER_SQLSTATES
+            and 'iterative_scan' in str(error)):
+        _iterative_scan_supported = False
+        return True
+    return False
+
+@contextmanager
+def _ann_cursor(top_k: int, filtered: bool = True):
+    """Cursor in a short transaction with HNSW sized for top_k.
+
+    An HNSW scan returns at most ef_search rows, so it is raised to top_k.
+    For filtered queries, iterative index scans (pgvector >= 0.8) keep walking
+    the graph until enough rows pass the WHERE clause instead of stopping
+    after ef_search candidates.
+    """
+    ef_search = max(getattr(settings, 'HNSW_EF_SEARCH', 100), int(top_k))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SET LOCAL hnsw.ef_search = {ef_search}")
+        if filtered and _use_iterative_scan():
+            cursor.execute("SET LOCAL hnsw.iterative_scan = relaxed_order")
+        yield cursor
+
+@contextmanager
+def _exact_cursor():
+    """Cursor in a short transaction that keeps the planner off the HNSW index.
+
+    HNSW only serves ordered index scans; with those disabled every distance is
+    computed and sorted, so results are exact (btree filters still use bitmap scans).
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_indexscan = off")
+        yield cursor
+
+def _search_video_exact(query_embedding: list, video_id: str, top_k: int) -> list:
+    """Exact top-k within one video: the MATERIALIZED CTE keeps the planner on the btree filter."""
+    sql = """
+    WITH query AS (SELECT %s::vector AS embedding),
+    candidates AS MATERIALIZED (
+        SELECT t.id, t.video_id, t.text, t.start_time_seconds, t.token_count, t.embedding
+        FROM text_chunks t
+        WHERE t.video_id = %s AND t.embedding IS NOT NULL
+    )
+    SELECT
+        c.id,
+        c.video_id,
+        c.text,
+        c.start_time_seconds,
+        c.token_count,
+        c.video_id as youtube_video_id,
+        c.embedding <-> (SELECT embedding FROM query) as distance
+    FROM candidates c
+    ORDER BY distance
+    LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        return _fetch_results(cursor, sql, [_as_vector_param(query_embedding), video_id, top_k])
+
+def _nearest_sql(query_embedding: list, video_id: str, top_k: int) -> tuple:
+    """(sql, params) for the top-k nearest chunks, optionally within one video."""
+    # Build SQL based on filters
     if video_id:
         where_clause = "WHERE t.video_id = %s AND t.embedding IS NOT NULL"
-        params = [embedding_str, video_id, embedding_str, top_k]
+        params = [_as_vector_param(query_embedding), video_id, top_k]
     else:
         where_clause = "WHERE t.embedding IS NOT NULL"
-        params = [embedding_str, embedding_str, top_k]
+        params = [_as_vector_param(query_embedding), top_k]
 
-    # Step 4: Query database using pgvector <-> operator
-    # <-> is cosine distance operator (lower = more similar)
+    # Query database using pgvector <-> operator (lower = more similar).
+    # The vector is bound once in the CTE; the scalar subquery becomes an
+    # InitPlan parameter, so the HNSW index on t.embedding can still serve the ORDER BY.
     sql = f"""
+    WITH query AS (SELECT %s::vector AS embedding)
     SELECT
         t.id,
         t.video_id,
         t.text,
         t.start_time_seconds,
-        v.video_id as youtube_video_id,
-        
-        1 - (t.embedding <-> %s::vector) as similarity_score
+        t.token_count,
+        t.video_id as youtube_video_id,
+        t.embedding <-> (SELECT embedding FROM query) as distance
     FROM text_chunks t
-    JOIN videos v ON t.video_id = v.video_id
     {where_clause}
-    ORDER BY t.embedding <-> %s::vector  -- Sort by distance (closest first)
+    ORDER BY distance  -- Sort by distance (closest first)
     LIMIT %s
     """
+    return sql, params
+
+def _search_exact(query_embedding: list, video_id: str, top_k: int) -> list:
+    """Exact top-k, never answered by the ANN index."""
+    if video_id:
+        return _search_video_exact(query_embedding, video_id, top_k)
+    with _exact_cursor() as cursor:
+        return _fetch_results(cursor, *_nearest_sql(query_embedding, None, top_k))
+
+def _search_pgvector(query_embedding: list, video_id: str = None, top_k: int = 5) -> list:
+    """Nearest chunks via pgvector in PostgreSQL."""
+    # Per-video searches: exact scan for small videos, iterative ANN scan for large ones
+    if video_id and _use_exact_video_scan(video_id):
+        return _search_video_exact(query_embedding, video_id, top_k)
 
     try:
+        with _ann_cursor(top_k, filtered=bool(video_id)) as cursor:
+            results = _fetch_results(cursor, *_nearest_sql(query_embedding, video_id, top_k))
+    except DatabaseError as e:
+        if not _iterative_scan_rejected(e):
+            raise
+        # pgvector without iterative scans: fall back to the exact path
+        results = []
+
+    # relaxed_order may return neighbours slightly out of order
+    results.sort(key=lambda result: -result['similarity_score'])
+    if len(results) < top_k:
+        # Guarantee top_k even when the index scan came up short
+        return _search_exact(query_embedding, video_id, top_k)
+    return results
+
+def _search_numpy(query_embedding: list, video_id: str = None, top_k: int = 5) -> list:
+    """Nearest chunks via the in-process memory-mapped index (no database round trip)."""
+    index = get_vector_index()
+    if getattr(settings, 'VECTOR_INDEX_AUTO_REFRESH', True):
+        # Chunks landed since the snapshot was taken: append them off the request path
+        refresh_if_stale(index, corpus_generation.current())
+    return index.search(query_embedding, top_k=top_k, video_id=video_id)
+
+def _hybrid_sql(video_id: str, exact_video_scan: bool) -> str:
+    """Fused lexical + vector ranking; the vector side follows the same planner choice as _search_pgvector."""
+    video_filter = "AND t.video_id = %(video_id)s" if video_id else ""
+    if exact_video_scan:
+        # Rank the video's own rows exactly instead of filtering a global index scan
+        vector_source = """
+    video_chunks AS MATERIALIZED (
+        SELECT t.id, t.embedding
+        FROM text_chunks t
+        WHERE t.video_id = %(video_id)s AND t.embedding IS NOT NULL
+    ),"""
+        vector_from = "video_chunks t"
+        vector_where = ""
+    else:
+        vector_source = ""
+        vector_from = "text_chunks t"
+        vector_where = f"WHERE t.embedding IS NOT NULL {video_filter}"
+
+    return f"""
+    WITH query AS (
+        SELECT %(embedding)s::vector AS embedding, websearch_to_tsquery('english', %(query)s) AS tsquery
+    ),{vector_source}
+    vector_hits AS (
+        SELECT nearest.id, row_number() OVER (ORDER BY nearest.distance) AS rank
+        FROM (
+            SELECT t.id, t.embedding <-> (SELECT embedding FROM query) AS distance
+            FROM {vector_from}
+            {vector_where}
+            ORDER BY distance
+            LIMIT %(candidates)s
+        ) nearest
+    ),
+    lexical_hits AS (
+        SELECT t.id, row_number() OVER (ORDER BY ts_rank_cd(t.search_vector, q.tsquery) DESC) AS rank
+        FROM text_chunks t, query q
+        WHERE t.search_vector @@ q.tsquery {video_filter}
+        ORDER BY ts_rank_cd(t.search_vector, q.tsquery) DESC
+        LIMIT %(candidates)s
+    ),
+    fused AS (
+        SELECT
+            COALESCE(v.id, l.id) AS id,
+            COALESCE(1.0 / (%(rrf_k)s + v.rank), 0) + COALESCE(1.0 / (%(rrf_k)s + l.rank), 0) AS rrf_score,
+            v.rank AS vector_rank,
+            l.rank AS lexical_rank
+        FROM vector_hits v
+        FULL OUTER JOIN lexical_hits l ON v.id = l.id
+    )
+    SELECT
+        t.id,
+        t.video_id,
+        t.text,
+        t.start_time_seconds,
+        t.token_count,
+        t.video_id as youtube_video_id,
+        1 - (t.embedding <-> (SELECT embedding FROM query)) as similarity_score,
+        f.rrf_score,
+        f.vector_rank,
+        f.lexical_rank,
+        (SELECT count(*) FROM vector_hits) AS vector_candidates
+    FROM fused f
+    JOIN text_chunks t ON t.id = f.id
+    ORDER BY f.rrf_score DESC
+    LIMIT %(top_k)s
+    """
+
+def _fetch_hybrid(cursor, sql: str, params: dict) -> tuple:
+    """(result dicts, number of vector candidates that went into the fusion)."""
+    cursor.execute(sql, params)
+    columns = [col[0] for col in cursor.description]
+    results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    vector_candidates = 0
+    for result in results:
+        vector_candidates = result.pop('vector_candidates')
+    return results, vector_candidates
+
+def _search_hybrid(query: str, query_embedding: list, video_id: str = None, top_k: int = 5) -> list:
+    """Lexical (tsvector) + vector retrieval fused with reciprocal rank fusion in one query.
+
+    Each retriever contributes its top candidates; a chunk's fused score is
+    sum(1 / (k + rank)) over the lists it appears in.
+    """
+    params = {
+        'embedding': _as_vector_param(query_embedding),
+        'query': query,
+        'video_id': video_id,
+        'candidates': max(getattr(settings, 'HYBRID_CANDIDATES', 50), top_k),
+        'rrf_k': getattr(settings, 'HYBRID_RRF_K', 60),
+        'top_k': top_k,
+    }
+
+    if video_id and _use_exact_video_scan(video_id):
+        with connection.cursor() as cursor:
+            return _fetch_hybrid(cursor, _hybrid_sql(video_id, exact_video_scan=True), params)[0]
+
+    try:
+        with _ann_cursor(params['candidates'], filtered=bool(video_id)) as cursor:
+            results, vector_candidates = _fetch_hybrid(cursor, _hybrid_sql(video_id, False), params)
+    except DatabaseError as e:
+        if not _iterative_scan_rejected(e):
+            raise
+        # pgvector without iterative scans: fall back to the exact path
+        results, vector_candidates = [], 0
+
+    if vector_candidates < params['candidates']:
+        # The index scan came up short: rank the vector side exactly so the fusion is not lexical-only
+        if video_id:
+            with connection.cursor() as cursor:
+                results = _fetch_hybrid(cursor, _hybrid_sql(video_id, exact_video_scan=True), params)[0]
+        else:
+            with _exact_cursor() as cursor:
+                results = _fetch_hybrid(cursor, _hybrid_sql(None, False), params)[0]
+    return results
+
+def _batch_sql(query_embeddings: list, video_id: str, top_k: int, exact_video_scan: bool) -> tuple:
+    """(sql, params) for the top-k of every query embedding, one LATERAL join per query."""
+    values_sql = ', '.join(['(%s, %s::vector)'] * len(query_embeddings))
+    params = []
+    for index, embedding in enumerate(query_embeddings):
+        params.extend([index, _as_vector_param(embedding)])
+
+    if exact_video_scan:
+        # Same planner choice as _search_video_exact: scan the video's rows, skip the ANN index
+        source_sql = """
+        WITH candidates AS MATERIALIZED (
+            SELECT t.id, t.video_id, t.text, t.start_time_seconds, t.token_count, t.embedding
+            FROM text_chunks t
+            WHERE t.video_id = %s AND t.embedding IS NOT NULL
+        )
+        """
+        params.insert(0, video_id)
+        from_clause = "candidates t"
+        video_filter = ""
+    else:
+        source_sql = ""
+        from_clause = "text_chunks t"
+        video_filter = "AND t.video_id = %s" if video_id else ""
+        if video_id:
+            params.append(video_id)
+    params.append(top_k)
+
+    sql = f"""
+    {source_sql}
+    SELECT
+        q.idx as query_index,
+        r.*
+    FROM (VALUES {values_sql}) AS q(idx, embedding)
+    CROSS JOIN LATERAL (
+        SELECT
+            t.id,
+            t.video_id,
+            t.text,
+            t.start_time_seconds,
+            t.token_count,
+            t.video_id as youtube_video_id,
+            t.embedding <-> q.embedding as distance
+        FROM {from_clause}
+        WHERE t.embedding IS NOT NULL {video_filter}
+        ORDER BY distance
+        LIMIT %s
+    ) r
+    ORDER BY q.idx, r.distance
+    """
+    return sql, params
+
+def _fetch_batch(cursor, sql: str, params: list, count: int) -> list:
+    """One result list per query, closest first (relaxed_order may return them slightly out of order)."""
+    grouped = [[] for _ in range(count)]
+    for result in _fetch_results(cursor, sql, params):
+        grouped[result.pop('query_index')].append(result)
+    for group in grouped:
+        group.sort(key=lambda result: -result['similarity_score'])
+    return grouped
+
+def _search_exact_batch(query_embeddings: list, video_id: str, top_k: int) -> list:
+    """Exact top-k for every query embedding, never answered by the ANN index."""
+    if video_id:
         with connection.cursor() as cursor:
-            cursor.execute(sql, params)
-            columns = [col[0] for col in cursor.description]
-            rows = cursor.fetchall()
-
-        # Step 5: Format results
-        results = [dict(zip(columns, row)) for row in rows]
-
-        # Step 6: Add YouTube links with timestamps
-        for result in results:
-            if result['start_time_seconds']:
-                mins = int(result['start_time_seconds'] // 60)
-                secs = int(result['start_time_seconds'] % 60)
-                result['youtube_url'] = (
-                    f"https://youtube.com/watch?v="
-                    f"{result['youtube_video_id']}&t={mins}m{secs}s"
-                )
+            sql, params = _batch_sql(query_embeddings, video_id, top_k, exact_video_scan=True)
+            return _fetch_batch(cursor, sql, params, len(query_embeddings))
+    with _exact_cursor() as cursor:
+        sql, params = _batch_sql(query_embeddings, None, top_k, exact_video_scan=False)
+        return _fetch_batch(cursor, sql, params, len(query_embeddings))
+
+def _search_pgvector_batch(query_embeddings: list, video_id: str = None, top_k: int = 5) -> list:
+    """Top-k for every query embedding in one statement, with the same planner choices as _search_pgvector."""
+    if video_id and _use_exact_video_scan(video_id):
+        return _search_exact_batch(query_embeddings, video_id, top_k)
+
+    try:
+        with _ann_cursor(top_k, filtered=bool(video_id)) as cursor:
+            sql, params = _batch_sql(query_embeddings, video_id, top_k, exact_video_scan=False)
+            grouped = _fetch_batch(cursor, sql, params, len(query_embeddings))
+    except DatabaseError as e:
+        if not _iterative_scan_rejected(e):
+            raise
+        # pgvector without iterative scans: fall back to the exact path
+        grouped = [[] for _ in query_embeddings]
+
+    # Guarantee top_k for every query: re-run the ones the index scan left short
+    short = [index for index, group in enumerate(grouped) if len(group) < top_k]
+    if short:
+        exact = _search_exact_batch([query_embeddings[index] for index in short], video_id, top_k)
+        for index, group in zip(short, exact):
+            grouped[index] = group
+    return grouped
+
+# Pluggable search backends: name -> fn(query_embedding, video_id, top_k) -> list of result dicts
+SEARCH_BACKENDS = {
+    'pgvector': _search_pgvector,
+    'numpy': _search_numpy,
+}
+
+# 'vector' uses the selected backend; 'hybrid' fuses tsvector and pgvector rankings in PostgreSQL
+SEARCH_MODES = ('vector', 'hybrid')
+
+def _diversify(query_embedding: list, candidates: list, top_k: int, mmr_lambda: float, backend: str) -> list:
+    """MMR over the over-fetched candidates, then merge time-adjacent chunks of one video."""
+    ids = [candidate['id'] for candidate in candidates]
+    if backend == 'numpy':
+        vectors = get_vector_index().chunk_vectors(ids)
+    else:
+        vectors = {
+            chunk_id: (embedding, duration)
+            for chunk_id, embedding, duration in
+            TextChunks.objects.filter(id__in=ids).values_list('id', 'embedding', 'duration')
+        }
+
+    candidates = [
+        dict(candidate, embedding=vectors[candidate['id']][0], duration=vectors[candidate['id']][1])
+        for candidate in candidates if candidate['id'] in vectors
+    ]
+    selected = mmr_select(query_embedding, candidates, top_k, mmr_lambda)
+    for chunk in selected:
+        del chunk['embedding']
+    return collapse_adjacent(selected)
+
+def _resolve_search_options(query: str, backend: str = None, mode: str = None) -> tuple:
+    """Apply setting defaults; returns (backend, mode, None) or (None, None, error dict)."""
+    backend = backend or getattr(settings, 'SEMANTIC_SEARCH_BACKEND', 'pgvector')
+    if backend not in SEARCH_BACKENDS:
+        return None, None, {
+            'error': f'Unknown search backend: {backend}',
+            'query': query
+        }
+
+    mode = mode or getattr(settings, 'SEMANTIC_SEARCH_MODE', 'vector')
+    if mode not in SEARCH_MODES:
+        return None, None, {
+            'error': f'Unknown search mode: {mode}',
+            'query': query
+        }
+    if mode == 'hybrid':
+        # Lexical ranking needs the stored tsvector column, so hybrid always runs in PostgreSQL
+        backend = 'pgvector'
+
+    return backend, mode, None
+
+def _search_with_embedding(query: str, query_embedding: list, video_id: str, top_k: int, backend: str,
+                           mode: str, diversify: bool, mmr_lambda: float, overfetch: int,
+                           start_time: float) -> dict:
+    """Steps 2-5 of semantic_search, shared with the async entry point (blocking DB access)."""
+    if diversify is None:
+        diversify = getattr(settings, 'SEARCH_DIVERSIFY', False)
+    try:
+        top_k = bounded_top_k(top_k)
+    except (TypeError, ValueError):
+        return {'error': f'top_k must be an integer, got {top_k!r}', 'query': query}
+    fetch_k = top_k * (overfetch or getattr(settings, 'SEARCH_MMR_OVERFETCH', 4)) if diversify else top_k
+
+    try:
+        # Step 2: Serve repeats from the result cache while the corpus is unchanged
+        cache_key = None
+        results = None
+        if getattr(settings, 'SEARCH_RESULT_CACHE_ENABLED', True):
+            corpus_version = str(corpus_generation.current())
+            if backend == 'numpy' and mode != 'hybrid':
+                # The snapshot can lag the database until build_vector_index runs
+                corpus_version += ':' + get_vector_index().version()
+            cache_key = search_result_cache.make_key(
+                query, query_embedding, video_id, fetch_k, backend, mode, corpus_version
+            )
+            results = search_result_cache.get(cache_key)
+        cached = results is not None
+
+        # Step 3: Find nearest chunks with the selected backend / mode
+        if not cached:
+            if mode == 'hybrid':
+                results = _search_hybrid(query, query_embedding, video_id, fetch_k)
+            else:
+                results = SEARCH_BACKENDS[backend](query_embedding, video_id, fetch_k)
+
+            # Step 4: Add YouTube links with timestamps
+            _add_youtube_links(results)
+
+            if cache_key:
+                search_result_cache.set(cache_key, results)
+
+        # Step 5: Optional diversification of the over-fetched candidates
+        if diversify:
+            results = _diversify(
+                query_embedding, results, top_k,
+                mmr_lambda if mmr_lambda is not None else getattr(settings, 'SEARCH_MMR_LAMBDA', 0.7),
+                backend,
+            )
 
         execution_time = (time.time() - start_time) * 1000  # milliseconds
 
         return {
             'query': query,
+            'backend': backend,
+            'mode': mode,
+            'cached': cached,
+            'diversified': diversify,
             'results_count': len(results),
             'execution_time_ms': execution_time,
             'results': results
@@ -103,4 +621,119 @@ def semantic_search(query: str, video_id: str = None, top_k: int = 5) -> dict:
         return {
             'error': f'Search failed: {str(e)}',
             'query': query
-        }
\ No newline at end of file
+        }
+
+def semantic_search(query: str, video_id: str = None, top_k: int = 5, backend: str = None,
+                    mode: str = None, diversify: bool = None, mmr_lambda: float = None,
+                    overfetch: int = None) -> dict:
+    """Find semantically similar transcripts using embeddings.
+
+    Args:
+        query: User's search query (e.g., "How do transformers work?")
+        video_id: Optional - search specific video only
+        top_k: Number of results to return
+        backend: Optional - one of SEARCH_BACKENDS (defaults to settings.SEMANTIC_SEARCH_BACKEND)
+        mode: Optional - one of SEARCH_MODES (defaults to settings.SEMANTIC_SEARCH_MODE)
+        diversify: Optional - over-fetch, apply MMR and merge adjacent chunks
+            (defaults to settings.SEARCH_DIVERSIFY)
+        mmr_lambda: Optional - MMR relevance/diversity trade-off (defaults to settings.SEARCH_MMR_LAMBDA)
+        overfetch: Optional - candidates fetched per result when diversifying
+            (defaults to settings.SEARCH_MMR_OVERFETCH)
+
+    Returns:
+        Dict with results and metadata
+    """
+    start_time = time.time()
+
+    backend, mode, error = _resolve_search_options(query, backend, mode)
+    if error:
+        return error
+
+    # Step 1: Generate embedding for query (cached by normalized text)
+    try:
+        query_embedding = embed_query(query)
+    except Exception as e:
+        return {
+            'error': f'Failed to embed query: {str(e)}',
+            'query': query
+        }
+
+    return _search_with_embedding(query, query_embedding, video_id, top_k, backend, mode,
+                                  diversify, mmr_lambda, overfetch, start_time)
+
+async def asemantic_search(query: str, video_id: str = None, top_k: int = 5, backend: str = None,
+                           mode: str = None, diversify: bool = None, mmr_lambda: float = None,
+                           overfetch: int = None) -> dict:
+    """Async semantic_search: the embedding request is awaited, the database search runs in a thread."""
+    start_time = time.time()
+
+    backend, mode, error = _resolve_search_options(query, backend, mode)
+    if error:
+        return error
+
+    try:
+        query_embedding = await aembed_query(query)
+    except Exception as e:
+        return {
+            'error': f'Failed to embed query: {str(e)}',
+            'query': query
+        }
+
+    return await sync_to_async(_search_with_embedding)(
+        query, query_embedding, video_id, top_k, backend, mode, diversify, mmr_lambda, overfetch, start_time
+    )
+
+def semantic_search_batch(queries: list, video_id: str = None, top_k: int = 5, backend: str = None) -> dict:
+    """Vector search for many queries: one embeddings request and one SQL round trip.
+
+    Args:
+        queries: List of query strings
+        video_id: Optional - search specific video only (applies to every query)
+        top_k: Number of results per query
+        backend: Optional - one of SEARCH_BACKENDS (defaults to settings.SEMANTIC_SEARCH_BACKEND)
+
+    Returns:
+        Dict with one result list per query, in input order
+    """
+    start_time = time.time()
+
+    backend = backend or getattr(settings, 'SEMANTIC_SEARCH_BACKEND', 'pgvector')
+    if backend not in SEARCH_BACKENDS:
+        return {'error': f'Unknown search backend: {backend}', 'queries': queries}
+
+    try:
+        top_k = bounded_top_k(top_k)
+    except (TypeError, ValueError):
+        return {'error': f'top_k must be an integer, got {top_k!r}', 'queries': queries}
+
+    try:
+        query_embeddings = embed_queries(queries)
+    except Exception as e:
+        return {'error': f'Failed to embed queries: {str(e)}', 'queries': queries}
+
+    try:
+        if backend == 'pgvector':
+            grouped = _search_pgvector_batch(query_embeddings, video_id, top_k)
+        else:
+            grouped = [SEARCH_BACKENDS[backend](embedding, video_id, top_k) for embedding in query_embeddings]
+
+        batch_results = []
+        for query, results in zip(queries, grouped):
+            _add_youtube_links(results)
+            batch_results.append({
+                'query': query,
+                'results_count': len(results),
+                'results': results
+            })
+
+        execution_time = (time.time() - start_time) * 1000  # milliseconds
+
+        return {
+            'backend': backend,
+            'queries_count': len(queries),
+            'execution_time_ms': execution_time,
+            'results': batch_results
+        }
+
+    except Exception as e:
+        return {'error': f'Search failed: {str(e)}', 'queries': queries}
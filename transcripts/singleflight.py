@@ -0,0 +1,89 @@
+"""Single-flight: concurrent calls with the same key share one upstream execution.
+
+The first caller for a key (the leader) runs the function; callers arriving
+while it is in flight wait and receive the same result (or exception).
+Nothing is cached once the call finishes - that is the caches' job. Results
+are shared between callers, so treat them as read-only.
+"""
+
+import asyncio
+import threading
+from typing import Any, Callable, Hashable
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Request coalescing for threads (``do``) and coroutines (``ado``)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}        # key -> _Call
+        self._tasks = {}        # (event loop, key) -> asyncio.Task
+        self._executed = 0
+        self._collapsed = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) unless an identical call is in flight; then wait for its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._executed += 1
+            else:
+                self._collapsed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, coro_fn: Callable, *args, **kwargs) -> Any:
+        """Async do(): await coro_fn(*args, **kwargs), shared with identical calls on the same event loop."""
+        # Tasks belong to one loop; under WSGI each async request may run its own loop
+        task_key = (asyncio.get_running_loop(), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = asyncio.ensure_future(coro_fn(*args, **kwargs))
+                self._tasks[task_key] = task
+                task.add_done_callback(lambda _: self._forget_task(task_key))
+                self._executed += 1
+            else:
+                self._collapsed += 1
+        # A cancelled waiter must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    def _forget_task(self, task_key) -> None:
+        with self._lock:
+            self._tasks.pop(task_key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = self._executed + self._collapsed
+            return {
+                'executed': self._executed,
+                'collapsed': self._collapsed,
+                'collapse_rate': self._collapsed / calls if calls else 0.0,
+                'in_flight': len(self._calls) + len(self._tasks),
+            }
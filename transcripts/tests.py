@@ -1,3 +1,1132 @@
-from django.test import TestCase
+import fcntl
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import TimeoutError
+from datetime import datetime
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from scripts.analyze_common_words import _boundary_ngrams, analyze_common_words, count_batch
+from scripts.transcript_download_db import replace_word_counts, word_count_deltas
+from . import async_views, memory, model_clients, rag_service, semantic_search, vector_index, views
+from .admission import AdmissionController, AdmissionRejected
+from .answer_cache import SemanticAnswerCache
+from .conversation_cache import ConversationContextCache
+from .documents import build_document, find_phrase
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_cache import QueryEmbeddingCache
+from .keyword_search import InvalidCursor, decode_cursor, encode_cursor
+from .models import Conversation, Message, TextChunks, Transcripts, Videos, VideoWordCounts, WordCounts
+from .rag_service import CHUNK_OVERHEAD_TOKENS, pack_context
+from .retrieval import collapse_adjacent, mmr_select
+from .search_cache import SearchResultCache
+from .singleflight import SingleFlight
+from .text_stats import ngrams, tokenize, word_counts_sql
+from .vector_index import NumpyVectorIndex, refresh_if_stale
+
+
+class QueryEmbeddingCacheTests(SimpleTestCase):
+
+    def test_hit_ignores_case_and_whitespace(self):
+        cache = QueryEmbeddingCache()
+        cache.set('What is  Backprop?', 'model', [1.0, 2.0])
+        self.assertEqual(cache.get('what is backprop?', 'model'), [1.0, 2.0])
+        self.assertIsNone(cache.get('what is backprop?', 'other-model'))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = QueryEmbeddingCache(max_size=2)
+        cache.set('a', 'model', [1.0])
+        cache.set('b', 'model', [2.0])
+        cache.get('a', 'model')
+        cache.set('c', 'model', [3.0])
+        self.assertIsNone(cache.get('b', 'model'))
+        self.assertEqual(cache.get('a', 'model'), [1.0])
+
+    def test_expired_entries_miss(self):
+        cache = QueryEmbeddingCache(ttl=0)
+        cache.set('a', 'model', [1.0])
+        self.assertIsNone(cache.get('a', 'model'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_clear(self):
+        cache = QueryEmbeddingCache()
+        cache.set('a', 'model', [1.0])
+        cache.clear()
+        self.assertIsNone(cache.get('a', 'model'))
+
+
+class InMemoryChunkIndex(NumpyVectorIndex):
+    """NumpyVectorIndex reading text_chunks from a dict instead of the database."""
+
+    def __init__(self, path):
+        super().__init__(path, dtype='float32', dimensions=2)
+        self.chunks = {}
+        self.generation = 0
+
+    def put(self, chunk_id, video_id, vector, version='v1'):
+        self.chunks[chunk_id] = (chunk_id, video_id, f'text of {chunk_id}', 1.0, 5.0, vector, 3, version)
+        self.generation += 1
+
+    def drop(self, chunk_id):
+        del self.chunks[chunk_id]
+        self.generation += 1
+
+    def _current_generation(self):
+        return self.generation
+
+    def _chunk_versions(self):
+        return [(row[0], row[-1]) for row in self.chunks.values()]
+
+    def _chunk_rows(self, ids=None):
+        return [self.chunks[chunk_id] for chunk_id in (self.chunks if ids is None else ids) if chunk_id in self.chunks]
+
+
+class NumpyVectorIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        self.index = InMemoryChunkIndex(self.path)
+        for number in range(10):
+            self.index.put(f'c{number}', 'v1' if number < 5 else 'v2', [float(number), 1.0])
+
+    def nearest(self, vector, top_k=1, video_id=None, index=None):
+        return [hit['id'] for hit in (index or self.index).search(vector, top_k=top_k, video_id=video_id)]
+
+    def test_refresh_appends_only_new_chunks(self):
+        self.assertEqual(self.index.refresh(), 10)
+        build_id = self.index._read_manifest()['build_id']
+        self.index.put('c10', 'v2', [20.0, 1.0])
+        self.assertEqual(self.index.refresh(), 1)
+        self.assertEqual(self.index._read_manifest()['build_id'], build_id)
+        self.assertEqual(self.nearest([19.0, 1.0]), ['c10'])
+        self.assertEqual(self.nearest([0.0, 1.0], top_k=3, video_id='v1'), ['c0', 'c1', 'c2'])
+        hit = self.index.search([3.0, 1.0], top_k=1)[0]
+        self.assertEqual((hit['text'], hit['video_id'], hit['token_count']), ('text of c3', 'v1', 3))
+        self.assertEqual(self.index.refresh(), 0)
+
+    def test_unpublished_rows_are_invisible_and_truncated(self):
+        self.index.refresh()
+        self.index.put('c10', 'v2', [20.0, 1.0])
+        # Crash after the rows were appended but before the manifest was replaced
+        with mock.patch.object(NumpyVectorIndex, '_write_manifest', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.index.refresh()
+        self.assertEqual(self.nearest([19.0, 1.0]), ['c9'])
+        self.assertEqual(self.index.refresh(), 1)
+        self.assertEqual(self.index._read_manifest()['count'], 11)
+        self.assertEqual(self.nearest([19.0, 1.0], top_k=2), ['c10', 'c9'])
+
+    def test_deleted_and_reembedded_chunks_are_tombstoned(self):
+        self.index.refresh()
+        build_id = self.index._read_manifest()['build_id']
+        self.index.drop('c9')
+        self.index.put('c0', 'v1', [30.0, 1.0], version='v2')
+        self.assertEqual(self.index.refresh(), 1)
+
+        manifest = self.index._read_manifest()
+        self.assertEqual((manifest['build_id'], manifest['count'], manifest['deleted']), (build_id, 11, 2))
+        self.assertEqual(self.nearest([30.0, 1.0], top_k=2), ['c0', 'c8'])
+        self.assertEqual(self.nearest([0.0, 1.0]), ['c1'])
+        self.assertEqual(self.nearest([9.0, 1.0], top_k=10, video_id='v2'), ['c8', 'c7', 'c6', 'c5'])
+        self.assertEqual(list(self.index.chunk_vectors(['c0', 'c9'])), ['c0'])
+        self.assertEqual(self.index.chunk_vectors(['c0'])['c0'][0].tolist(), [30.0, 1.0])
+
+    def test_many_tombstones_compact_into_a_new_build(self):
+        self.index.refresh()
+        first_build = self.index._read_manifest()['build_id']
+        for number in range(4):
+            self.index.drop(f'c{number}')
+        self.index.refresh()
+        manifest = self.index._read_manifest()
+        self.assertNotEqual(manifest['build_id'], first_build)
+        self.assertEqual((manifest['count'], manifest['deleted']), (6, 0))
+        self.assertEqual(manifest['previous_build_id'], first_build)
+        self.assertEqual(self.nearest([0.0, 1.0]), ['c4'])
+
+    def test_rebuild_keeps_files_for_readers_of_the_previous_build(self):
+        self.index.refresh()
+        reader = InMemoryChunkIndex(self.path)
+        self.assertEqual(self.nearest([2.0, 1.0], index=reader), ['c2'])
+        snapshot = reader._snapshot
+        first_build = snapshot.build_id
+
+        self.index.refresh(rebuild=True)
+        self.assertTrue(self.index._file('metadata', first_build).exists())
+        self.index.refresh(rebuild=True)
+        self.assertFalse(self.index._file('metadata', first_build).exists())
+
+        # A search that loaded the first build before it was removed can still read its rows
+        self.assertEqual(snapshot.metadata(2)['id'], 'c2')
+        self.assertEqual(self.nearest([2.0, 1.0], index=reader), ['c2'])
+        self.assertNotEqual(reader._snapshot.build_id, first_build)
+
+    def test_background_refresh_yields_to_a_running_writer(self):
+        self.index.refresh()
+        self.index.put('c10', 'v2', [20.0, 1.0])
+        with open(os.path.join(self.path, 'write.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self.assertIsNone(self.index.refresh(wait=False))
+        self.assertEqual(self.index.refresh(wait=False), 1)
+
+    def test_background_refresh_skips_scan_when_current(self):
+        self.index.refresh()
+        with mock.patch.object(InMemoryChunkIndex, '_chunk_versions') as versions:
+            self.assertEqual(self.index.refresh(wait=False), 0)
+        versions.assert_not_called()
+
+    def test_refresh_if_stale_refreshes_once_per_generation(self):
+        self.index.refresh()
+        self.index.put('c10', 'v2', [20.0, 1.0])
+        with mock.patch.object(vector_index, '_refresh_generation', None):
+            self.assertTrue(refresh_if_stale(self.index, self.index.generation))
+            vector_index._refresh_thread.join(5)
+            self.assertFalse(self.index.is_stale(self.index.generation))
+            self.assertFalse(refresh_if_stale(self.index, self.index.generation))
+        self.assertEqual(self.nearest([19.0, 1.0]), ['c10'])
+
+
+class HybridSqlShapeTests(SimpleTestCase):
+
+    def test_exact_video_scan_ranks_only_the_videos_rows(self):
+        sql = semantic_search._hybrid_sql('v1', exact_video_scan=True)
+        self.assertIn('video_chunks AS MATERIALIZED', sql)
+        self.assertIn('FROM video_chunks t', sql)
+        # The lexical side is still filtered to the video
+        self.assertIn('WHERE t.search_vector @@ q.tsquery AND t.video_id = %(video_id)s', sql)
+
+    def test_global_scan_filters_by_video_only_when_given(self):
+        sql = semantic_search._hybrid_sql(None, exact_video_scan=False)
+        self.assertNotIn('video_chunks', sql)
+        self.assertNotIn('%(video_id)s', sql)
+        self.assertIn('AND t.video_id = %(video_id)s', semantic_search._hybrid_sql('v1', exact_video_scan=False))
+
+    def test_placeholders(self):
+        sql = semantic_search._hybrid_sql('v1', exact_video_scan=True)
+        self.assertEqual(
+            set(re.findall(r'%\((\w+)\)s', sql)),
+            {'embedding', 'query', 'video_id', 'candidates', 'rrf_k', 'top_k'},
+        )
+
+
+class HybridSqlTests(TestCase):
+    """Reciprocal rank fusion over the real text_chunks table."""
+
+    def setUp(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('_hybrid_sql is PostgreSQL-only')
+        Videos.objects.create(video_id='v1')
+        Videos.objects.create(video_id='v2')
+        near = self.embedding(0)
+        near[1] = 0.1
+        chunks = [
+            ('a', 'v1', 'gradient descent', self.embedding(0)),
+            ('b', 'v1', 'gradient descent explained', self.embedding(1)),
+            ('c', 'v1', 'cooking with cast iron', near),
+            ('d', 'v2', 'gradient descent again', self.embedding(0)),
+        ]
+        for start, (chunk_id, video_id, text, embedding) in enumerate(chunks):
+            TextChunks.objects.create(
+                id=chunk_id, video_id=video_id, text=text, start_time_seconds=float(start),
+                embedding=embedding, status='embedded',
+            )
+
+    @staticmethod
+    def embedding(axis):
+        embedding = [0.0] * 768
+        embedding[axis] = 1.0
+        return embedding
+
+    def fuse(self, video_id, exact_video_scan):
+        params = {
+            'embedding': semantic_search._as_vector_param(self.embedding(0)),
+            'query': 'descent',
+            'video_id': video_id,
+            'candidates': 50,
+            'rrf_k': 60,
+            'top_k': 5,
+        }
+        with connection.cursor() as cursor:
+            return semantic_search._fetch_hybrid(cursor, semantic_search._hybrid_sql(video_id, exact_video_scan), params)
+
+    def test_chunks_found_by_both_retrievers_rank_first(self):
+        for exact_video_scan in (True, False):
+            results, vector_candidates = self.fuse('v1', exact_video_scan)
+            self.assertEqual([result['id'] for result in results], ['a', 'b', 'c'])
+            self.assertEqual(vector_candidates, 3)
+            self.assertEqual(results[0]['vector_rank'], 1)
+            self.assertIsNotNone(results[0]['lexical_rank'])
+            # Vector-only hit: no lexical rank, scored on the vector side alone
+            self.assertIsNone(results[2]['lexical_rank'])
+            self.assertAlmostEqual(float(results[2]['rrf_score']), 1 / 62)
+
+    def test_global_search_spans_videos(self):
+        results, vector_candidates = self.fuse(None, False)
+        self.assertEqual(vector_candidates, 4)
+        self.assertEqual({result['id'] for result in results}, {'a', 'b', 'c', 'd'})
+        self.assertEqual({result['id'] for result in results[:2]}, {'a', 'd'})
+
+
+class FakeCursor:
+    """Just enough of a DB-API cursor for _fetch_results."""
+
+    def __init__(self, columns, rows):
+        self.description = [(column,) for column in columns]
+        self.rows = rows
+
+    def execute(self, sql, params):
+        self.executed = (sql, params)
+
+    def fetchall(self):
+        return self.rows
+
+
+class SemanticSearchBatchTests(SimpleTestCase):
+
+    def test_batch_sql_binds_queries_in_order(self):
+        sql, params = semantic_search._batch_sql([[1.0], [2.0]], 'v1', 7, exact_video_scan=True)
+        self.assertEqual(sql.count('%s'), len(params))
+        self.assertEqual(params[0], 'v1')
+        self.assertEqual([params[1], params[3]], [0, 1])
+        self.assertEqual(params[-1], 7)
+        self.assertIn('FROM candidates t', sql)
+
+        sql, params = semantic_search._batch_sql([[1.0], [2.0]], 'v1', 7, exact_video_scan=False)
+        self.assertEqual(sql.count('%s'), len(params))
+        self.assertEqual([params[0], params[2]], [0, 1])
+        self.assertEqual(params[-2:], ['v1', 7])
+        self.assertNotIn('candidates', sql)
+
+        sql, params = semantic_search._batch_sql([[1.0]], None, 7, exact_video_scan=False)
+        self.assertEqual(sql.count('%s'), len(params))
+        self.assertNotIn('t.video_id = %s', sql)
+
+    def test_fetch_batch_groups_rows_by_query(self):
+        cursor = FakeCursor(['query_index', 'id', 'distance'], [
+            (1, 'b1', 0.2), (0, 'a1', 0.1), (1, 'b0', 0.1), (0, 'a2', 0.3),
+        ])
+        grouped = semantic_search._fetch_batch(cursor, 'sql', [], 3)
+        self.assertEqual([[result['id'] for result in group] for group in grouped], [['a1', 'a2'], ['b0', 'b1'], []])
+
+    @override_settings(SEARCH_MAX_TOP_K=10)
+    def test_results_pair_with_their_query_and_top_k_is_bounded(self):
+        def search(embeddings, video_id, top_k):
+            return [[{'id': f'hit-{embedding[0]:g}', 'start_time_seconds': 0.0}] for embedding in embeddings]
+
+        with mock.patch.object(semantic_search, 'embed_queries', return_value=[[1.0], [2.0]]), \
+                mock.patch.object(semantic_search, '_search_pgvector_batch', side_effect=search) as batch:
+            result = semantic_search.semantic_search_batch(['one', 'two'], top_k='500', backend='pgvector')
+        self.assertEqual(batch.call_args[0][2], 10)
+        self.assertEqual(
+            [(entry['query'], entry['results'][0]['id']) for entry in result['results']],
+            [('one', 'hit-1'), ('two', 'hit-2')],
+        )
+
+        result = semantic_search.semantic_search_batch(['one'], top_k='many', backend='pgvector')
+        self.assertIn('top_k', result['error'])
+
+    def test_view_rejects_non_integer_top_k(self):
+        request = mock.Mock(data={'queries': ['one'], 'top_k': 'many'})
+        response = views.SemanticSearchBatchAPIView().post(request)
+        self.assertEqual(response.status_code, 400)
+
+
+class BatchSqlTests(TestCase):
+    """_batch_sql against the real text_chunks table: every query gets its own neighbours."""
+
+    def setUp(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('_batch_sql is PostgreSQL-only')
+        Videos.objects.create(video_id='v1')
+        Videos.objects.create(video_id='v2')
+        for axis in range(4):
+            TextChunks.objects.create(
+                id=f'c{axis}', video_id='v1' if axis < 2 else 'v2', text=f'chunk {axis}',
+                start_time_seconds=float(axis), embedding=HybridSqlTests.embedding(axis), status='embedded',
+            )
+
+    def nearest(self, video_id, exact_video_scan):
+        embeddings = [HybridSqlTests.embedding(axis) for axis in (1, 0, 3)]
+        with connection.cursor() as cursor:
+            sql, params = semantic_search._batch_sql(embeddings, video_id, 1, exact_video_scan)
+            grouped = semantic_search._fetch_batch(cursor, sql, params, len(embeddings))
+        return [[result['id'] for result in group] for group in grouped]
+
+    def test_global_batch(self):
+        self.assertEqual(self.nearest(None, False), [['c1'], ['c0'], ['c3']])
+
+    def test_video_batch(self):
+        for exact_video_scan in (True, False):
+            nearest = self.nearest('v1', exact_video_scan)
+            self.assertEqual(nearest[:2], [['c1'], ['c0']])
+            self.assertEqual(len(nearest[2]), 1)
+            self.assertIn(nearest[2][0], {'c0', 'c1'})
+
+
+class SearchResultCacheKeyTests(SimpleTestCase):
+
+    def test_key_changes_with_corpus_version_and_filters(self):
+        key = SearchResultCache.make_key('q', [1.0, 2.0], None, 5, 'pgvector', 'vector', '1')
+        self.assertEqual(key, SearchResultCache.make_key('q', [1.0, 2.0], None, 5, 'pgvector', 'vector', '1'))
+        self.assertNotEqual(key, SearchResultCache.make_key('q', [1.0, 2.0], None, 5, 'pgvector', 'vector', '2'))
+        self.assertNotEqual(key, SearchResultCache.make_key('q', [1.0, 2.0], 'vid', 5, 'pgvector', 'vector', '1'))
+        self.assertNotEqual(key, SearchResultCache.make_key('q', [1.0, 2.0], None, 6, 'pgvector', 'vector', '1'))
+
+
+class PgvectorFallbackTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(semantic_search, '_iterative_scan_supported', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def database_error(message, pgcode):
+        # Django re-raises the driver's error with the original as __cause__
+        cause = Exception(message)
+        cause.pgcode = pgcode
+        error = DatabaseError(message)
+        error.__cause__ = cause
+        return error
+
+    def search_with_ann_error(self, error):
+        exact = [{'id': 'exact', 'similarity_score': 1.0}]
+        with mock.patch.object(semantic_search, '_ann_cursor', side_effect=error), \
+                mock.patch.object(semantic_search, '_search_exact', return_value=exact) as search_exact:
+            return semantic_search._search_pgvector([1.0], None, 1), search_exact
+
+    def test_rejected_iterative_scan_falls_back_to_exact_search(self):
+        error = self.database_error('invalid configuration parameter name "hnsw.iterative_scan"', '42602')
+        results, search_exact = self.search_with_ann_error(error)
+        self.assertEqual(results, [{'id': 'exact', 'similarity_score': 1.0}])
+        search_exact.assert_called_once_with([1.0], None, 1)
+        # Not retried for the rest of the process
+        self.assertFalse(semantic_search._use_iterative_scan())
+
+    def test_other_database_errors_propagate(self):
+        error = self.database_error('canceling statement due to statement timeout', '57014')
+        with self.assertRaises(DatabaseError):
+            self.search_with_ann_error(error)
+
+    def test_version_is_checked_once(self):
+        with mock.patch.object(semantic_search, 'connection') as database:
+            cursor = database.cursor.return_value.__enter__.return_value
+            cursor.fetchone.return_value = ('0.7.4',)
+            self.assertFalse(semantic_search._use_iterative_scan())
+            self.assertFalse(semantic_search._use_iterative_scan())
+            database.cursor.assert_called_once()
+
+            semantic_search._iterative_scan_supported = None
+            cursor.fetchone.return_value = ('0.8.0',)
+            self.assertTrue(semantic_search._use_iterative_scan())
+        with override_settings(PGVECTOR_ITERATIVE_SCAN=False):
+            self.assertFalse(semantic_search._use_iterative_scan())
+
+
+def _chunk(chunk_id, video_id, start, duration, text, score, token_count=None, embedding=None):
+    return {
+        'id': chunk_id, 'video_id': video_id, 'start_time_seconds': start, 'duration': duration,
+        'text': text, 'similarity_score': score, 'token_count': token_count, 'embedding': embedding,
+    }
+
+
+class RetrievalTests(SimpleTestCase):
+
+    def test_mmr_skips_near_duplicates(self):
+        candidates = [
+            _chunk(1, 'v', 0, 1, 'a', 0.9, embedding=[1.0, 0.0]),
+            _chunk(2, 'v', 10, 1, 'b', 0.9, embedding=[0.99, 0.01]),
+            _chunk(3, 'v', 20, 1, 'c', 0.7, embedding=[0.6, 0.8]),
+        ]
+        selected = mmr_select([1.0, 0.0], candidates, top_k=2, mmr_lambda=0.3)
+        self.assertEqual([chunk['id'] for chunk in selected], [1, 3])
+
+    def test_mmr_pure_relevance(self):
+        candidates = [
+            _chunk(1, 'v', 0, 1, 'a', 0.9, embedding=[1.0, 0.0]),
+            _chunk(2, 'v', 10, 1, 'b', 0.9, embedding=[0.99, 0.01]),
+            _chunk(3, 'v', 20, 1, 'c', 0.7, embedding=[0.6, 0.8]),
+        ]
+        selected = mmr_select(np.array([1.0, 0.0]), candidates, top_k=2, mmr_lambda=1.0)
+        self.assertEqual([chunk['id'] for chunk in selected], [1, 2])
+
+    def test_collapse_stitches_adjacent_chunks(self):
+        chunks = [
+            _chunk(2, 'v', 10, 10, 'four five six seven', 0.8, token_count=4),
+            _chunk(1, 'v', 0, 10, 'one two three four five', 0.9, token_count=5),
+            _chunk(3, 'v', 100, 10, 'far away', 0.5, token_count=2),
+            _chunk(4, 'w', 0, 10, 'other video', 0.7, token_count=2),
+        ]
+        merged = collapse_adjacent(chunks)
+        self.assertEqual([chunk['id'] for chunk in merged], [1, 3, 4])
+        first = merged[0]
+        self.assertEqual(first['text'], 'one two three four five six seven')
+        self.assertEqual(first['merged_chunk_ids'], [1, 2])
+        self.assertEqual(first['duration'], 20)
+        self.assertEqual(first['similarity_score'], 0.9)
+
+    def test_collapse_sums_token_counts(self):
+        chunks = [
+            _chunk(1, 'v', 0, 10, 'one two', 0.9, token_count=5),
+            _chunk(2, 'v', 10, 10, 'three four', 0.8, token_count=4),
+            _chunk(3, 'w', 0, 10, 'five', 0.7, token_count=2),
+            _chunk(4, 'w', 10, 10, 'six', 0.6),
+        ]
+        merged = collapse_adjacent(chunks)
+        self.assertEqual(merged[0]['token_count'], 9)
+        # Unknown counts stay unknown so pack_context counts the merged text itself
+        self.assertIsNone(merged[1]['token_count'])
+
+
+class TopKValidationTests(SimpleTestCase):
+
+    def test_non_integer_top_k_is_a_bad_request(self):
+        bodies = {
+            '/api/semantic_search/': {'query': 'gradients'},
+            '/api/async/semantic_search/': {'query': 'gradients'},
+            '/api/chat/': {'question': 'What is a gradient?', 'conversation_id': 'c1'},
+            '/api/async/chat/': {'question': 'What is a gradient?', 'conversation_id': 'c1'},
+        }
+        for url, body in bodies.items():
+            for top_k in ('many', 2.5, [3]):
+                with self.subTest(url=url, top_k=top_k):
+                    response = self.client.post(url, dict(body, top_k=top_k), content_type='application/json')
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('top_k', response.json()['error'])
+
+    @override_settings(SEARCH_MAX_TOP_K=20)
+    def test_top_k_is_clamped(self):
+        self.assertEqual(views.parse_top_k('500', 5), 20)
+        self.assertEqual(views.parse_top_k(0, 5), 1)
+        self.assertEqual(views.parse_top_k(None, 5), 5)
+        self.assertEqual(views.parse_top_k('7', 5), 7)
+
+    def test_search_reports_bad_top_k_instead_of_raising(self):
+        result = semantic_search._search_with_embedding(
+            'q', [1.0], None, 'many', 'pgvector', 'vector', False, None, None, time.time()
+        )
+        self.assertIn('top_k', result['error'])
+
+
+class FakeChatStream:
+    """Streamed chat completion: one delta per text, remembers whether it was closed."""
+
+    def __init__(self, texts):
+        self.events = [mock.Mock(choices=[mock.Mock(delta=mock.Mock(content=text))]) for text in texts]
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncChatStream(FakeChatStream):
+
+    async def __aiter__(self):
+        for event in self.events:
+            yield event
+
+    async def close(self):
+        self.closed = True
+
+
+class StreamAnswerTests(SimpleTestCase):
+    chunks = [_chunk('a', 'v1', 0.0, 5.0, 'Gradients point uphill.', 0.9, token_count=5)]
+
+    def setUp(self):
+        for name, value in (('retrieve_chunks', (self.chunks, None)), ('_answer_cache_lookup', (None, None))):
+            patcher = mock.patch.object(rag_service, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def stream_answer(self, stream):
+        with mock.patch.object(rag_service, 'get_client') as get_client:
+            get_client.return_value.chat.completions.create.return_value = stream
+            yield from rag_service.stream_answer('What is a gradient?')
+
+    def test_events_in_order_and_stream_closed(self):
+        stream = FakeChatStream(['Gradients ', 'point uphill.'])
+        events = list(self.stream_answer(stream))
+        self.assertEqual([event for event, _ in events], ['sources', 'token', 'token', 'done'])
+        self.assertEqual(events[-1][1]['answer'], 'Gradients point uphill.')
+        self.assertTrue(stream.closed)
+
+    def test_client_disconnect_closes_the_upstream_stream(self):
+        stream = FakeChatStream(['Gradients ', 'point uphill.'])
+        events = self.stream_answer(stream)
+        self.assertEqual(next(events)[0], 'sources')
+        self.assertEqual(next(events)[0], 'token')
+        events.close()
+        self.assertTrue(stream.closed)
+
+    async def test_async_events_in_order_and_stream_closed(self):
+        stream = FakeAsyncChatStream(['Gradients ', 'point uphill.'])
+        with mock.patch.object(rag_service, 'aretrieve_chunks', mock.AsyncMock(return_value=(self.chunks, None))), \
+                mock.patch.object(rag_service, 'get_async_client') as get_async_client:
+            get_async_client.return_value.chat.completions.create = mock.AsyncMock(return_value=stream)
+            events = [event async for event, _ in rag_service.astream_answer('What is a gradient?')]
+        self.assertEqual(events, ['sources', 'token', 'token', 'done'])
+        self.assertTrue(stream.closed)
+
+
+class SseStreamTests(SimpleTestCase):
+    conversation = mock.Mock(id=1)
+    events = [('sources', {'sources': []}), ('token', {'text': 'Hi'}), ('done', {'answer': 'Hi'})]
+
+    def test_turn_is_saved_after_done_is_sent(self):
+        with mock.patch.object(views, 'save_turn') as save_turn:
+            frames = views.ChatAPIView._sse_stream(iter(self.events), self.conversation, 'Q?')
+            sent = []
+            for frame in frames:
+                sent.append(frame.split('\n')[0])
+                if frame.startswith('event: done'):
+                    save_turn.assert_not_called()
+        self.assertEqual(sent, ['event: sources', 'event: token', 'event: done'])
+        save_turn.assert_called_once_with(self.conversation, 'Q?', 'Hi')
+
+    def test_errors_save_the_question_unless_shed(self):
+        with mock.patch.object(views, 'save_turn') as save_turn:
+            list(views.ChatAPIView._sse_stream(iter([('error', {'error': 'x'})]), self.conversation, 'Q?'))
+            save_turn.assert_called_once_with(self.conversation, 'Q?')
+            save_turn.reset_mock()
+            shed = [('error', {'error': 'busy', 'retry_after': 3})]
+            list(views.ChatAPIView._sse_stream(iter(shed), self.conversation, 'Q?'))
+            save_turn.assert_not_called()
+
+    async def test_async_turn_is_saved_after_done_is_sent(self):
+        async def events():
+            for event in self.events:
+                yield event
+
+        with mock.patch.object(async_views, 'asave_turn', mock.AsyncMock()) as asave_turn:
+            sent = []
+            async for frame in async_views._sse_stream(events(), self.conversation, 'Q?'):
+                sent.append(frame.split('\n')[0])
+                if frame.startswith('event: done'):
+                    asave_turn.assert_not_awaited()
+        self.assertEqual(sent, ['event: sources', 'event: token', 'event: done'])
+        asave_turn.assert_awaited_once_with(self.conversation, 'Q?', 'Hi')
+
+
+class SemanticAnswerCacheTests(SimpleTestCase):
+
+    def test_similar_question_over_same_chunks_hits(self):
+        cache = SemanticAnswerCache(similarity_threshold=0.95)
+        cache.set([1.0, 0.0], ['c1', 'c2'], 'model', 1, {'answer': 'yes'})
+        result = cache.get([0.99, 0.05], ['c2', 'c1'], 'model', 1)
+        self.assertEqual(result['answer'], 'yes')
+        self.assertGreaterEqual(result['cache_similarity'], 0.95)
+
+    def test_misses_on_other_chunks_model_or_question(self):
+        cache = SemanticAnswerCache(similarity_threshold=0.95)
+        cache.set([1.0, 0.0], ['c1'], 'model', 1, {'answer': 'yes'})
+        self.assertIsNone(cache.get([1.0, 0.0], ['c1', 'c2'], 'model', 1))
+        self.assertIsNone(cache.get([1.0, 0.0], ['c1'], 'other-model', 1))
+        self.assertIsNone(cache.get([0.0, 1.0], ['c1'], 'model', 1))
+
+    def test_changed_evidence_invalidates(self):
+        cache = SemanticAnswerCache()
+        cache.set([1.0, 0.0], ['c1'], 'model', 1, {'answer': 'yes'})
+        self.assertIsNone(cache.get([1.0, 0.0], ['c1'], 'model', 2))
+        # Stale entries are dropped, not just skipped
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_lookup_is_keyed_on_the_cited_chunks_stamps(self):
+        stamps = {'v1_chunk_0_0': datetime(2026, 1, 1), 'v2_chunk_0_0': datetime(2026, 1, 1)}
+
+        def lookup():
+            chunks = [{'id': 'v1_chunk_0_0'}, {'id': 'v1_chunk_1_5', 'merged_chunk_ids': ['v2_chunk_0_0']}]
+            with mock.patch.object(rag_service, 'embed_query', return_value=[1.0, 0.0]), \
+                    mock.patch.object(rag_service.TextChunks.objects, 'filter') as chunk_filter:
+                chunk_filter.return_value.values_list.return_value = list(stamps.items())
+                return rag_service._answer_cache_lookup('Q?', chunks)
+
+        with mock.patch.object(rag_service, 'answer_cache', SemanticAnswerCache()) as cache:
+            cache_key, cached = lookup()
+            self.assertIsNone(cached)
+            cache.set(*cache_key, {'answer': 'yes'})
+            # No corpus generation involved: other videos can be ingested meanwhile
+            self.assertEqual(lookup()[1]['answer'], 'yes')
+            # The second video was re-chunked
+            stamps['v2_chunk_0_0'] = datetime(2026, 2, 1)
+            self.assertIsNone(lookup()[1])
+            # A cited chunk was deleted
+            del stamps['v2_chunk_0_0']
+            self.assertIsNone(lookup()[1])
+
+    def test_size_bound(self):
+        cache = SemanticAnswerCache(max_entries=2)
+        for index in range(3):
+            cache.set([1.0, float(index)], [f'c{index}'], 'model', 1, {'answer': index})
+        self.assertEqual(cache.stats()['size'], 2)
+        self.assertIsNone(cache.get([1.0, 0.0], ['c0'], 'model', 1))
+
+
+class RequestParsingTests(SimpleTestCase):
+
+    def test_chat_defaults(self):
+        params, error = views.parse_chat_request({'question': ' Why? ', 'conversation_id': 'c1'})
+        self.assertIsNone(error)
+        self.assertEqual((params['question'], params['top_k'], params['stream']), ('Why?', 3, False))
+        self.assertIsNone(params['diversify'])
+
+    def test_sync_and_async_views_reject_the_same_bodies(self):
+        bodies = [
+            ('/api/semantic_search/', {'query': 123, 'backend': 'faiss'}),
+            ('/api/semantic_search/', {'query': 'q', 'diversify': 'maybe'}),
+            ('/api/chat/', {'question': 'Why?'}),
+            ('/api/chat/', {'question': 'Why?', 'conversation_id': 'c1', 'memory': 'forever'}),
+            ('/api/chat/', {'question': 'Why?', 'conversation_id': 'c1', 'stream': 'sometimes'}),
+        ]
+        for url, body in bodies:
+            with self.subTest(url=url, body=body):
+                sync = self.client.post(url, body, content_type='application/json')
+                asynchronous = self.client.post(url.replace('/api/', '/api/async/'), body,
+                                                content_type='application/json')
+                self.assertEqual((sync.status_code, asynchronous.status_code), (400, 400))
+                self.assertEqual(sync.json(), asynchronous.json())
+
+
+class AsyncModelClientTests(SimpleTestCase):
+
+    async def test_close_drops_the_loops_client(self):
+        client = model_clients.get_async_client()
+        self.assertIs(model_clients.get_async_client(), client)
+        with mock.patch.object(client, 'close', mock.AsyncMock()) as close:
+            await model_clients.aclose_async_client()
+        close.assert_awaited_once()
+        self.assertIsNot(model_clients.get_async_client(), client)
+        await model_clients.aclose_async_client()
+
+    def test_wsgi_requests_close_the_client(self):
+        # The test client is a WSGI handler: each async view call runs on its own loop
+        with mock.patch.object(async_views, 'aclose_async_client', mock.AsyncMock()) as aclose:
+            self.client.post('/api/async/semantic_search/', {}, content_type='application/json')
+        aclose.assert_awaited_once()
+
+
+class PackContextTests(SimpleTestCase):
+    question = 'What is backpropagation?'
+
+    def base_tokens(self, **kwargs):
+        return pack_context(self.question, [], **kwargs)[2]
+
+    def test_lowest_ranked_chunks_dropped_first(self):
+        chunks = [_chunk(index, 'v', index, 1, 'text', 0.9, token_count=100) for index in range(3)]
+        budget = self.base_tokens() + 2 * (100 + CHUNK_OVERHEAD_TOKENS)
+        with override_settings(RAG_PROMPT_TOKEN_BUDGET=budget):
+            packed, _, used = pack_context(self.question, chunks)
+        self.assertEqual([chunk['id'] for chunk in packed], [0, 1])
+        self.assertEqual(used, budget)
+
+    def test_best_chunk_always_kept(self):
+        chunks = [_chunk(0, 'v', 0, 1, 'text', 0.9, token_count=10000)]
+        with override_settings(RAG_PROMPT_TOKEN_BUDGET=1):
+            packed, _, _ = pack_context(self.question, chunks)
+        self.assertEqual(len(packed), 1)
+
+    def test_history_keeps_newest_messages_within_budget(self):
+        history = [{'role': 'user', 'content': f'message {index} ' * 20} for index in range(4)]
+        newest_two = self.base_tokens(conversation_history=history[2:]) - self.base_tokens()
+        with override_settings(RAG_HISTORY_TOKEN_BUDGET=newest_two):
+            _, packed_history, _ = pack_context(self.question, [], history)
+        self.assertEqual(packed_history, history[2:])
+
+
+@override_settings(CONVERSATION_SUMMARY_KEEP_MESSAGES=4, CONVERSATION_SUMMARY_TRIGGER_MESSAGES=8)
+class SummarizeConversationTests(TestCase):
+
+    def setUp(self):
+        self.conversation = Conversation.objects.create(session_id='summary-test')
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, role=role, content=f'{role} {turn}')
+            for turn in range(5) for role in ('user', 'assistant')
+        ]
+        patcher = mock.patch.object(memory, 'conversation_cache', ConversationContextCache(enabled=False))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def summarize(self, summary='Folded summary'):
+        with mock.patch.object(memory, 'get_client') as get_client:
+            create = get_client.return_value.chat.completions.create
+            create.return_value.choices = [mock.Mock(message=mock.Mock(content=summary))]
+            return memory.summarize_conversation(self.conversation.id), create
+
+    def test_folds_all_but_the_newest_messages(self):
+        updated, create = self.summarize()
+        self.assertTrue(updated)
+        prompt = create.call_args.kwargs['messages'][1]['content']
+        self.assertIn('user 0', prompt)
+        self.assertIn('assistant 2', prompt)
+        self.assertNotIn('user 3', prompt)
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, 'Folded summary')
+        self.assertEqual(self.conversation.summarized_until_id, self.messages[5].id)
+
+        # Folded turns are replaced by the summary in the prompt history
+        history, summary = memory.load_history(self.conversation, 'next?', 'summary')
+        self.assertEqual(summary, 'Folded summary')
+        self.assertEqual([message['content'] for message in history],
+                         ['user 3', 'assistant 3', 'user 4', 'assistant 4', 'next?'])
+
+    def test_waits_for_enough_new_messages(self):
+        self.summarize()
+        updated, create = self.summarize('Second summary')
+        self.assertFalse(updated)
+        create.assert_not_called()
+
+    def test_empty_model_reply_keeps_the_old_summary(self):
+        updated, _ = self.summarize('  ')
+        self.assertFalse(updated)
+        self.conversation.refresh_from_db()
+        self.assertEqual((self.conversation.summary, self.conversation.summarized_until_id), ('', 0))
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def work():
+            calls.append(1)
+            release.wait(5)
+            return 'result'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('key', work))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while flight.stats()['collapsed'] < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['result'] * 5)
+        self.assertEqual(flight.stats()['in_flight'], 0)
+
+    def test_error_is_shared_and_not_cached(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise RuntimeError('upstream down')
+
+        with self.assertRaises(RuntimeError):
+            flight.do('key', fail)
+        self.assertEqual(flight.do('key', lambda: 'ok'), 'ok')
+
+
+class EmbeddingBatcherTests(SimpleTestCase):
+
+    def test_concurrent_texts_are_batched_in_order(self):
+        batches = []
+
+        def embed(texts):
+            batches.append(list(texts))
+            return [[float(len(text))] for text in texts]
+
+        batcher = EmbeddingBatcher(embed, max_batch_size=8, max_wait=0.05, max_concurrent_batches=1)
+        futures = [batcher.submit('x' * length) for length in range(1, 6)]
+        self.assertEqual([future.result(5) for future in futures], [[1.0], [2.0], [3.0], [4.0], [5.0]])
+        self.assertLess(len(batches), 5)
+
+    def test_length_mismatch_fails_every_caller(self):
+        batcher = EmbeddingBatcher(lambda texts: [[0.0]], max_wait=0.05, max_concurrent_batches=1)
+        futures = [batcher.submit(text) for text in ('a', 'b')]
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result(5)
+
+    def test_upstream_error_reaches_caller(self):
+        def embed(texts):
+            raise ConnectionError('embedding server down')
+
+        batcher = EmbeddingBatcher(embed)
+        with self.assertRaises(ConnectionError):
+            batcher.embed('a')
+
+    def test_embed_times_out(self):
+        release = threading.Event()
+
+        def embed(texts):
+            release.wait(5)
+            return [[0.0] for _ in texts]
+
+        batcher = EmbeddingBatcher(embed, timeout=0.05)
+        try:
+            with self.assertRaises(TimeoutError):
+                batcher.embed('a')
+        finally:
+            release.set()
+
+
+class AdmissionControllerTests(SimpleTestCase):
+
+    def test_full_queue_is_rejected_with_retry_after(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=0)
+        with controller.slot():
+            self.assertIsNotNone(controller.overloaded())
+            with self.assertRaises(AdmissionRejected) as rejected:
+                with controller.slot():
+                    pass
+        self.assertGreaterEqual(rejected.exception.retry_after, 1)
+
+    def test_queued_request_times_out(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=1)
+        with controller.slot():
+            with self.assertRaises(AdmissionRejected):
+                with controller.slot(timeout=0.01):
+                    pass
+        self.assertEqual(controller.stats()['rejected_timeout'], 1)
+        self.assertEqual(controller.stats()['queued'], 0)
+
+    def test_released_slot_goes_to_waiter(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=1)
+        entered = threading.Event()
+
+        def waiter():
+            with controller.slot(timeout=5):
+                entered.set()
+
+        with controller.slot():
+            thread = threading.Thread(target=waiter)
+            thread.start()
+            while controller.stats()['queued'] == 0:
+                time.sleep(0.01)
+        thread.join(5)
+        self.assertTrue(entered.is_set())
+        self.assertEqual(controller.stats()['active'], 0)
+
+
+class ChatOverloadedTests(SimpleTestCase):
+    body = {'question': 'What is backpropagation?', 'conversation_id': 'c1'}
+
+    def test_overloaded_response_sets_retry_after(self):
+        response = views._overloaded_response({'error': 'busy', 'retry_after': 4})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '4')
+
+    def test_chat_sheds_before_touching_the_database(self):
+        # SimpleTestCase fails any query, so this also checks no transaction is opened first
+        with mock.patch('transcripts.views.llm_admission.overloaded', return_value=7):
+            response = self.client.post('/api/chat/', self.body, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+
+    def test_async_chat_sheds_with_503_and_retry_after(self):
+        with mock.patch('transcripts.async_views.llm_admission.overloaded', return_value=7):
+            response = self.client.post('/api/async/chat/', self.body, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+
+
+class SaveTurnTests(TestCase):
+
+    def setUp(self):
+        self.conversation = Conversation.objects.create(session_id='save-turn-test')
+
+    def inserts(self, queries):
+        return [query['sql'] for query in queries if query['sql'].startswith('INSERT')]
+
+    def test_question_and_answer_in_one_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            memory.save_turn(self.conversation, 'Why?', 'Because.')
+        self.assertEqual(len(self.inserts(queries.captured_queries)), 1)
+        self.assertEqual(
+            list(self.conversation.messages.order_by('id').values_list('role', 'content')),
+            [('user', 'Why?'), ('assistant', 'Because.')],
+        )
+
+    def test_failed_generation_saves_only_the_question(self):
+        with CaptureQueriesContext(connection) as queries:
+            memory.save_turn(self.conversation, 'Why?')
+        self.assertEqual(len(self.inserts(queries.captured_queries)), 1)
+        self.assertEqual(list(self.conversation.messages.values_list('role', flat=True)), ['user'])
+
+    def test_bumps_updated_at(self):
+        before = self.conversation.updated_at
+        memory.save_turn(self.conversation, 'Why?', 'Because.')
+        self.conversation.refresh_from_db()
+        self.assertGreater(self.conversation.updated_at, before)
+
+
+class ConversationContextCacheTests(SimpleTestCase):
+
+    def test_history_is_invalidated_when_updated_at_changes(self):
+        cache = ConversationContextCache(cache_alias='default')
+        conversation = mock.Mock(session_id='history-cache-test', updated_at=datetime(2026, 1, 1))
+        cache.set_history(conversation, [(1, 'user', 'Why?')])
+        self.assertEqual(cache.get_history(conversation), [(1, 'user', 'Why?')])
+        # Another worker saved a turn
+        conversation.updated_at = datetime(2026, 1, 1, 0, 0, 1)
+        self.assertIsNone(cache.get_history(conversation))
+        self.assertEqual((cache.stats()['history_hits'], cache.stats()['history_misses']), (1, 1))
+
+    def test_deleted_chunks_are_skipped(self):
+        chunks = [
+            {'id': 'v1_chunk_0_0'},
+            {'id': 'v2_chunk_0_0'},
+            {'id': 'v1_chunk_1_5', 'merged_chunk_ids': ['v1_chunk_1_5', 'v3_chunk_0_0']},
+        ]
+        stored = {'v1_chunk_0_0': [1.0, 0.0], 'v1_chunk_1_5': [0.0, 1.0]}
+        with mock.patch.object(rag_service.TextChunks.objects, 'filter') as chunk_filter:
+            chunk_filter.return_value.values_list.return_value = list(stored.items())
+            kept, embeddings = rag_service._chunk_embeddings(chunks)
+        self.assertEqual([chunk['id'] for chunk in kept], ['v1_chunk_0_0', 'v1_chunk_1_5'])
+        np.testing.assert_array_equal(embeddings[1], [0.0, 1.0])
+
+
+class KeywordCursorTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        values = ['video', 12.5, 42, 0.375]
+        self.assertEqual(decode_cursor(encode_cursor(values)), values)
+
+    def test_garbage_is_invalid(self):
+        for cursor in ('not a cursor', '!!!', encode_cursor([1])[:-3] + '%%%'):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+
+class PhraseSearchTests(SimpleTestCase):
+
+    def test_phrase_across_snippets_maps_to_first_snippet(self):
+        text, offsets, start_times = build_document([
+            ('gradient', 1.0), ('descent is\nan', 2.0), ('', 2.5), ('optimizer  Gradient', 3.0), ('Descent', 4.0),
+        ])
+        self.assertEqual(text, 'gradient descent is an optimizer Gradient Descent')
+        hits, total = find_phrase(text, offsets, start_times, 'gradient   descent')
+        self.assertEqual(total, 2)
+        self.assertEqual([(hit['start_time'], hit['snippets']) for hit in hits], [(1.0, 2), (3.0, 2)])
+
+    def test_limit_keeps_total(self):
+        text, offsets, start_times = build_document([('go go go', 0.0)])
+        hits, total = find_phrase(text, offsets, start_times, 'go', limit=1)
+        self.assertEqual((len(hits), total), (1, 3))
+
+
+class WordCountDeltaTests(SimpleTestCase):
+
+    def test_replacing_a_videos_counts(self):
+        old = {'neural': 3, 'gradient': 1, 'network': 2}
+        new = Counter({'neural': 5, 'attention': 2, 'network': 2})
+        self.assertEqual(word_count_deltas(old, new), [('attention', 2), ('gradient', -1), ('neural', 2)])
+
+    def test_no_change(self):
+        self.assertEqual(word_count_deltas({'neural': 3}, Counter({'neural': 3})), [])
+
+
+class ReplaceWordCountsTests(TestCase):
+
+    def setUp(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('replace_word_counts is PostgreSQL-only')
+        for video_id, counts in {'v1': {'neural': 3, 'gradient': 1, 'drifted': 2}, 'v2': {'neural': 2}}.items():
+            Videos.objects.create(video_id=video_id)
+            for word, count in counts.items():
+                VideoWordCounts.objects.create(video_id=video_id, word=word, count=count)
+        # 'drifted' is one short of its per-video sum
+        for word, count in {'neural': 5, 'gradient': 1, 'drifted': 1}.items():
+            WordCounts.objects.create(word=word, count=count)
+
+    def test_replaces_the_videos_counts_and_applies_the_difference(self):
+        with connection.cursor() as cursor:
+            replace_word_counts(cursor, 'v1', Counter({'neural': 1, 'attention': 2}))
+        self.assertEqual(
+            dict(VideoWordCounts.objects.filter(video_id='v1').values_list('word', 'count')),
+            {'neural': 1, 'attention': 2},
+        )
+        # gradient drops to zero and drifted below zero: both are removed
+        self.assertEqual(dict(WordCounts.objects.values_list('word', 'count')), {'neural': 3, 'attention': 2})
+
+
+class CountBatchTests(SimpleTestCase):
+    rows = [
+        ('v1', 'Neural networks learn'),
+        ('v1', 'gradients quickly'),
+        ('v2', 'Transformers attention'),
+    ]
+
+    def test_ngrams_span_snippets_but_not_videos(self):
+        counter, edges = count_batch(self.rows, ngram=2)
+        self.assertEqual(counter['learn gradients'], 1)
+        self.assertEqual(counter['gradients transformers'], 0)
+        self.assertEqual(edges, ('v1', ['neural'], 'v2', ['attention']))
+
+    def test_split_batches_match_one_batch(self):
+        whole, _ = count_batch(self.rows, ngram=2)
+        first, (_, _, last_video, tail) = count_batch(self.rows[:1], ngram=2)
+        second, (first_video, head, _, _) = count_batch(self.rows[1:], ngram=2)
+        merged = first + second
+        if last_video == first_video:
+            merged.update(_boundary_ngrams(tail, head, 2))
+        self.assertEqual(merged, whole)
+
+    def test_boundary_ngrams(self):
+        self.assertEqual(_boundary_ngrams(['a', 'b'], ['c', 'd'], 3), ['a b c', 'b c d'])
+        self.assertEqual(_boundary_ngrams([], ['c'], 2), [])
+
+    def test_in_memory_ties_by_term(self):
+        # Counter.most_common would keep first-seen order: zebra before apple
+        self.assertEqual(
+            analyze_common_words(['zebra apple', 'mango apple zebra'], 2),
+            [('apple', 2), ('zebra', 2)],
+        )
+
+
+class WordCountsSqlParityTests(TestCase):
+    """word_counts_sql must count exactly what the Python tokenizer counts."""
+
+    texts = [
+        ('v1', 0.0, "Neural networks, neural NETWORKS and backpropagation!"),
+        ('v1', 1.0, "Backpropagation computes gradients; it's gradients all the way"),
+        ('v1', 2.0, "neural networks again"),
+        ('v2', 0.0, "Attention is all you need: attention attention"),
+    ]
+
+    def setUp(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('word_counts_sql is PostgreSQL-only')
+        for video_id in {video_id for video_id, _, _ in self.texts}:
+            Videos.objects.create(video_id=video_id)
+        for video_id, start_time, text in self.texts:
+            Transcripts.objects.create(video_id=video_id, start_time=start_time, text=text)
+
+    def expected(self, ngram, video_id=None):
+        counts = Counter()
+        for vid in sorted({vid for vid, _, _ in self.texts if video_id in (None, vid)}):
+            tokens = [token for each, _, text in self.texts if each == vid for token in tokenize(text)]
+            counts.update(ngrams(tokens, ngram))
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+    def fetch(self, ngram, video_id=None):
+        with connection.cursor() as cursor:
+            cursor.execute(*word_counts_sql(100, ngram, video_id))
+            return [(term, count) for term, count in cursor.fetchall()]
+
+    def test_words(self):
+        self.assertEqual(self.fetch(1), self.expected(1))
+
+    def test_words_of_one_video(self):
+        self.assertEqual(self.fetch(1, 'v2'), self.expected(1, 'v2'))
+
+    def test_bigrams(self):
+        self.assertEqual(self.fetch(2), self.expected(2))
@@ -0,0 +1,108 @@
+"""Word tokenization for transcript word-frequency statistics.
+
+Shared by the ingest script (which updates the word_counts tables), the
+build_word_counts backfill command and scripts/analyze_common_words.py, so
+every count uses the same rules. word_counts_sql applies the same rules inside
+PostgreSQL. Kept free of Django imports.
+"""
+
+import re
+from collections import Counter
+from typing import Iterable, List, Tuple
+
+STOP_WORDS = set([
+    'the', 'a', 'an', 'is', 'it', 'he', 'she', 'we', 'they', 'you', 'i',
+    'to', 'of', 'and', 'in', 'on', 'at', 'for', 'with', 'about', 'as',
+    'by', 'or', 'so', 'if', 'but', 'not', 'what', 'where', 'when', 'why',
+    'how', 'this', 'that', 'these', 'those', 'just', 'like', 'get', 'up',
+    'down', 'out', 'be', 'been', 'have', 'had', 'do', 'does', 'did', 'will',
+    'would', 'can', 'could', 'one', 'two', 'three', 'four', 'five', 'time',
+    'know', 'all', 'from', 'really', 'very', 'gonna', 'wanna', 'yeah', 'okay',
+    'it\'s', 'i\'m', 'you\'re', 'that\'s', 'we\'re', 'they\'re', 'don\'t', 'we', 'um',
+    'yeah', 'right', 'so', 'going', 'me', 'some', 'lot', 'a lot', 'way',
+    'little', 'back', 'make', 'want', 'think', 'see', 'good', 'now', 'here', 'then', 'our',
+    'because', 'which', 'well', 'its', 'are'
+])
+
+# Words this short are never counted
+MIN_WORD_LENGTH = 3
+
+_NON_LETTERS = re.compile(r"[^a-z\s]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, strip everything but letters and whitespace, drop short words and stop words."""
+    words = _NON_LETTERS.sub("", text.lower()).split()
+    return [word for word in words if len(word) >= MIN_WORD_LENGTH and word not in STOP_WORDS]
+
+
+def ngrams(tokens: List[str], n: int = 1) -> List[str]:
+    """Space-joined runs of n consecutive tokens (the tokens themselves for n=1)."""
+    if n == 1:
+        return tokens
+    return [' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+
+
+def count_words(texts: Iterable[str]) -> Counter:
+    counter = Counter()
+    for text in texts:
+        counter.update(tokenize(text))
+    return counter
+
+
+# Same steps as tokenize(): lowercase, keep letters and whitespace, split on whitespace.
+# Results match the Python path for ASCII text; PostgreSQL's lower() and [[:space:]]
+# follow the database locale for other characters.
+_SQL_WORDS = r"regexp_split_to_table(regexp_replace(lower(t.text), '[^a-z\s]', '', 'g'), '\s+')"
+_SQL_WORD_FILTER = "length(w.word) >= %(min_length)s AND w.word <> ALL(%(stop_words)s)"
+
+
+def word_counts_sql(limit: int, ngram: int = 1, video_id: str = None) -> Tuple[str, dict]:
+    """(sql, params) counting the top ``limit`` words or n-grams of the transcripts table in the database.
+
+    Rows come back as (term, count), ordered by count descending then term in
+    byte order (COLLATE "C", like Python's ``sorted`` whatever the database
+    locale), so only the top of the ranking crosses the wire. N-grams run across the
+    snippets of a video in playback order, like analyze_common_words.count_batch.
+    """
+    params = {
+        'min_length': MIN_WORD_LENGTH,
+        'stop_words': sorted(STOP_WORDS),
+        'limit': limit,
+    }
+    video_filter = ''
+    if video_id:
+        video_filter = 'AND t.video_id = %(video_id)s'
+        params['video_id'] = video_id
+
+    if ngram == 1:
+        sql = f"""
+            SELECT w.word AS term, COUNT(*) AS count
+            FROM transcripts t, {_SQL_WORDS} AS w(word)
+            WHERE {_SQL_WORD_FILTER} {video_filter}
+            GROUP BY w.word
+            ORDER BY count DESC, term COLLATE "C"
+            LIMIT %(limit)s
+        """
+        return sql, params
+
+    following = ', '.join(f"lead(word, {offset}) OVER run" for offset in range(1, ngram))
+    sql = f"""
+        WITH words AS (
+            SELECT t.video_id, t.start_time, t.id, w.word_index, w.word
+            FROM transcripts t, {_SQL_WORDS} WITH ORDINALITY AS w(word, word_index)
+            WHERE {_SQL_WORD_FILTER} {video_filter}
+        ), grams AS (
+            SELECT concat_ws(' ', word, {following}) AS term,
+                   lead(word, {ngram - 1}) OVER run AS last_word
+            FROM words
+            WINDOW run AS (PARTITION BY video_id ORDER BY start_time, id, word_index)
+        )
+        SELECT term, COUNT(*) AS count
+        FROM grams
+        WHERE last_word IS NOT NULL
+        GROUP BY term
+        ORDER BY count DESC, term COLLATE "C"
+        LIMIT %(limit)s
+    """
+    return sql, params
@@ -0,0 +1,51 @@
+"""Token counting shared by the embedding pipeline and the RAG context packer.
+
+Kept free of Django imports so scripts/embedding_pipeline.py can use it to
+store per-chunk counts at ingest. Uses tiktoken when it is installed (and its
+encoding can be loaded); otherwise falls back to a ~4 characters per token
+estimate, which is close for English transcript text.
+"""
+
+from typing import List
+
+try:
+    import tiktoken
+except ImportError:  # Optional dependency
+    tiktoken = None
+
+# gpt-oss uses the o200k vocabulary
+ENCODING_NAME = 'o200k_base'
+CHARS_PER_TOKEN = 4
+# Role markers and separators the chat template adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(ENCODING_NAME)
+            except Exception:
+                # The BPE file is downloaded on first use; offline hosts use the estimate
+                _encoding = None
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text (exact with tiktoken, estimated otherwise)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def count_message_tokens(messages: List[dict]) -> int:
+    """Tokens for a list of chat messages, including per-message template overhead."""
+    return sum(count_tokens(message.get('content', '')) + MESSAGE_OVERHEAD_TOKENS for message in messages)
@@ -1,12 +1,19 @@
 from django.urls import path
-from .views import TotalCountsAPIView, KeywordSearchAPIView, CommonWordsAPIView, SemanticSearchAPIView, ChatAPIView
+from .views import TotalCountsAPIView, KeywordSearchAPIView, CommonWordsAPIView, SemanticSearchAPIView, ChatAPIView, MetricsAPIView
+from .views import SemanticSearchBatchAPIView, PhraseSearchAPIView
+from .async_views import SemanticSearchAsyncView, ChatAsyncView
 
 from . import views
 
 urlpatterns = [
     path('counts/', TotalCountsAPIView.as_view(), name='total-counts'),
     path('search/', KeywordSearchAPIView.as_view(), name='keyword-search'),
+    path('search/phrase/', PhraseSearchAPIView.as_view(), name='phrase-search'),
     path('common_words/', CommonWordsAPIView.as_view(), name='common-words'),
     path('semantic_search/', SemanticSearchAPIView.as_view(), name='semantic-search'),
+    path('semantic_search/batch/', SemanticSearchBatchAPIView.as_view(), name='semantic-search-batch'),
     path('chat/', ChatAPIView.as_view(), name='chat'),
+    path('metrics/', MetricsAPIView.as_view(), name='metrics'),
+    path('async/semantic_search/', SemanticSearchAsyncView.as_view(), name='semantic-search-async'),
+    path('async/chat/', ChatAsyncView.as_view(), name='chat-async'),
 ]
\ No newline at end of file
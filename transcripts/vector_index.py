@@ -0,0 +1,521 @@
+"""Memory-mapped NumPy vector index over text_chunks embeddings.
+
+On-disk layout (one directory; the files of a build are append-only):
+
+    manifest.json            format, dimensions, dtype, build id, row and tombstone counts, the corpus
+                             generation it covers and the previous build id
+    embeddings-<build>.bin   row-major (count, dimensions) matrix in float16/float32
+    norms-<build>.bin        float32 squared L2 norm of every row
+    metadata-<build>.jsonl   one JSON object per row: id, video_id, text, start_time_seconds, duration,
+                             token_count, created_at
+    deleted-<build>.bin      int64 numbers of rows whose chunk was deleted or re-embedded since
+
+Readers map the matrix read-only, so every worker process mapping the same
+file shares the page cache. Chunk text stays in the metadata file and is read
+by offset for the rows a search returns. The writer appends rows and
+tombstones first and replaces the manifest last, so readers only ever see fully
+written rows; bytes past the manifest's counts (left by an interrupted refresh)
+are truncated before the next append. A new build keeps the previous build's
+files until the build after it, so readers still on the old manifest finish.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from .retrieval import as_array
+
+FORMAT_VERSION = 2
+INDEX_DTYPES = {'float16': np.float16, 'float32': np.float32}
+BUILD_FILE_KINDS = ('embeddings', 'norms', 'metadata', 'deleted')
+BUILD_BATCH_SIZE = 2000
+ID_SCAN_CHUNK_SIZE = 10000
+SCAN_BLOCK_ROWS = 16384
+# A refresh rebuilds instead of appending once tombstones would pass this share of the rows
+COMPACT_DELETED_FRACTION = 0.25
+
+
+class VectorIndexNotBuilt(Exception):
+    pass
+
+
+def _version(created_at) -> Optional[str]:
+    """Row version stored in the metadata: a chunk deleted and inserted again gets a new created_at."""
+    return created_at.isoformat() if created_at is not None else None
+
+
+class _Snapshot:
+    """The rows of one published manifest, as loaded by a reader.
+
+    Snapshots of the same build share the id, video and offset structures,
+    which only grow, so every lookup is bounded by ``count``.
+    """
+
+    def __init__(self, build_id: str = None, count: int = 0, deleted: int = 0, generation: int = None):
+        self.build_id = build_id
+        self.count = count
+        self.deleted = deleted
+        self.generation = generation
+        self.matrix = None
+        self.norms = None
+        self.live = None               # row mask; None while nothing is tombstoned
+        self.live_count = count
+        self.meta_file = None          # stays readable after a later build unlinks the file
+        self.offsets = array('q', [0])  # metadata byte offset of every row, then the end offset
+        self.rows_by_id: Dict[str, int] = {}
+        self.video_rows: Dict[str, array] = {}
+
+    def video_row_numbers(self, video_id: str) -> np.ndarray:
+        rows = np.array(self.video_rows.get(video_id, ()), dtype=np.int64)
+        rows = rows[:np.searchsorted(rows, self.count)]
+        return rows if self.live is None else rows[self.live[rows]]
+
+    def row_of(self, chunk_id: str) -> Optional[int]:
+        row = self.rows_by_id.get(chunk_id)
+        if row is None or row >= self.count or (self.live is not None and not self.live[row]):
+            return None
+        return row
+
+    def metadata(self, row: int) -> dict:
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return json.loads(os.pread(self.meta_file.fileno(), end - start, start))
+
+
+class NumpyVectorIndex:
+    """Exact top-k search over a memory-mapped embedding matrix.
+
+    Distances match pgvector's ``<->`` operator (L2), so results and
+    ``similarity_score`` values line up with the pgvector backend.
+    """
+
+    def __init__(self, path, dtype: str = 'float16', dimensions: int = 768):
+        if dtype not in INDEX_DTYPES:
+            raise ValueError(f"Unsupported index dtype: {dtype}")
+        self.path = Path(path)
+        self.dtype = dtype
+        self.dimensions = dimensions
+        self._lock = threading.Lock()
+        self._manifest_mtime = None
+        self._snapshot = _Snapshot()
+
+    # ==================== FILES ====================
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.path / 'manifest.json'
+
+    def _file(self, kind: str, build_id: str) -> Path:
+        suffix = 'jsonl' if kind == 'metadata' else 'bin'
+        return self.path / f"{kind}-{build_id}.{suffix}"
+
+    def _read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self, manifest: dict) -> None:
+        tmp_path = self.path / f"manifest.json.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    # ==================== READING ====================
+
+    def reload_if_changed(self) -> _Snapshot:
+        """Pick up rows appended (or a rebuild published) since the last load; returns the current snapshot."""
+        try:
+            mtime = self.manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            raise VectorIndexNotBuilt(
+                f"No vector index at {self.path}; run `python manage.py build_vector_index`"
+            )
+        if mtime == self._manifest_mtime:
+            return self._snapshot
+
+        with self._lock:
+            if mtime == self._manifest_mtime:
+                return self._snapshot
+            for attempt in range(2):
+                manifest = self._read_manifest()
+                if manifest is None:
+                    raise VectorIndexNotBuilt(f"No vector index at {self.path}")
+                try:
+                    self._snapshot = self._load(manifest, self._snapshot)
+                    break
+                except FileNotFoundError:
+                    # Two builds were published since the manifest was read; the new one names live files
+                    if attempt:
+                        raise
+            self._manifest_mtime = mtime
+            return self._snapshot
+
+    def _load(self, manifest: dict, current: _Snapshot) -> _Snapshot:
+        # Caller must hold self._lock
+        build_id = manifest['build_id']
+        count = manifest['count']
+        deleted = manifest.get('deleted', 0)
+        snapshot = _Snapshot(build_id, count, deleted, manifest.get('corpus_generation'))
+
+        if current.build_id == build_id and len(current.offsets) - 1 <= count:
+            # Same build: earlier rows never change, so only the appended ones are parsed
+            snapshot.meta_file = current.meta_file
+            snapshot.offsets = current.offsets
+            snapshot.rows_by_id = current.rows_by_id
+            snapshot.video_rows = current.video_rows
+        else:
+            snapshot.meta_file = open(self._file('metadata', build_id), 'rb')
+
+        loaded = len(snapshot.offsets) - 1
+        if count > loaded:
+            snapshot.meta_file.seek(snapshot.offsets[-1])
+            for row in range(loaded, count):
+                line = snapshot.meta_file.readline()
+                entry = json.loads(line)
+                snapshot.rows_by_id[entry['id']] = row
+                snapshot.video_rows.setdefault(entry['video_id'], array('q')).append(row)
+                snapshot.offsets.append(snapshot.offsets[-1] + len(line))
+
+        if count:
+            dtype = INDEX_DTYPES[manifest['dtype']]
+            snapshot.matrix = np.memmap(self._file('embeddings', build_id), dtype=dtype,
+                                        mode='r', shape=(count, manifest['dimensions']))
+            snapshot.norms = np.memmap(self._file('norms', build_id), dtype=np.float32,
+                                       mode='r', shape=(count,))
+        if deleted:
+            snapshot.live = np.ones(count, dtype=bool)
+            snapshot.live[np.fromfile(self._file('deleted', build_id), dtype=np.int64, count=deleted)] = False
+            snapshot.live_count = int(snapshot.live.sum())
+        return snapshot
+
+    def version(self) -> str:
+        """Identifies the loaded snapshot; changes whenever rows are appended, tombstoned or rebuilt."""
+        snapshot = self.reload_if_changed()
+        return f"{snapshot.build_id}:{snapshot.count}:{snapshot.deleted}"
+
+    def is_stale(self, generation: int) -> bool:
+        """True if the loaded snapshot was refreshed before corpus generation ``generation``."""
+        snapshot = self.reload_if_changed()
+        return snapshot.generation is None or snapshot.generation < generation
+
+    @staticmethod
+    def _squared_distances(snapshot: _Snapshot, rows: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        """||x||^2 - 2 x.q + ||q||^2, scanned in blocks to bound float16 upcasts."""
+        matrix = snapshot.matrix if rows is None else snapshot.matrix[rows]
+        norms = snapshot.norms if rows is None else snapshot.norms[rows]
+        dots = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), SCAN_BLOCK_ROWS):
+            block = matrix[start:start + SCAN_BLOCK_ROWS]
+            dots[start:start + len(block)] = block.astype(np.float32, copy=False) @ query
+        distances = norms - 2.0 * dots + float(query @ query)
+        return np.maximum(distances, 0.0, out=distances)
+
+    def search(self, query_embedding, top_k: int = 5, video_id: str = None) -> List[dict]:
+        """Return the top_k nearest chunks in the same shape as the pgvector backend."""
+        snapshot = self.reload_if_changed()
+        if not snapshot.count:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if video_id:
+            rows = snapshot.video_row_numbers(video_id)
+            if not len(rows):
+                return []
+            available = len(rows)
+        else:
+            rows = None
+            available = snapshot.live_count
+
+        distances = self._squared_distances(snapshot, rows, query)
+        if rows is None and snapshot.live is not None:
+            distances[~snapshot.live] = np.inf
+        k = min(int(top_k), available)
+        if k <= 0:
+            return []
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+
+        results = []
+        for position in nearest:
+            row = int(position if rows is None else rows[position])
+            metadata = snapshot.metadata(row)
+            results.append({
+                'id': metadata['id'],
+                'video_id': metadata['video_id'],
+                'text': metadata['text'],
+                'start_time_seconds': metadata['start_time_seconds'],
+                'token_count': metadata.get('token_count'),
+                'youtube_video_id': metadata['video_id'],
+                'similarity_score': 1 - float(np.sqrt(distances[position])),
+            })
+        return results
+
+    def chunk_vectors(self, chunk_ids: List[str]) -> Dict[str, tuple]:
+        """Map chunk id -> (float32 embedding, duration) for ids present in the snapshot."""
+        snapshot = self.reload_if_changed()
+        vectors = {}
+        for chunk_id in chunk_ids:
+            row = snapshot.row_of(chunk_id)
+            if row is not None:
+                vectors[chunk_id] = (
+                    np.asarray(snapshot.matrix[row], dtype=np.float32), snapshot.metadata(row).get('duration')
+                )
+        return vectors
+
+    # ==================== SOURCE (text_chunks) ====================
+
+    def _current_generation(self) -> int:
+        from .models import CorpusState
+        return CorpusState.objects.filter(pk=1).values_list('generation', flat=True).first() or 0
+
+    def _chunk_versions(self):
+        """(id, version) of every embedded chunk."""
+        from .models import TextChunks
+        versions = TextChunks.objects.filter(embedding__isnull=False).values_list('id', 'created_at')
+        for chunk_id, created_at in versions.iterator(chunk_size=ID_SCAN_CHUNK_SIZE):
+            yield chunk_id, _version(created_at)
+
+    def _chunk_rows(self, ids: List[str] = None):
+        """Rows to index for ``ids`` (every embedded chunk when None), in (created_at, id) order per batch."""
+        from .models import TextChunks
+        chunks = TextChunks.objects.filter(embedding__isnull=False).order_by('created_at', 'id')
+        fields = ('id', 'video_id', 'text', 'start_time_seconds', 'duration', 'embedding', 'token_count',
+                  'created_at')
+        if ids is None:
+            batches = [chunks.values_list(*fields).iterator(chunk_size=BUILD_BATCH_SIZE)]
+        else:
+            batches = (
+                chunks.filter(id__in=ids[start:start + BUILD_BATCH_SIZE]).values_list(*fields)
+                for start in range(0, len(ids), BUILD_BATCH_SIZE)
+            )
+        for batch in batches:
+            for row in batch:
+                yield row[:-1] + (_version(row[-1]),)
+
+    # ==================== WRITING ====================
+
+    def refresh(self, rebuild: bool = False, wait: bool = True) -> Optional[int]:
+        """Bring the snapshot up to date with text_chunks; returns the number of rows appended.
+
+        Changes are found by diffing (id, created_at) against the snapshot, not
+        by a created_at high-water mark: the embedding pipeline's threads stamp
+        created_at before their transactions commit, so a later commit can carry
+        an earlier timestamp. New chunks are appended; rows of deleted or
+        re-embedded chunks are tombstoned, and once tombstones pass
+        COMPACT_DELETED_FRACTION of the rows the refresh writes a new build.
+
+        Writers serialize on a lock file next to the manifest. With
+        ``wait=False`` (background refreshes) this returns None at once if
+        another process is already writing, and skips the scan when the
+        snapshot already covers the current corpus generation.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / 'write.lock', 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            try:
+                return self._refresh_locked(rebuild, skip_if_current=not wait)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh_locked(self, rebuild: bool, skip_if_current: bool) -> int:
+        published = self._read_manifest()
+        manifest = None if rebuild else published
+        if manifest and (manifest.get('format') != FORMAT_VERSION or manifest['dtype'] != self.dtype
+                         or manifest['dimensions'] != self.dimensions):
+            manifest = None
+
+        # Read before the chunks: the pipeline bumps the generation in the transaction that
+        # inserts them, so every chunk of this generation is visible to the queries below
+        generation = self._current_generation()
+        if manifest and skip_if_current and (manifest['corpus_generation'] or 0) >= generation:
+            return 0
+
+        if manifest is not None:
+            indexed, metadata_bytes = self._indexed_versions(manifest)
+            current = dict(self._chunk_versions())
+            replaced = [row for chunk_id, (row, version) in indexed.items() if current.get(chunk_id) != version]
+            missing = [
+                chunk_id for chunk_id, version in current.items()
+                if chunk_id not in indexed or indexed[chunk_id][1] != version
+            ]
+            rows = self._chunk_rows(missing) if missing else ()
+            if manifest['deleted'] + len(replaced) > COMPACT_DELETED_FRACTION * (manifest['count'] + len(missing)):
+                manifest = None
+        if manifest is None:
+            manifest = {
+                'format': FORMAT_VERSION,
+                'build_id': uuid.uuid4().hex[:12],
+                'dtype': self.dtype,
+                'dimensions': self.dimensions,
+                'count': 0,
+                'deleted': 0,
+                'corpus_generation': None,
+                # Kept on disk until the next build so readers of the old manifest can finish
+                'previous_build_id': published['build_id'] if published else None,
+            }
+            replaced, rows, metadata_bytes = [], self._chunk_rows(), 0
+
+        changed = manifest is not published or manifest['corpus_generation'] != generation
+        manifest['corpus_generation'] = generation
+        added = self._append(manifest, rows, replaced, metadata_bytes)
+        if added or replaced or changed:
+            self._write_manifest(manifest)
+        self._remove_old_builds(manifest)
+        return added
+
+    def _indexed_versions(self, manifest: dict) -> tuple:
+        """(chunk id -> (row, version) of the manifest's live rows, byte length of their metadata lines)."""
+        deleted = set()
+        if manifest['deleted']:
+            deleted = set(np.fromfile(self._file('deleted', manifest['build_id']), dtype=np.int64,
+                                      count=manifest['deleted']).tolist())
+        indexed = {}
+        if not manifest['count']:
+            return indexed, 0
+        with open(self._file('metadata', manifest['build_id']), 'rb') as f:
+            for row in range(manifest['count']):
+                entry = json.loads(f.readline())
+                if row not in deleted:
+                    indexed[entry['id']] = (row, entry.get('created_at'))
+            return indexed, f.tell()
+
+    def _append(self, manifest: dict, rows, replaced: List[int], metadata_bytes: int) -> int:
+        build_id = manifest['build_id']
+        itemsize = np.dtype(INDEX_DTYPES[self.dtype]).itemsize
+        int64_size = np.dtype(np.int64).itemsize
+        added = 0
+        with open(self._file('embeddings', build_id), 'ab') as matrix_file, \
+                open(self._file('norms', build_id), 'ab') as norms_file, \
+                open(self._file('metadata', build_id), 'ab') as meta_file, \
+                open(self._file('deleted', build_id), 'ab') as deleted_file:
+            # Drop rows an interrupted refresh appended without publishing them in the manifest
+            matrix_file.truncate(manifest['count'] * self.dimensions * itemsize)
+            norms_file.truncate(manifest['count'] * np.dtype(np.float32).itemsize)
+            meta_file.truncate(metadata_bytes)
+            deleted_file.truncate(manifest['deleted'] * int64_size)
+
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= BUILD_BATCH_SIZE:
+                    added += self._append_batch(batch, matrix_file, norms_file, meta_file, manifest)
+                    batch = []
+            if batch:
+                added += self._append_batch(batch, matrix_file, norms_file, meta_file, manifest)
+            if replaced:
+                deleted_file.write(np.asarray(sorted(replaced), dtype=np.int64).tobytes())
+                manifest['deleted'] += len(replaced)
+            for f in (matrix_file, norms_file, meta_file, deleted_file):
+                f.flush()
+                os.fsync(f.fileno())
+        return added
+
+    def _append_batch(self, batch, matrix_file, norms_file, meta_file, manifest) -> int:
+        vectors = np.asarray([as_array(row[5]) for row in batch])
+        stored = vectors.astype(INDEX_DTYPES[self.dtype])
+        # Norms are taken from the stored (possibly float16) values so distances stay consistent
+        norms = np.einsum('ij,ij->i', stored.astype(np.float32), stored.astype(np.float32))
+
+        matrix_file.write(stored.tobytes())
+        norms_file.write(norms.astype(np.float32).tobytes())
+        for chunk_id, video_id, text, start_time, duration, _, token_count, version in batch:
+            meta_file.write((json.dumps({
+                'id': chunk_id,
+                'video_id': video_id,
+                'text': text,
+                'start_time_seconds': start_time,
+                'duration': duration,
+                'token_count': token_count,
+                'created_at': version,
+            }) + '\n').encode('utf-8'))
+
+        manifest['count'] += len(batch)
+        return len(batch)
+
+    def _remove_old_builds(self, manifest: dict) -> None:
+        """Delete the files of builds older than the previous one (readers have moved on by now)."""
+        keep = {manifest['build_id'], manifest.get('previous_build_id')}
+        for path in self.path.iterdir():
+            kind, _, build_id = path.stem.partition('-')
+            if kind in BUILD_FILE_KINDS and build_id not in keep:
+                path.unlink(missing_ok=True)
+
+
+_vector_index = None
+_vector_index_lock = threading.Lock()
+
+
+def get_vector_index() -> NumpyVectorIndex:
+    """Process-wide index instance configured from settings."""
+    global _vector_index
+    if _vector_index is None:
+        with _vector_index_lock:
+            if _vector_index is None:
+                _vector_index = NumpyVectorIndex(
+                    settings.VECTOR_INDEX_PATH,
+                    dtype=getattr(settings, 'VECTOR_INDEX_DTYPE', 'float16'),
+                )
+    return _vector_index
+
+
+# A worker asks again for a generation whose refresh it already requested at most this often
+REFRESH_RETRY_SECONDS = 30.0
+
+_refresh_lock = threading.Lock()
+_refresh_thread = None
+_refresh_generation = None
+_refresh_requested_at = 0.0
+
+
+def _refresh_in_background(index: NumpyVectorIndex) -> None:
+    try:
+        # Whichever worker takes the write lock first refreshes; the others return at once
+        index.refresh(wait=False)
+    except Exception as e:
+        print(f"Vector index refresh failed: {str(e)}")
+    finally:
+        # The thread outlives the request; don't leave its connection open
+        connection.close()
+
+
+def refresh_if_stale(index: NumpyVectorIndex, generation: int) -> bool:
+    """Start index.refresh() on a background thread if the snapshot predates corpus ``generation``.
+
+    At most one refresh thread runs per process and, across processes, one
+    refresh writes while the others' threads return without scanning. A
+    generation is re-requested only after REFRESH_RETRY_SECONDS, in case the
+    refresh that ran had started before it. Searches keep using the current
+    snapshot meanwhile. Returns True if a refresh was started.
+    """
+    global _refresh_thread, _refresh_generation, _refresh_requested_at
+    if not index.is_stale(generation):
+        return False
+    with _refresh_lock:
+        now = time.monotonic()
+        if _refresh_thread is not None and _refresh_thread.is_alive():
+            return False
+        if generation == _refresh_generation and now - _refresh_requested_at < REFRESH_RETRY_SECONDS:
+            return False
+        _refresh_generation = generation
+        _refresh_requested_at = now
+        _refresh_thread = threading.Thread(
+            target=_refresh_in_background, args=(index,), name='vector-index-refresh', daemon=True
+        )
+        _refresh_thread.start()
+    return True
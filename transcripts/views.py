@@ -1,30 +1,119 @@
+from django.conf import settings
 from django.shortcuts import render
-from django.http import HttpResponse
-from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Videos, Transcripts, Conversation, Message
+from django.db import connection
+from django.db.models.functions import Collate
+from .models import Videos, Transcripts, Conversation, WordCounts, VideoWordCounts
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.views import APIView
-from collections import Counter
-import re
-
-from .semantic_search import semantic_search
-from .rag_service import answer_question
-
-STOP_WORDS = set([
-    'the', 'a', 'an', 'is', 'it', 'he', 'she', 'we', 'they', 'you', 'i', 
-    'to', 'of', 'and', 'in', 'on', 'at', 'for', 'with', 'about', 'as', 
-    'by', 'or', 'so', 'if', 'but', 'not', 'what', 'where', 'when', 'why', 
-    'how', 'this', 'that', 'these', 'those', 'just', 'like', 'get', 'up',
-    'down', 'out', 'be', 'been', 'have', 'had', 'do', 'does', 'did', 'will', 
-    'would', 'can', 'could', 'one', 'two', 'three', 'four', 'five', 'time',
-    'know', 'all', 'from', 'really', 'very', 'gonna', 'wanna', 'yeah', 'okay', 
-    'it\'s', 'i\'m', 'you\'re', 'that\'s', 'we\'re', 'they\'re', 'don\'t', 'we', 'um', 
-    'yeah', 'right', 'so', 'going', 'me', 'some', 'lot', 'a lot', 'way',
-    'little', 'back', 'make', 'want', 'think', 'see', 'good', 'now', 'here', 'then', 'our',
-    'because', 'which', 'well', 'its', 'are'
-])
+from rest_framework.utils.urls import replace_query_param
+import json
+
+from .semantic_search import (
+    semantic_search, semantic_search_batch, query_embedding_cache, search_result_cache, embedding_flight,
+    embedding_batcher, bounded_top_k, SEARCH_BACKENDS, SEARCH_MODES
+)
+from .rag_service import (
+    answer_question, stream_answer, answer_cache, conversation_cache, generation_flight, llm_admission
+)
+from .keyword_search import keyword_search, phrase_search, InvalidCursor, KEYWORD_ORDERS, MIN_KEYWORD_LENGTH
+from .memory import load_history, save_turn, schedule_summary, MEMORY_MODES
+from .model_clients import model_latency
+from .text_stats import word_counts_sql
+
+# 'table': precomputed word_counts tables; 'sql': counted live inside PostgreSQL
+COMMON_WORDS_ENGINES = ('table', 'sql')
+
+
+def parse_bool(value, default: bool = None):
+    """Boolean request parameter parsed like DRF's BooleanField ("false", "0", "off" are False).
+
+    Returns default when the value is missing; raises serializers.ValidationError if it is not a boolean.
+    """
+    if value is None or value == '':
+        return default
+    return serializers.BooleanField().to_internal_value(value)
+
+def parse_top_k(value, default: int) -> int:
+    """top_k request parameter, clamped to [1, SEARCH_MAX_TOP_K].
+
+    Returns default when the value is missing; raises serializers.ValidationError if it is not an integer.
+    """
+    if value is None or value == '':
+        value = default
+    return bounded_top_k(serializers.IntegerField().to_internal_value(value))
+
+def parse_search_request(data) -> tuple:
+    """Validate a semantic_search/ body (sync and async views); returns (params, None) or (None, error)."""
+    params = {
+        'query': str(data.get('query') or '').strip(),
+        'video_id': data.get('video_id'),
+        'backend': data.get('backend'),
+        'search_mode': data.get('search_mode'),
+    }
+    if not params['query']:
+        return None, 'query parameter is required'
+
+    if params['backend'] and params['backend'] not in SEARCH_BACKENDS:
+        return None, f"backend must be one of: {', '.join(SEARCH_BACKENDS)}"
+
+    if params['search_mode'] and params['search_mode'] not in SEARCH_MODES:
+        return None, f"search_mode must be one of: {', '.join(SEARCH_MODES)}"
+
+    try:
+        params['diversify'] = parse_bool(data.get('diversify'))  # None: settings default
+    except serializers.ValidationError:
+        return None, 'diversify must be a boolean'
+
+    try:
+        params['top_k'] = parse_top_k(data.get('top_k'), 5)
+    except serializers.ValidationError:
+        return None, 'top_k must be an integer'
+
+    return params, None
+
+def parse_chat_request(data) -> tuple:
+    """Validate a chat/ body (sync and async views); returns (params, None) or (None, error)."""
+    params = {
+        'question': str(data.get('question') or '').strip(),
+        'conversation_id': data.get('conversation_id'),
+        'video_id': data.get('video_id'),
+        'search_mode': data.get('search_mode'),
+        'memory': data.get('memory') or getattr(settings, 'CONVERSATION_MEMORY', 'window'),
+    }
+    if not params['question']:
+        return None, 'question parameter is required'
+
+    if not params['conversation_id']:
+        return None, 'conversation_id parameter is required for history tracking'
+
+    if len(params['question']) > 500:
+        return None, 'question must be under 500 characters'
+
+    if params['search_mode'] and params['search_mode'] not in SEARCH_MODES:
+        return None, f"search_mode must be one of: {', '.join(SEARCH_MODES)}"
+
+    try:
+        params['diversify'] = parse_bool(data.get('diversify'))  # None: settings default
+    except serializers.ValidationError:
+        return None, 'diversify must be a boolean'
+
+    try:
+        params['top_k'] = parse_top_k(data.get('top_k'), 3)
+    except serializers.ValidationError:
+        return None, 'top_k must be an integer'
+
+    if params['memory'] not in MEMORY_MODES:
+        return None, f"memory must be one of: {', '.join(MEMORY_MODES)}"
+
+    try:
+        params['stream'] = parse_bool(data.get('stream'), default=False)
+    except serializers.ValidationError:
+        return None, 'stream must be a boolean'
+
+    return params, None
 
 # Create your views here.
 
@@ -43,52 +132,125 @@ class TotalCountsAPIView(APIView):
 
 class KeywordSearchAPIView(APIView):
     def get(self, request):
+        """
+        GET search/?q=<keyword>
+
+        Query parameters:
+            q          Keyword, matched case-insensitively (under 3 characters: unindexed scan)
+            order      "position" (default: by video and time) or "relevance" (trigram word similarity)
+            page_size  Rows per page (default: PAGE_SIZE, capped at KEYWORD_SEARCH_MAX_PAGE_SIZE)
+            cursor     next_cursor from the previous page
+        """
         keyword = request.query_params.get('q', '').strip()
+        order = request.query_params.get('order', 'position')
+        cursor = request.query_params.get('cursor')
 
         if not keyword:
             return Response({"error": "Cannot process empty keyword!"}, status=status.HTTP_400_BAD_REQUEST)
-        
+
+        if order not in KEYWORD_ORDERS:
+            return Response(
+                {"error": f"order must be one of: {', '.join(KEYWORD_ORDERS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        max_page_size = getattr(settings, 'KEYWORD_SEARCH_MAX_PAGE_SIZE', 500)
         try:
-            snippets = Transcripts.objects.filter(
-                text__icontains=keyword
-            ).order_by('start_time').values('video_id', 'start_time', 'text')
-
-            results = [
-                {
-                    "video_id": snippet['video_id'],
-                    "start_time":snippet['start_time'],
-                    "text":snippet['text'].replace('\n',' '),
-                }for snippet in snippets
-            ]
+            page_size = int(request.query_params.get('page_size', settings.REST_FRAMEWORK.get('PAGE_SIZE', 100)))
+        except ValueError:
+            return Response({"error": "page_size must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        page_size = max(1, min(page_size, max_page_size))
 
-            return Response({
-                "keyword":keyword,
-                "count":len(results),
-                "results": results
-            }, status=status.HTTP_200_OK)
+        try:
+            result = keyword_search(keyword, page_size, cursor, order)
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"error":str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class CommonWordsAPIView(APIView):
+        result['next'] = replace_query_param(
+            request.build_absolute_uri(), 'cursor', result['next_cursor']
+        ) if result['next_cursor'] else None
+        return Response(result, status=status.HTTP_200_OK)
+
+class PhraseSearchAPIView(APIView):
     def get(self, request):
+        """
+        GET search/phrase/?q=<phrase>
+
+        Finds phrases even when YouTube split them across snippets, using the
+        per-video transcript documents (build_transcript_documents).
+
+        Query parameters:
+            q          Phrase, matched case-insensitively (at least 3 characters)
+            video_id   Optional: search one video only
+            page_size  Videos per page (default: PHRASE_SEARCH_PAGE_SIZE, capped at PHRASE_SEARCH_MAX_PAGE_SIZE)
+            cursor     next_cursor from the previous page
+        """
+        phrase = request.query_params.get('q', '').strip()
+        video_id = request.query_params.get('video_id')
+        cursor = request.query_params.get('cursor')
+
+        if not phrase:
+            return Response({"error": "Cannot process empty phrase!"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(phrase) < MIN_KEYWORD_LENGTH:
+            return Response(
+                {"error": f"phrase must be at least {MIN_KEYWORD_LENGTH} characters"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        max_page_size = getattr(settings, 'PHRASE_SEARCH_MAX_PAGE_SIZE', 100)
+        try:
+            page_size = int(request.query_params.get('page_size', getattr(settings, 'PHRASE_SEARCH_PAGE_SIZE', 20)))
+        except ValueError:
+            return Response({"error": "page_size must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        page_size = max(1, min(page_size, max_page_size))
+
         try:
-            max_num = int(request.query_params.get('n', 10)) 
+            result = phrase_search(phrase, page_size, cursor, video_id,
+                                   hits_per_video=getattr(settings, 'PHRASE_SEARCH_MAX_HITS_PER_VIDEO', 50))
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({"error":str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            text_list = Transcripts.objects.values_list("text", flat=True)
+        result['next'] = replace_query_param(
+            request.build_absolute_uri(), 'cursor', result['next_cursor']
+        ) if result['next_cursor'] else None
+        return Response(result, status=status.HTTP_200_OK)
 
-            word_counter = Counter()
-            for text in text_list:
-                cleaned_text = re.sub(r"[^a-z\s]", "", text.lower())
-                words = cleaned_text.split()
+class CommonWordsAPIView(APIView):
+    def get(self, request):
+        """
+        GET common_words/?n=10&video_id=<id>&engine=table
 
-                filtered_words = [
-                    word
-                    for word in words
-                    if len(word) > 2 and word not in STOP_WORDS
-                ]
-                word_counter.update(filtered_words)
-            
-            most_common = word_counter.most_common(max_num)
+        engine "table" (default: COMMON_WORDS_ENGINE) reads the word_counts tables maintained
+        at ingest, so the cost does not grow with the corpus. "sql" counts live inside
+        PostgreSQL with the same tokenization rules; only the top n rows are returned.
+        """
+        try:
+            max_num = max(int(request.query_params.get('n', 10)), 0)
+            video_id = request.query_params.get('video_id')
+            engine = request.query_params.get('engine') or getattr(settings, 'COMMON_WORDS_ENGINE', 'table')
+
+            if engine not in COMMON_WORDS_ENGINES:
+                return Response(
+                    {"error": f"engine must be one of: {', '.join(COMMON_WORDS_ENGINES)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            if engine == 'sql':
+                with connection.cursor() as cursor:
+                    cursor.execute(*word_counts_sql(max_num, video_id=video_id))
+                    most_common = cursor.fetchall()
+            else:
+                if video_id:
+                    counts = VideoWordCounts.objects.filter(video_id=video_id)
+                else:
+                    counts = WordCounts.objects.all()
+                # Same tie order as word_counts_sql
+                most_common = counts.order_by('-count', Collate('word', 'C')).values_list('word', 'count')[:max_num]
 
             results = [{"word": word, "count": count} for word, count in most_common]
 
@@ -106,32 +268,88 @@ class SemanticSearchAPIView(APIView):
         {
             "query": "What is machine learning?",
             "video_id": "dQw4w9WgXcQ",  # optional
-            "top_k": 5
+            "top_k": 5,
+            "backend": "numpy",         # optional: "pgvector" (default) or "numpy"
+            "search_mode": "hybrid",    # optional: "vector" (default) or "hybrid"
+            "diversify": true           # optional: MMR + merge adjacent chunks
         }
         """
-        query = request.data.get('query', '').strip()
+        params, error = parse_search_request(request.data)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = semantic_search(params['query'], params['video_id'], params['top_k'], backend=params['backend'],
+                                 mode=params['search_mode'], diversify=params['diversify'])
+
+        if 'error' in result:
+            return Response(result, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response(result, status=status.HTTP_200_OK)
+
+class SemanticSearchBatchAPIView(APIView):
+    """Batch semantic search: many queries, one embedding call and one SQL query."""
+
+    def post(self, request):
+        """
+        POST body:
+        {
+            "queries": ["What is machine learning?", "What is a gradient?"],
+            "video_id": "dQw4w9WgXcQ",  # optional, applies to every query
+            "top_k": 5,
+            "backend": "numpy"          # optional: "pgvector" (default) or "numpy"
+        }
+        """
+        queries = request.data.get('queries')
         video_id = request.data.get('video_id')
         top_k = request.data.get('top_k', 5)
+        backend = request.data.get('backend')
+
+        if not isinstance(queries, list) or not queries:
+            return Response(
+                {'error': 'queries must be a non-empty list'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        if not query:
+        queries = [str(query).strip() for query in queries]
+        if not all(queries):
             return Response(
-                {'error': 'query parameter is required'},
+                {'error': 'queries must not contain empty strings'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        result = semantic_search(query, video_id, top_k)
+        if len(queries) > settings.SEMANTIC_SEARCH_BATCH_MAX:
+            return Response(
+                {'error': f'at most {settings.SEMANTIC_SEARCH_BATCH_MAX} queries per batch'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if backend and backend not in SEARCH_BACKENDS:
+            return Response(
+                {'error': f"backend must be one of: {', '.join(SEARCH_BACKENDS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            top_k = parse_top_k(top_k, 5)
+        except serializers.ValidationError:
+            return Response({'error': 'top_k must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = semantic_search_batch(queries, video_id, top_k, backend=backend)
 
         if 'error' in result:
             return Response(result, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         return Response(result, status=status.HTTP_200_OK)
 
-HISTORY_LIMIT = 10 
+def _overloaded_response(result: dict) -> Response:
+    """503 with Retry-After for requests shed by LLM admission control."""
+    response = Response(result, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = str(result['retry_after'])
+    return response
 
 class ChatAPIView(APIView):
     """RAG Chat endpoint - answers questions with cited sources and persistent history."""
 
-    @transaction.atomic
     def post(self, request):
         """
         POST chat/
@@ -141,87 +359,109 @@ class ChatAPIView(APIView):
             "question": "What is backpropagation?",
             "conversation_id": "user_123",  # Mandatory unique ID for history tracking
             "video_id": "abc123",           # Optional: to search specific video only
-            "top_k": 3                      # Optional: number of chunks to retrieve
+            "top_k": 3,                     # Optional: number of chunks to retrieve
+            "search_mode": "hybrid",        # Optional: "vector" (default) or "hybrid"
+            "diversify": true,              # Optional: MMR + merge adjacent chunks (default: RAG_DIVERSIFY)
+            "memory": "summary",            # Optional: "window" (last messages) or "summary" (default: CONVERSATION_MEMORY)
+            "stream": true                  # Optional: stream the answer as Server-Sent Events
         }
-        """
 
-        # Validate input
-        question = request.data.get('question', '').strip()
-        conversation_id = request.data.get('conversation_id')
-        video_id = request.data.get('video_id')
-        top_k = request.data.get('top_k', 3)
+        With "stream": true the response is text/event-stream: a "sources" event
+        as soon as retrieval finishes, "token" events while the answer is
+        generated, then "done" (or "error"). Messages are saved when the stream ends.
 
-        if not question:
-            return Response(
-                {'error': 'question parameter is required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        if not conversation_id:
-             return Response(
-                {'error': 'conversation_id parameter is required for history tracking'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        No transaction is held across retrieval and generation: the conversation
+        lookup and the history read run before, and the turn is written with a
+        single INSERT after, each in autocommit.
+        """
 
-        if len(question) > 500:
-            return Response(
-                {'error': 'question must be under 500 characters'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # Validate input
+        params, error = parse_chat_request(request.data)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+        question, conversation_id, video_id = params['question'], params['conversation_id'], params['video_id']
+        top_k, search_mode, diversify = params['top_k'], params['search_mode'], params['diversify']
+        memory, stream = params['memory'], params['stream']
+
+        # Shed load up front while the model server queue is full
+        retry_after = llm_admission.overloaded()
+        if retry_after:
+            return _overloaded_response({'error': 'Model server is at capacity; retry later', 'retry_after': retry_after})
 
         # 1. Initialize or Retrieve Conversation
         conversation, created = Conversation.objects.get_or_create(
             session_id=conversation_id
         )
 
-        # 2. Retrieve Conversation History
-        history_qs = conversation.messages.filter(
-            role__in=['user', 'assistant']
-        ).order_by('-timestamp')[:HISTORY_LIMIT]
-        
-        # Format the history for the LLM API
-        conversation_history = [
-            {"role": msg.role, "content": msg.content}
-            for msg in reversed(history_qs) # Reverse order to be chronological
-        ]
-
-        # 3. Add current user message to history before sending to service
-        conversation_history.append({"role": "user", "content": question})
+        # 2. Retrieve Conversation History (plus the rolling summary in 'summary' mode),
+        # 3. ending with the current user message
+        conversation_history, summary = load_history(conversation, question, memory)
+
+        if stream:
+            events = stream_answer(question, video_id, conversation_history, top_k,
+                                   search_mode=search_mode, diversify=diversify, summary=summary,
+                                   conversation_id=conversation_id)
+            response = StreamingHttpResponse(
+                self._sse_stream(events, conversation, question, memory),
+                content_type='text/event-stream'
+            )
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+            return response
 
         # 4. Generate answer using RAG pipeline
-        result = answer_question(question, video_id, conversation_history, top_k)
-        
-        # Remove the last user message from the list sent to the service, 
-        # so we only save the database messages plus the assistant's response.
-        conversation_history.pop() 
+        result = answer_question(question, video_id, conversation_history, top_k,
+                                 search_mode=search_mode, diversify=diversify, summary=summary,
+                                 conversation_id=conversation_id)
 
+        if 'retry_after' in result:
+            # Shed by admission control: nothing is saved, the client retries the same question
+            return _overloaded_response(result)
 
         if 'error' in result:
             # Save the failed user message before returning an error
-            Message.objects.create(
-                conversation=conversation,
-                role='user',
-                content=question
-            )
+            save_turn(conversation, question)
             return Response(result, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         # 5. Save the User and Assistant Messages to the database
-        
-        # Save User Message
-        Message.objects.create(
-            conversation=conversation,
-            role='user',
-            content=question
-        )
-        
-        # Save Assistant Response
-        Message.objects.create(
-            conversation=conversation,
-            role='assistant',
-            content=result['answer']
-        )
+        save_turn(conversation, question, result['answer'])
+
+        if memory == 'summary':
+            schedule_summary(conversation.id)
 
         return Response(result, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def _sse_stream(events, conversation, question, memory='window'):
+        """Format RAG stream events as SSE and persist the turn once the stream completes."""
+        for event, payload in events:
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+            if event == 'error' and 'retry_after' not in payload:
+                # Save the failed user message, as the non-streaming path does
+                save_turn(conversation, question)
+            elif event == 'done':
+                save_turn(conversation, question, payload['answer'])
+                if memory == 'summary':
+                    schedule_summary(conversation.id)
     
+class MetricsAPIView(APIView):
+    """Runtime statistics for the in-process caches, request coalescing, LLM admission and model latency."""
+
+    def get(self, request):
+        return Response({
+            "embedding_cache": query_embedding_cache.stats(),
+            "search_result_cache": search_result_cache.stats(),
+            "answer_cache": answer_cache.stats(),
+            "conversation_cache": conversation_cache.stats(),
+            "single_flight": {
+                "embeddings": embedding_flight.stats(),
+                "generations": generation_flight.stats(),
+            },
+            "embedding_batcher": embedding_batcher.stats(),
+            "llm_admission": llm_admission.stats(),
+            "model_http": model_latency.stats(),
+        }, status=status.HTTP_200_OK)
+
 def index(request):
     return render(request, 'transcripts/index.html')
\ No newline at end of file
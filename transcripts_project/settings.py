@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'transcripts',
@@ -138,6 +139,109 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+# Query embedding cache (transcripts/embedding_cache.py)
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '1024'))
+EMBEDDING_CACHE_TTL = int(os.getenv('EMBEDDING_CACHE_TTL', '3600'))
+EMBEDDING_CACHE_SHARED = os.getenv('EMBEDDING_CACHE_SHARED', 'False') == 'True'
+
+# Semantic search backend: 'pgvector' (PostgreSQL) or 'numpy' (memory-mapped index)
+SEMANTIC_SEARCH_BACKEND = os.getenv('SEMANTIC_SEARCH_BACKEND', 'pgvector')
+VECTOR_INDEX_PATH = os.getenv('VECTOR_INDEX_PATH', os.path.join(BASE_DIR, 'vector_index'))
+VECTOR_INDEX_DTYPE = os.getenv('VECTOR_INDEX_DTYPE', 'float16')
+# Refresh the NumPy index in the background when the embedding pipeline bumps corpus_state.generation
+VECTOR_INDEX_AUTO_REFRESH = os.getenv('VECTOR_INDEX_AUTO_REFRESH', 'True') == 'True'
+
+# Retrieval mode: 'vector' or 'hybrid' (tsvector + pgvector, reciprocal rank fusion)
+SEMANTIC_SEARCH_MODE = os.getenv('SEMANTIC_SEARCH_MODE', 'vector')
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', '50'))
+HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', '60'))
+
+# Retrieval post-processing: over-fetch, MMR re-rank, merge time-adjacent chunks
+SEARCH_DIVERSIFY = os.getenv('SEARCH_DIVERSIFY', 'False') == 'True'
+RAG_DIVERSIFY = os.getenv('RAG_DIVERSIFY', 'False') == 'True'
+SEARCH_MMR_LAMBDA = float(os.getenv('SEARCH_MMR_LAMBDA', '0.7'))
+SEARCH_MMR_OVERFETCH = int(os.getenv('SEARCH_MMR_OVERFETCH', '4'))
+
+# Per-video search: videos with at most this many chunks are scanned exactly,
+# larger ones use the HNSW index with iterative scans (pgvector >= 0.8).
+# Every ANN search runs with hnsw.ef_search >= top_k and falls back to an exact scan when it comes up short.
+VIDEO_EXACT_SEARCH_MAX_CHUNKS = int(os.getenv('VIDEO_EXACT_SEARCH_MAX_CHUNKS', '5000'))
+HNSW_EF_SEARCH = int(os.getenv('HNSW_EF_SEARCH', '100'))
+PGVECTOR_ITERATIVE_SCAN = os.getenv('PGVECTOR_ITERATIVE_SCAN', 'True') == 'True'
+
+# Search result cache; entries are invalidated when the embedding pipeline bumps corpus_state.generation
+SEARCH_RESULT_CACHE_ENABLED = os.getenv('SEARCH_RESULT_CACHE_ENABLED', 'True') == 'True'
+SEARCH_RESULT_CACHE_TTL = int(os.getenv('SEARCH_RESULT_CACHE_TTL', '300'))
+CORPUS_GENERATION_POLL_SECONDS = float(os.getenv('CORPUS_GENERATION_POLL_SECONDS', '1.0'))
+
+# Semantic answer cache: reuse answers to near-duplicate first-turn questions over identical chunks
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'True') == 'True'
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '512'))
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', '3600'))
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', '0.95'))
+
+# RAG prompt packing: total prompt tokens (system + history + evidence + question) and the history share.
+# Keep RAG_PROMPT_TOKEN_BUDGET + max_tokens (512) within the model's loaded context length.
+RAG_PROMPT_TOKEN_BUDGET = int(os.getenv('RAG_PROMPT_TOKEN_BUDGET', '3072'))
+RAG_HISTORY_TOKEN_BUDGET = int(os.getenv('RAG_HISTORY_TOKEN_BUDGET', '768'))
+
+# Chat memory: 'window' replays the last raw messages; 'summary' adds a rolling summary of older turns,
+# folded in on a background thread once CONVERSATION_SUMMARY_TRIGGER_MESSAGES are unsummarized
+CONVERSATION_MEMORY = os.getenv('CONVERSATION_MEMORY', 'window')
+CONVERSATION_SUMMARY_KEEP_MESSAGES = int(os.getenv('CONVERSATION_SUMMARY_KEEP_MESSAGES', '4'))
+CONVERSATION_SUMMARY_TRIGGER_MESSAGES = int(os.getenv('CONVERSATION_SUMMARY_TRIGGER_MESSAGES', '8'))
+CONVERSATION_SUMMARY_MAX_TOKENS = int(os.getenv('CONVERSATION_SUMMARY_MAX_TOKENS', '300'))
+
+# Micro-batching of concurrent query embeddings: wait up to EMBEDDING_BATCH_MAX_WAIT_MS for more queries
+# (or until EMBEDDING_BATCH_MAX_SIZE are waiting) and embed them in one request
+EMBEDDING_BATCH_ENABLED = os.getenv('EMBEDDING_BATCH_ENABLED', 'True') == 'True'
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv('EMBEDDING_BATCH_MAX_SIZE', '32'))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv('EMBEDDING_BATCH_MAX_WAIT_MS', '5'))
+EMBEDDING_BATCH_CONCURRENCY = int(os.getenv('EMBEDDING_BATCH_CONCURRENCY', '4'))
+# Longest a caller waits for its batched vector (queueing + request); keep above MODEL_HTTP_READ_TIMEOUT
+EMBEDDING_BATCH_TIMEOUT_SECONDS = float(os.getenv('EMBEDDING_BATCH_TIMEOUT_SECONDS', '150'))
+
+# Per-conversation cache (Django cache) of the history window and the last retrieved evidence.
+# A follow-up whose question embedding is within REUSE_SIMILARITY (cosine) of the question that retrieved
+# the evidence reuses it without searching; within EXTEND_SIMILARITY, prior chunks compete with the new results
+CONVERSATION_CACHE_ENABLED = os.getenv('CONVERSATION_CACHE_ENABLED', 'True') == 'True'
+CONVERSATION_CACHE_TTL = int(os.getenv('CONVERSATION_CACHE_TTL', '1800'))
+CONVERSATION_EVIDENCE_REUSE_SIMILARITY = float(os.getenv('CONVERSATION_EVIDENCE_REUSE_SIMILARITY', '0.9'))
+CONVERSATION_EVIDENCE_EXTEND_SIMILARITY = float(os.getenv('CONVERSATION_EVIDENCE_EXTEND_SIMILARITY', '0.75'))
+
+# Keyword search (search/): largest page a client may request; the default page is REST_FRAMEWORK PAGE_SIZE
+KEYWORD_SEARCH_MAX_PAGE_SIZE = int(os.getenv('KEYWORD_SEARCH_MAX_PAGE_SIZE', '500'))
+# Phrase search (search/phrase/) pages over videos; each video returns at most MAX_HITS_PER_VIDEO hits
+PHRASE_SEARCH_PAGE_SIZE = int(os.getenv('PHRASE_SEARCH_PAGE_SIZE', '20'))
+PHRASE_SEARCH_MAX_PAGE_SIZE = int(os.getenv('PHRASE_SEARCH_MAX_PAGE_SIZE', '100'))
+PHRASE_SEARCH_MAX_HITS_PER_VIDEO = int(os.getenv('PHRASE_SEARCH_MAX_HITS_PER_VIDEO', '50'))
+
+# common_words/ default engine: 'table' (word_counts tables kept at ingest) or 'sql' (counted live in PostgreSQL)
+COMMON_WORDS_ENGINE = os.getenv('COMMON_WORDS_ENGINE', 'table')
+
+# LLM admission control: concurrent chat completions, waiting requests, and max queue time before a 503
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', '32'))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv('LLM_QUEUE_TIMEOUT_SECONDS', '15'))
+
+# Max queries accepted by semantic_search/batch/
+SEMANTIC_SEARCH_BATCH_MAX = int(os.getenv('SEMANTIC_SEARCH_BATCH_MAX', '50'))
+# Largest top_k a search request may ask for (larger values are clamped)
+SEARCH_MAX_TOP_K = int(os.getenv('SEARCH_MAX_TOP_K', '100'))
+
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS':'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE':100